@@ -0,0 +1,294 @@
+"""Declarative description of every BaoStock API the browser exposes
+
+Each ApiSpec names the BaoStock call, its parameters (with widget kinds and
+defaults), the fields it returns, how long its results stay valid and how it
+can be batched. The query forms, the engine and the query cache are all
+driven from here, so a new API only needs a new entry.
+"""
+import csv
+import os
+
+import baostock as bs
+
+from result_decoder import FIELD_DESC_FILE, FIELD_DTYPES
+
+DEFAULT_CODE = "sh.600000"
+
+MINUTE_FREQUENCIES = ("5", "15", "30", "60")
+DAILY_DEFAULT_FIELDS = "date,code,open,high,low,close,preclose,volume,amount,adjustflag,turn,tradestatus,pctChg,isST"
+MINUTE_DEFAULT_FIELDS = "date,time,code,open,high,low,close,volume,amount,adjustflag"
+# Weekly and monthly K-lines have no preclose, tradestatus, isST or valuation fields
+PERIOD_DEFAULT_FIELDS = "date,code,open,high,low,close,volume,amount,adjustflag,turn,pctChg"
+
+# Cacheability classes (see query_cache.expires_at)
+CACHE_KLINE = 'kline'          # bars: final once the day is over; stored locally
+CACHE_STATEMENT = 'statement'  # quarterly statements: final some months after the quarter
+CACHE_DIVIDEND = 'dividend'    # dividends: final once the following year is over
+CACHE_RANGE = 'range'          # dated events: final once the range is in the past
+CACHE_SNAPSHOT = 'snapshot'    # lists as of a day: final once that day is over
+CACHE_DAILY = 'daily'          # reference data that may change any day
+
+# How a query can be fanned out over many requests
+BATCH_BY_CODE = 'code'
+BATCH_BY_DATE = 'date'
+
+# Parameter kinds, which also pick the form widget
+CODE = 'code'                    # stock code, DEFAULT_CODE when empty
+OPTIONAL_CODE = 'optional_code'  # stock code, empty means all stocks
+DATE = 'date'                    # date picker; default is an offset in days from today
+TEXT = 'text'
+YEAR = 'year'                    # number input from 2000 to the current year
+CHOICE = 'choice'
+FIELDS = 'fields'                # comma-separated field list, default depends on frequency
+
+
+class Param:
+    """One API parameter and how to ask for it"""
+
+    __slots__ = ('name', 'kind', 'label', 'default', 'help', 'options')
+
+    def __init__(self, name, kind, label, default=None, help=None, options=None):
+        self.name = name
+        self.kind = kind
+        self.label = label
+        self.default = default
+        self.help = help
+        self.options = options
+
+
+class _Blank(dict):
+    def __missing__(self, key):
+        return ""
+
+
+class ApiSpec:
+    """Everything the app needs to know about one BaoStock API"""
+
+    __slots__ = ('name', 'category', 'description', 'params', 'field_group', 'cache', 'batch',
+                 'label', 'note', 'exclusive', 'scoped_by')
+
+    def __init__(self, name, category, description, params, field_group, cache, batch=None,
+                 label=None, note=None, exclusive=(), scoped_by=None):
+        self.name = name
+        self.category = category
+        self.description = description
+        self.params = tuple(params)
+        self.field_group = field_group
+        self.cache = cache
+        self.batch = batch
+        self.label = label or name
+        self.note = note
+        # Only the first non-empty one of these parameters is sent
+        self.exclusive = tuple(exclusive)
+        # Without this parameter the API covers everything and takes no parameters at all
+        self.scoped_by = scoped_by
+
+    @property
+    def func(self):
+        return getattr(bs, self.name)
+
+    @property
+    def param_names(self):
+        return tuple(p.name for p in self.params)
+
+    @property
+    def fields(self):
+        """Fields the API returns (K-line returns whatever was requested)"""
+        return FIELD_GROUPS.get(self.field_group, ())
+
+    @property
+    def dtypes(self):
+        return {field: FIELD_DTYPES.get(field, 'string') for field in self.fields}
+
+    def describe(self, params):
+        """Short label for a query, shown above its result"""
+        if callable(self.label):
+            return self.label(params)
+        return self.label.format_map(_Blank(params, api=self.name))
+
+
+def default_fields(frequency):
+    frequency = str(frequency)
+    if frequency in MINUTE_FREQUENCIES:
+        return MINUTE_DEFAULT_FIELDS
+    return PERIOD_DEFAULT_FIELDS if frequency in ("w", "m") else DAILY_DEFAULT_FIELDS
+
+
+def _load_field_groups(path=FIELD_DESC_FILE):
+    """{api_category in field_descriptions.csv: (field, ...)}"""
+    groups = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                groups.setdefault(row['api_category'], []).append(row['field_name'])
+    return {group: tuple(fields) for group, fields in groups.items()}
+
+
+FIELD_GROUPS = _load_field_groups()
+
+
+def _code(label="Stock Code", help="Select or search stock"):
+    return Param('code', CODE, label, help=help)
+
+
+def _date(name, label, days=0):
+    return Param(name, DATE, label, default=days)
+
+
+def _date_range(days):
+    return [_date('start_date', "Start Date", days), _date('end_date', "End Date")]
+
+
+def _describe_stock_basic(params):
+    if params.get('code'):
+        return f"Stock Basic Info - Code: {params['code']}"
+    if params.get('code_name'):
+        return f"Stock Basic Info - Name: {params['code_name']}"
+    return "Stock Basic Info - All Stocks"
+
+
+CATEGORY_ICONS = {
+    "K-Line Data": "📊",
+    "Dividend & Adjustment": "💰",
+    "Financial Data": "📈",
+    "Company Reports": "📋",
+    "Security Info": "🔍",
+    "Macro Economy": "🌐",
+    "Sector Data": "🏢",
+}
+
+_STATEMENTS = [
+    ('query_profit_data', "季度盈利能力", "Profit Data"),
+    ('query_operation_data', "季度营运能力", "Operation Data"),
+    ('query_growth_data', "季度成长能力", "Growth Data"),
+    ('query_balance_data', "季度偿债能力", "Balance Data"),
+    ('query_cash_flow_data', "季度现金流量", "Cash Flow Data"),
+    ('query_dupont_data', "季度杜邦分析", "Dupont Data"),
+]
+
+_MACRO_RATES = [
+    ('query_deposit_rate_data', "存款利率", "Deposit Rate"),
+    ('query_loan_rate_data', "贷款利率", "Loan Rate"),
+    ('query_required_reserve_ratio_data', "存款准备金率", "Reserve Ratio"),
+]
+
+_INDEXES = [
+    ('query_sz50_stocks', "上证50成分股"),
+    ('query_hs300_stocks', "沪深300成分股"),
+    ('query_zz500_stocks', "中证500成分股"),
+]
+
+SPECS = [
+    ApiSpec(
+        'query_history_k_data_plus', "K-Line Data", "历史K线数据，支持多种频率",
+        [
+            _code(help="Select stock for K-line data"),
+            Param('frequency', CHOICE, "Frequency", "d", "d=daily, w=weekly, m=monthly, 5/15/30/60=minutes",
+                  ["d", "w", "m", "5", "15", "30", "60"]),
+            *_date_range(-30),
+            Param('adjustflag', CHOICE, "Adjust Flag", "3", "3=No adjust, 1=Back adjust, 2=Forward adjust",
+                  ["3", "1", "2"]),
+            Param('fields', FIELDS, "Fields"),
+        ],
+        "K-Line Data", CACHE_KLINE, BATCH_BY_CODE, label="K-Line Data: {code}",
+    ),
+    ApiSpec(
+        'query_dividend_data', "Dividend & Adjustment", "分红信息",
+        [
+            _code(help="Select stock for dividend data"),
+            Param('year', TEXT, "Year", "2023"),
+            Param('yearType', CHOICE, "Year Type", "report", "report=Report year, operate=Operation year",
+                  ["report", "operate"]),
+        ],
+        "Dividend Data", CACHE_DIVIDEND, BATCH_BY_CODE, label="Dividend Data: {code} ({year})",
+    ),
+    ApiSpec(
+        'query_adjust_factor', "Dividend & Adjustment", "复权因子",
+        [_code(help="Select stock for adjust factor"), *_date_range(-365)],
+        "Adjust Factor", CACHE_RANGE, BATCH_BY_CODE, label="Adjust Factor: {code}",
+    ),
+    *[
+        ApiSpec(
+            name, "Financial Data", description,
+            [
+                _code(help="Select stock for financial data"),
+                Param('year', YEAR, "Year", 2023),
+                Param('quarter', CHOICE, "Quarter", 1, options=[1, 2, 3, 4]),
+            ],
+            group, CACHE_STATEMENT, BATCH_BY_CODE, label="{api}: {code} ({year}Q{quarter})",
+        )
+        for name, description, group in _STATEMENTS
+    ],
+    ApiSpec(
+        'query_performance_express_report', "Company Reports", "业绩快报",
+        [_code(help="Select stock for company reports"), *_date_range(-365)],
+        "Performance Express", CACHE_RANGE, BATCH_BY_CODE, label="{api}: {code}",
+    ),
+    ApiSpec(
+        'query_forecast_report', "Company Reports", "业绩预告",
+        [_code(help="Select stock for company reports"), *_date_range(-365)],
+        "Forecast Report", CACHE_RANGE, BATCH_BY_CODE, label="{api}: {code}",
+    ),
+    ApiSpec(
+        'query_trade_dates', "Security Info", "交易日历", _date_range(-30),
+        "Trade Dates", CACHE_DAILY, label="Trade Dates",
+    ),
+    ApiSpec(
+        'query_all_stock', "Security Info", "所有股票代码", [_date('day', "Query Date")],
+        "Stock List", CACHE_SNAPSHOT, BATCH_BY_DATE, label="All Stocks ({day})",
+    ),
+    ApiSpec(
+        'query_stock_basic', "Security Info", "股票基本信息",
+        [
+            Param('code', OPTIONAL_CODE, "Stock Code", help="Leave empty to query all stocks"),
+            Param('code_name', TEXT, "Stock Name", "", "Support fuzzy search, leave empty to query all"),
+        ],
+        "Stock Basic", CACHE_DAILY, label=_describe_stock_basic,
+        note="💡 Tip: Leave both fields empty to get all A-share stocks basic information",
+        exclusive=('code', 'code_name'),
+    ),
+    *[
+        ApiSpec(name, "Macro Economy", description, _date_range(-365), group, CACHE_DAILY)
+        for name, description, group in _MACRO_RATES
+    ],
+    ApiSpec(
+        'query_money_supply_data_month', "Macro Economy", "月度货币供应量",
+        [Param('start_date', TEXT, "Start Date (YYYY-MM)", "2023-01"),
+         Param('end_date', TEXT, "End Date (YYYY-MM)", "2023-12")],
+        "Money Supply Month", CACHE_DAILY,
+    ),
+    ApiSpec(
+        'query_money_supply_data_year', "Macro Economy", "年度货币供应量",
+        [Param('start_date', TEXT, "Start Year (YYYY)", "2020"),
+         Param('end_date', TEXT, "End Year (YYYY)", "2023")],
+        "Money Supply Year", CACHE_DAILY,
+    ),
+    ApiSpec('query_shibor_data', "Macro Economy", "SHIBOR利率", _date_range(-365), "Shibor Data", CACHE_DAILY),
+    ApiSpec(
+        'query_stock_industry', "Sector Data", "行业分类",
+        [Param('code', OPTIONAL_CODE, "Stock Code (optional)", help="Select stock or leave empty for all"),
+         _date('date', "Query Date")],
+        "Stock Industry", CACHE_DAILY, BATCH_BY_CODE, label="Stock Industry", scoped_by='code',
+    ),
+    *[
+        ApiSpec(name, "Sector Data", description, [_date('date', "Query Date")],
+                "Index Stocks", CACHE_SNAPSHOT, BATCH_BY_DATE)
+        for name, description in _INDEXES
+    ],
+]
+
+API_REGISTRY = {spec.name: spec for spec in SPECS}
+
+# Category -> icon and {api_name: description}, in menu order
+API_STRUCTURE = {}
+for _spec in SPECS:
+    API_STRUCTURE.setdefault(_spec.category, {'icon': CATEGORY_ICONS[_spec.category], 'apis': {}})
+    API_STRUCTURE[_spec.category]['apis'][_spec.name] = _spec.description
+
+
+def get_spec(api_name):
+    """Spec for an API; raises ValueError for an unknown one"""
+    spec = API_REGISTRY.get(api_name)
+    if spec is None:
+        raise ValueError(f"Unknown API: {api_name}")
+    return spec
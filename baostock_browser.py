@@ -2,7 +2,27 @@ import streamlit as st
 import baostock as bs
 import pandas as pd
 from datetime import datetime, timedelta
-import os
+from bs_session import get_session
+from query_cache import get_query_cache
+from kline_store import get_kline_store, store_fields
+from bulk_download import BulkDownloader, parse_codes
+from worker_pool import get_worker_pool
+from call_gateway import get_gateway
+from api_registry import (API_STRUCTURE, CHOICE, CODE, DATE, FIELDS, OPTIONAL_CODE, YEAR, default_fields,
+                          get_spec)
+from query_engine import build_params, describe_query
+from query_jobs import CANCELLED, DONE, FAILED, get_job_manager
+from cross_section import SCREEN_OPERATORS, get_cross_section_store, previous_trading_day
+from financial_sweep import STATEMENT_APIS, FinancialSweep
+from index_membership import get_index_membership
+from indicators import DEFAULT_INDICATORS, get_indicator_engine
+from local_sql import EXAMPLE_QUERY, MAX_RESULT_ROWS, get_local_sql
+from field_metadata import FIELD_DESC_FILE, SCHEMA_CACHE_SIZE, get_field_metadata
+from result_export import EXPORT_FORMATS, ResultExport
+from result_grid import DEFAULT_PAGE_SIZE, FILTER_OPERATORS, PAGE_SIZES, ResultView
+from result_store import get_result_store
+from perf_metrics import get_metrics, timed
+from stock_universe import STOCK_LIST_FILE, export_csv, get_stock_universe, import_csv, set_stock_universe, update_industry
 
 # Page configuration
 st.set_page_config(
@@ -11,155 +31,104 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize session state for login
-if 'logged_in' not in st.session_state:
-    st.session_state.logged_in = False
+# One BaoStock connection shared by every rerun and browser session in this process
+session = get_session()
 
-# Initialize session state for stock list
-if 'stock_list' not in st.session_state:
-    st.session_state.stock_list = None
-if 'stock_list_loaded' not in st.session_state:
-    st.session_state.stock_list_loaded = False
+# Parquet cache in front of BaoStock, shared by every session in this process
+query_cache = get_query_cache()
 
-# Initialize session state for field descriptions
-if 'field_descriptions' not in st.session_state:
-    st.session_state.field_descriptions = None
+# Local bar store for K-line queries (fetches only missing date ranges)
+kline_store = get_kline_store()
 
-# Login to baostock
+# Query results shared by reference between sessions (single-flight, memory-bounded LRU)
+result_store = get_result_store()
+
+# Background query jobs, shared by every session in this process
+job_manager = get_job_manager()
+
+# How often the jobs panel polls running jobs, and how many recent jobs it lists
+JOB_POLL_SECONDS = 1.0
+JOBS_SHOWN = 10
+
+# Sidebar entry for SQL over the local stores; not a BaoStock API category
+LOCAL_SQL = "Local SQL"
+
+# Login to baostock (no-op while the shared session is still logged in)
 def login_baostock():
-    if not st.session_state.logged_in:
-        lg = bs.login()
-        if lg.error_code == '0':
-            st.session_state.logged_in = True
-            return True
-        else:
-            st.error(f"Login failed: {lg.error_msg}")
-            return False
+    lg = session.ensure_login()
+    if lg is not None:
+        st.error(f"Login failed: {lg.error_msg}")
+        return False
     return True
 
-# Logout from baostock
-def logout_baostock():
-    if st.session_state.logged_in:
-        bs.logout()
-        st.session_state.logged_in = False
-
-# Convert result to DataFrame
-def result_to_dataframe(rs):
-    data_list = []
-    while (rs.error_code == '0') & rs.next():
-        data_list.append(rs.get_row_data())
-    if data_list:
-        return pd.DataFrame(data_list, columns=rs.fields)
-    return pd.DataFrame()
-
 # Stock list management
-STOCK_LIST_FILE = "stock_list.csv"
-FIELD_DESC_FILE = "field_descriptions.csv"
-
-def load_stock_list_from_file():
-    """Load stock list from local CSV file"""
-    if os.path.exists(STOCK_LIST_FILE):
-        try:
-            df = pd.read_csv(STOCK_LIST_FILE, encoding='utf-8-sig')
-            return df
-        except Exception as e:
-            st.warning(f"Failed to load stock list from file: {e}")
+def load_stock_universe():
+    """Load the indexed stock universe (memory-mapped once per process, shared by all sessions)"""
+    try:
+        return get_stock_universe()
+    except Exception as e:
+        st.warning(f"Failed to load stock list from file: {e}")
     return None
 
 def refresh_stock_list():
     """Refresh stock list from BaoStock API"""
     if login_baostock():
         with st.spinner("Refreshing stock list from BaoStock API..."):
-            rs = bs.query_stock_basic()
-            if rs.error_code == '0':
-                df = result_to_dataframe(rs)
+            df, error_msg = query_cache.refresh(bs.query_stock_basic)
+            if error_msg is None:
                 if not df.empty:
-                    # Save to local file
-                    df.to_csv(STOCK_LIST_FILE, index=False, encoding='utf-8-sig')
-                    st.session_state.stock_list = df
-                    st.session_state.stock_list_loaded = True
+                    # Save to the local universe file
+                    set_stock_universe(df)
                     st.success(f"✅ Stock list refreshed! Total {len(df)} stocks loaded.")
                     return df
                 else:
                     st.error("No stock data returned")
             else:
-                st.error(f"Failed to refresh stock list: {rs.error_msg}")
+                st.error(f"Failed to refresh stock list: {error_msg}")
     return None
 
-def get_stock_list():
-    """Get stock list (from cache, file, or API)"""
-    # If already loaded in session, return it
-    if st.session_state.stock_list is not None:
-        return st.session_state.stock_list
-    
-    # Try to load from file
-    df = load_stock_list_from_file()
-    if df is not None:
-        st.session_state.stock_list = df
-        st.session_state.stock_list_loaded = True
-        return df
+def get_stock_universe_or_refresh():
+    """Get the stock universe (from memory or file, or from the API if no file exists)"""
+    universe = load_stock_universe()
+    if universe is not None:
+        return universe
     
     # If no file exists, refresh from API
-    return refresh_stock_list()
+    if refresh_stock_list() is not None:
+        return load_stock_universe()
+    return None
+
+def get_stock_list():
+    """Get stock list DataFrame (read-only; shared by every session)"""
+    universe = get_stock_universe_or_refresh()
+    return universe.frame if universe is not None else None
 
 def update_stock_list_with_industry(industry_df):
-    """Update stock_list.csv with industry information"""
+    """Replace the industry columns of the stock universe with industry information"""
     try:
-        # Load current stock list
-        if os.path.exists(STOCK_LIST_FILE):
-            stock_df = pd.read_csv(STOCK_LIST_FILE, encoding='utf-8-sig')
-        else:
+        if load_stock_universe() is None:
             st.error("Stock list file not found. Please refresh stock list first.")
             return False
-        
-        # Select relevant columns from industry data
-        industry_cols = ['code', 'industry', 'industryClassification']
-        industry_data = industry_df[industry_cols].copy()
-        
-        # Merge industry information into stock list
-        # First, remove existing industry columns if they exist
-        if 'industry' in stock_df.columns:
-            stock_df = stock_df.drop(columns=['industry'])
-        if 'industryClassification' in stock_df.columns:
-            stock_df = stock_df.drop(columns=['industryClassification'])
-        
-        # Merge on 'code' column
-        updated_df = stock_df.merge(industry_data, on='code', how='left')
-        
-        # Save updated data back to CSV
-        updated_df.to_csv(STOCK_LIST_FILE, index=False, encoding='utf-8-sig')
-        
-        # Update session state
-        st.session_state.stock_list = updated_df
-        
+        update_industry(industry_df)
         return True
     except Exception as e:
         st.error(f"Failed to update stock list with industry data: {e}")
         return False
 
+def load_field_metadata():
+    """Load field descriptions once per process; None if the file is missing or unreadable"""
+    try:
+        return get_field_metadata()
+    except FileNotFoundError:
+        st.warning(f"Field description file not found: {FIELD_DESC_FILE}")
+    except Exception as e:
+        st.warning(f"Failed to load field descriptions: {e}")
+    return None
+
 def load_field_descriptions():
-    """Load field descriptions from CSV file"""
-    if st.session_state.field_descriptions is None:
-        if os.path.exists(FIELD_DESC_FILE):
-            try:
-                df = pd.read_csv(FIELD_DESC_FILE, encoding='utf-8-sig')
-                # Create a dictionary for quick lookup: {field_name: (description, detail)}
-                desc_dict = {}
-                for _, row in df.iterrows():
-                    desc_dict[row['field_name']] = {
-                        'category': row['api_category'],
-                        'description': row['field_description'],
-                        'detail': row['field_detail']
-                    }
-                st.session_state.field_descriptions = desc_dict
-                return desc_dict
-            except Exception as e:
-                st.warning(f"Failed to load field descriptions: {e}")
-                return {}
-        else:
-            st.warning(f"Field description file not found: {FIELD_DESC_FILE}")
-            return {}
-    return st.session_state.field_descriptions
+    """Field descriptions as {field_name: {'category', 'description', 'detail'}}"""
+    metadata = load_field_metadata()
+    return metadata.fields if metadata is not None else {}
 
 def get_field_tooltip(field_name):
     """Get tooltip text for a field"""
@@ -172,68 +141,133 @@ def get_field_tooltip(field_name):
         return tooltip
     return field_name
 
+@st.cache_resource(max_entries=SCHEMA_CACHE_SIZE, show_spinner=False)
+def column_config_for(columns, api_category=""):
+    """Column tooltips for a result schema, built once per (columns, category)"""
+    metadata = load_field_metadata()
+    help_texts = metadata.schema(columns, api_category)['help'] if metadata is not None else {}
+    return {
+        col_name: st.column_config.Column(
+            col_name,
+            help=help_texts.get(col_name),
+            width="medium"
+        )
+        for col_name in columns
+    }
+
 def display_dataframe_with_tooltips(df, api_category=""):
     """Display dataframe with column tooltips"""
     if df.empty:
         st.info("No data to display")
         return
     
-    # Load field descriptions
-    field_desc = load_field_descriptions()
+    with timed('render', st.session_state.get('result_api'), rows=len(df)):
+        columns = tuple(df.columns)
+        metadata = load_field_metadata()
+        
+        # Display field descriptions in an expander (as backup reference)
+        if metadata is not None:
+            with st.expander("📖 View All Field Descriptions", expanded=False):
+                st.markdown(metadata.schema(columns, api_category)['panel'])
+        
+        # Display the dataframe with column configuration
+        st.dataframe(
+            df, 
+            column_config=column_config_for(columns, api_category),
+            use_container_width=True, 
+            height=400,
+            hide_index=True
+        )
+
+def indicator_selector():
+    """Indicators to add to a K-line result as extra columns"""
+    df = st.session_state.result_df
+    if 'close' not in df.columns or not ('date' in df.columns or 'time' in df.columns):
+        return []
+    return st.multiselect("📈 Indicators", DEFAULT_INDICATORS, key="grid_indicators",
+                          help="Computed per code; when the same bars come back with new ones appended, "
+                               "only the new bars are computed")
+
+def with_indicators(df, indicators):
+    if not indicators:
+        return df
+    return get_indicator_engine().apply(df, indicators, series=st.session_state.get('result_series'))
+
+def get_result_view(indicators=()):
+    """Paging view over the current result and its indicator columns, rebuilt only when either changes"""
+    df = st.session_state.result_df
+    indicators = tuple(indicators)
+    if (st.session_state.get('result_view_source') is not df
+            or st.session_state.get('result_view_indicators') != indicators):
+        name = f"view:{','.join(indicators)}" if indicators else 'view'
+        try:
+            # Sessions showing the same shared result also share its view and cached sort orders
+            view = result_store.attachment(df, name, lambda df: ResultView(with_indicators(df, indicators)))
+        except ValueError as e:
+            st.warning(f"Indicators skipped: {e}")
+            view = result_store.attachment(df, 'view', ResultView)
+        st.session_state.result_view = view
+        st.session_state.result_view_source = df
+        st.session_state.result_view_indicators = indicators
+    return st.session_state.result_view
+
+def get_result_export(view):
+    """Export files for the frame shown by ``view``, reused until it changes"""
+    export = st.session_state.get('result_export')
+    if export is None or export.df is not view.df:
+        indicators = st.session_state.get('result_view_indicators')
+        name = f"export:{','.join(indicators)}" if indicators else 'export'
+        export = result_store.attachment(st.session_state.result_df, name, lambda _: ResultExport(view.df))
+        st.session_state.result_export = export
+    return export
+
+def paginated_result_grid(view, api_category=""):
+    """Show one page of the result; sorting, filtering and projection run on the server"""
+    # Widget keys follow the schema so stale selections never refer to missing columns
+    schema_key = abs(hash(tuple(view.columns)))
     
-    # Create column configuration with help text for tooltips
-    column_config = {}
-    for col_name in df.columns:
-        if col_name in field_desc:
-            info = field_desc[col_name]
-            # Combine description and detail for tooltip
-            help_text = info['description']
-            if info['detail']:
-                help_text += f"\n{info['detail']}"
-            
-            column_config[col_name] = st.column_config.TextColumn(
-                col_name,
-                help=help_text,
-                width="medium"
-            )
-        else:
-            column_config[col_name] = st.column_config.TextColumn(
-                col_name,
-                help=f"{col_name} (No description available)",
-                width="medium"
-            )
+    with st.expander("⚙️ View Options", expanded=False):
+        columns = st.multiselect("Columns", view.columns, default=view.columns,
+                                 key=f"grid_columns_{schema_key}")
+        col_sort, col_order = st.columns([3, 1])
+        with col_sort:
+            sort_by = st.selectbox("Sort by", [""] + view.columns, key=f"grid_sort_{schema_key}",
+                                   format_func=lambda c: c or "(original order)")
+        with col_order:
+            ascending = st.radio("Order", ["Asc", "Desc"], key="grid_order", horizontal=True) == "Asc"
+        col_filter, col_op, col_value = st.columns([2, 1, 2])
+        with col_filter:
+            filter_column = st.selectbox("Filter", [""] + view.columns, key=f"grid_filter_{schema_key}",
+                                         format_func=lambda c: c or "(no filter)")
+        with col_op:
+            operator = st.selectbox("Operator", FILTER_OPERATORS, key="grid_filter_op")
+        with col_value:
+            value = st.text_input("Value", key="grid_filter_value")
     
-    # Display field descriptions in an expander (as backup reference)
-    with st.expander("📖 View All Field Descriptions", expanded=False):
-        cols_per_row = 2
-        columns = list(df.columns)
-        
-        for i in range(0, len(columns), cols_per_row):
-            cols = st.columns(cols_per_row)
-            for j, col_name in enumerate(columns[i:i+cols_per_row]):
-                with cols[j]:
-                    if col_name in field_desc:
-                        info = field_desc[col_name]
-                        st.markdown(f"**`{col_name}`**")
-                        st.caption(f"📝 {info['description']}")
-                        if info['detail']:
-                            st.caption(f"ℹ️ {info['detail']}")
-                    else:
-                        st.markdown(f"**`{col_name}`**")
-                        st.caption("No description available")
-                    st.markdown("---")
+    filters = [(filter_column, operator, value)] if filter_column and value != "" else []
+    try:
+        view.rows(sort_by or None, ascending, filters)
+    except (ValueError, TypeError) as e:
+        st.warning(f"Filter ignored: {e}")
+        filters = []
+    
+    col_size, col_page = st.columns([1, 1])
+    with col_size:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                                 key="grid_page_size")
+    with col_page:
+        page = st.number_input("Page", min_value=1, value=1, step=1, key="grid_page")
     
-    # Display the dataframe with column configuration
-    st.dataframe(
-        df, 
-        column_config=column_config,
-        use_container_width=True, 
-        height=400,
-        hide_index=True
-    )
+    page_df, total, pages = view.page(int(page), page_size, sort_by or None, ascending, filters, columns)
+    page = min(int(page), pages)
+    first = (page - 1) * page_size + 1 if total else 0
+    filtered = f" (filtered from {len(view)})" if filters else ""
+    st.caption(f"Rows {first}–{first + len(page_df) - 1 if total else 0} of {total}{filtered} · page {page} of {pages}")
+    
+    display_dataframe_with_tooltips(page_df, api_category)
 
 def stock_selector(label="Stock Code", key=None, help_text="Select or search stock"):
-    """Create a searchable stock selector with refresh button"""
+    """Search-as-you-type stock selector backed by the indexed stock universe; returns the code"""
     col_select, col_refresh = st.columns([4, 1])
     
     with col_refresh:
@@ -242,25 +276,27 @@ def stock_selector(label="Stock Code", key=None, help_text="Select or search sto
             refresh_stock_list()
     
     with col_select:
-        stock_list = get_stock_list()
+        universe = get_stock_universe_or_refresh()
         
-        if stock_list is not None and not stock_list.empty:
-            # Create display options: "code - name"
-            stock_list['display'] = stock_list['code'] + ' - ' + stock_list['code_name']
-            options = [''] + stock_list['display'].tolist()
+        if universe is not None and len(universe):
+            query = st.text_input(f"🔍 {label}", key=f"{key}_search", help=help_text,
+                                  placeholder="Type a code or name, e.g. 600000 / 浦发")
+            # Only the matches are sent to the browser, not the whole universe
+            options = universe.search(query) if query else []
+            selected = st.session_state.get(key)
+            if selected and selected not in options:
+                options = [selected] + options
             
-            selected = st.selectbox(
+            code = st.selectbox(
                 label,
-                options=options,
+                options=[''] + options,
                 key=key,
-                help=help_text
+                format_func=lambda c: universe.label(c) if c else "",
+                label_visibility="collapsed"
             )
-            
-            # Extract code from selection
-            if selected:
-                code = selected.split(' - ')[0]
-                return code
-            return ""
+            if query and not options:
+                st.caption("No matching stocks")
+            return code or ""
         else:
             # Fallback to text input if stock list not available
             st.warning("Stock list not loaded. Using text input.")
@@ -268,6 +304,335 @@ def stock_selector(label="Stock Code", key=None, help_text="Select or search sto
     
     return ""
 
+def bulk_kline_form():
+    """Batch K-line download for many codes over a pool of BaoStock sessions"""
+    source = st.radio("Code Source", ["Paste codes", "Index constituents", "Industry (stock universe)"],
+                      horizontal=True)
+    codes = []
+    index_api = None
+    if source == "Paste codes":
+        codes_text = st.text_area("Stock Codes", value="sh.600000, sz.000001", height=100,
+                                  help="Separate codes with commas, spaces or new lines")
+        codes = parse_codes(codes_text)
+        st.caption(f"{len(codes)} codes")
+    elif source == "Index constituents":
+        index_api = st.selectbox("Index", ["query_hs300_stocks", "query_sz50_stocks", "query_zz500_stocks"])
+        index_date = st.date_input("Constituents Date", value=datetime.now())
+        every_member = st.checkbox("Every member during the date range", value=False,
+                                   help="Also download codes that joined or left the index between the start "
+                                        "and end dates, for backtests without survivorship bias")
+    else:
+        stock_list = get_stock_list()
+        if stock_list is not None and 'industry' in stock_list.columns and stock_list['industry'].notna().any():
+            industries = sorted(stock_list['industry'].dropna().unique())
+            selected = st.multiselect("Industries", industries)
+            codes = stock_list.loc[stock_list['industry'].isin(selected), 'code'].tolist()
+            st.caption(f"{len(codes)} codes")
+        else:
+            st.warning("⚠️ No industry data in the stock universe. Save industry data from query_stock_industry first.")
+    
+    frequency = st.selectbox("Frequency", ["d", "w", "m", "5", "15", "30", "60"], key="bulk_frequency",
+                             index=0, help="d=daily, w=weekly, m=monthly, 5/15/30/60=minutes")
+    start_date_input = st.date_input("Start Date", value=datetime.now() - timedelta(days=365), key="bulk_start")
+    end_date_input = st.date_input("End Date", value=datetime.now(), key="bulk_end")
+    adjustflag = st.selectbox("Adjust Flag", ["3", "1", "2"], key="bulk_adjustflag",
+                              help="3=No adjust, 1=Back adjust, 2=Forward adjust. Daily and minute bars are "
+                                   "stored once, unadjusted, and adjusted locally")
+    pool = get_worker_pool()
+    parallel = st.number_input("Parallel requests", min_value=1, max_value=pool.workers, value=pool.workers, step=1,
+                               help=f"Requests this batch keeps in flight at once, out of the {pool.workers} shared "
+                                    f"BaoStock sessions; the request rate ({get_gateway().rate:g}/s) is set for the "
+                                    f"whole app with BAOSTOCK_RATE")
+    
+    if st.button("Execute Batch Download", type="primary"):
+        if index_api:
+            # Membership history is sampled once and kept; later lookups need no download
+            first = min(index_date, start_date_input) if every_member else index_date
+            last = max(index_date, end_date_input) if every_member else index_date
+            with st.spinner("Loading index membership history..."):
+                history, error_msg = get_index_membership().history(index_api, first, last, pool=pool)
+            if error_msg is not None:
+                st.error(f"Failed to load index constituents: {error_msg}")
+                return
+            if every_member:
+                codes = history.members_between(start_date_input, min(end_date_input, history.end))
+            else:
+                codes = history.constituents(min(index_date, history.end))
+        if not codes:
+            st.warning("⚠️ No stock codes selected")
+            return
+        
+        progress_bar = st.progress(0.0)
+        status = st.empty()
+        
+        def on_progress(p):
+            progress_bar.progress(p.done / p.total if p.total else 1.0)
+            status.caption(f"{p.done}/{p.total} codes | {p.codes_per_sec:.1f} codes/s | "
+                           f"{p.rows_per_sec:,.0f} rows/s | {len(p.failures)} failed")
+        
+        downloader = BulkDownloader(kline_store, pool, max_outstanding=int(parallel))
+        stats = downloader.download(codes, start_date_input, end_date_input, frequency, adjustflag,
+                                    progress=on_progress)
+        st.session_state.result_df = downloader.load(stats.succeeded, start_date_input, end_date_input,
+                                                     frequency, adjustflag)
+        st.session_state.result_api = "query_history_k_data_plus"
+        st.session_state.result_series = (frequency, adjustflag)
+        st.session_state.query_info = (f"K-Line Batch: {len(stats.succeeded)} codes ({frequency}), "
+                                       f"{stats.rows:,} new rows in {stats.elapsed:.1f}s")
+        st.session_state.is_industry_data = False
+        st.session_state.bulk_failures = stats.failures
+    
+    if st.session_state.get('bulk_failures'):
+        with st.expander(f"⚠️ Failed codes ({len(st.session_state.bulk_failures)})"):
+            st.dataframe(pd.DataFrame(st.session_state.bulk_failures, columns=['code', 'error']),
+                         use_container_width=True, hide_index=True)
+
+def market_screen_form():
+    """Filters and rankings over the whole market's daily bars, from the local cross-section store"""
+    market = get_cross_section_store()
+    last_day = previous_trading_day()
+    start_date_input = st.date_input("Start Date", value=last_day, key="screen_start")
+    end_date_input = st.date_input("End Date", value=last_day, key="screen_end")
+    held = market.coverage()
+    st.caption("💽 Held: " + (", ".join(f"{s} → {e}" for s, e in held) if held else "nothing yet"))
+    
+    if st.button("⬇️ Fill Missing Days", help="One request per listed code covers the whole range; "
+                                             "run after the close to append the new day"):
+        progress_bar = st.progress(0.0)
+        status = st.empty()
+        
+        def on_progress(p):
+            progress_bar.progress(p.done / p.total if p.total else 1.0)
+            status.caption(f"{p.done}/{p.total} codes | {p.codes_per_sec:.1f} codes/s | {len(p.failures)} failed")
+        
+        stats, error_msg = market.update(start_date_input, end_date_input, get_worker_pool(), progress=on_progress)
+        if error_msg is not None:
+            st.error(f"❌ {error_msg}")
+        elif stats is None:
+            st.info("All trading days in the range are already held")
+        else:
+            st.success(f"✅ {len(stats.succeeded)} codes, {stats.rows:,} new rows in {stats.elapsed:.1f}s")
+    
+    columns = [c for c in store_fields("d") if c not in ('date', 'code')]
+    filters = []
+    for i in range(3):
+        col_column, col_op, col_value = st.columns([2, 1, 2])
+        with col_column:
+            column = st.selectbox(f"Filter {i + 1}", [""] + columns, key=f"screen_filter_{i}",
+                                  format_func=lambda c: c or "(none)")
+        with col_op:
+            operator = st.selectbox("Operator", SCREEN_OPERATORS, index=SCREEN_OPERATORS.index(">"),
+                                    key=f"screen_op_{i}")
+        with col_value:
+            value = st.text_input("Value", key=f"screen_value_{i}")
+        if column and value != "":
+            filters.append((column, operator, value))
+    col_rank, col_top, col_order = st.columns([2, 1, 1])
+    with col_rank:
+        rank_column = st.selectbox("Rank by", [""] + columns, key="screen_rank",
+                                   format_func=lambda c: c or "(no ranking)")
+    with col_top:
+        top = st.number_input("Top per day", min_value=1, value=50, step=10, key="screen_top")
+    with col_order:
+        ascending = st.radio("Order", ["Desc", "Asc"], key="screen_order", horizontal=True) == "Asc"
+    
+    if st.button("Run Screen", type="primary"):
+        start = datetime.now()
+        try:
+            if rank_column:
+                df, error_msg = market.top(start_date_input, end_date_input, rank_column, int(top), ascending, filters)
+            else:
+                df, error_msg = market.read(start_date_input, end_date_input, filters=filters)
+        except ValueError as e:
+            df, error_msg = None, str(e)
+        if error_msg is not None:
+            st.error(f"❌ {error_msg}")
+            return
+        conditions = " and ".join(f"{c} {o} {v}" for c, o, v in filters) or "all codes"
+        st.session_state.result_df = df
+        st.session_state.result_api = "query_history_k_data_plus"
+        st.session_state.result_series = None
+        st.session_state.query_info = (f"Market Screen {start_date_input} → {end_date_input}: {conditions}"
+                                       f"{f', top {top} by {rank_column}' if rank_column else ''} "
+                                       f"({(datetime.now() - start).total_seconds():.2f}s)")
+        st.session_state.is_industry_data = False
+        if df.empty:
+            st.warning("⚠️ No rows matched; fill the missing days first if the range is not held")
+
+def financial_sweep_form():
+    """Financial statements for many codes, years and quarters in one concurrent job"""
+    codes_text = st.text_area("Stock Codes", value="sh.600000", height=80,
+                              help="Separate codes with commas, spaces or new lines")
+    codes = parse_codes(codes_text)
+    current_year = datetime.now().year
+    year_range = st.slider("Years", min_value=2007, max_value=current_year,
+                           value=(current_year - 10, current_year - 1))
+    quarters = st.multiselect("Quarters", [1, 2, 3, 4], default=[1, 2, 3, 4])
+    statements = st.multiselect("Statements", list(STATEMENT_APIS), default=list(STATEMENT_APIS),
+                                format_func=lambda s: f"{s} ({STATEMENT_APIS[s]})")
+    years = list(range(year_range[0], year_range[1] + 1))
+    st.caption(f"{len(codes) * len(years) * len(quarters) * len(statements)} cells "
+               f"({len(codes)} codes × {len(years)} years × {len(quarters)} quarters × {len(statements)} statements)")
+    
+    if st.button("Execute Sweep", type="primary"):
+        if not codes or not quarters or not statements:
+            st.warning("⚠️ Select at least one code, quarter and statement")
+            return
+        progress_bar = st.progress(0.0)
+        status = st.empty()
+        
+        def on_progress(p):
+            progress_bar.progress(p.done / p.total if p.total else 1.0)
+            status.caption(f"{p.done}/{p.total} cells | {p.cached} from cache | {p.fetched} fetched | "
+                           f"{len(p.failures)} failed")
+        
+        panel, stats = FinancialSweep(query_cache, get_worker_pool()).run(
+            codes, years, quarters, statements, progress=on_progress
+        )
+        st.session_state.result_df = panel
+        st.session_state.result_api = None
+        st.session_state.result_series = None
+        st.session_state.query_info = (f"Financial Sweep: {len(codes)} codes, {years[0]}-{years[-1]}, "
+                                       f"{stats.cached} cached / {stats.fetched} fetched in {stats.elapsed:.1f}s")
+        st.session_state.is_industry_data = False
+        st.session_state.sweep_failures = stats.failures
+    
+    if st.session_state.get('sweep_failures'):
+        with st.expander(f"⚠️ Failed cells ({len(st.session_state.sweep_failures)})"):
+            st.dataframe(pd.DataFrame(st.session_state.sweep_failures,
+                                      columns=['code', 'period', 'statement', 'error']),
+                         use_container_width=True, hide_index=True)
+
+def local_sql_form():
+    """SQL over every locally stored dataset; the result goes to the usual results panel"""
+    local_sql = get_local_sql()
+    with st.expander("🗂️ Tables", expanded=False):
+        tables = local_sql.tables()
+        if tables.empty:
+            st.info("Nothing stored yet; run some queries or downloads first")
+        else:
+            st.dataframe(tables, use_container_width=True, hide_index=True)
+            table = st.selectbox("Columns of", tables['table'], key="local_sql_table")
+            columns, error_msg = local_sql.columns(table)
+            if error_msg is not None:
+                st.error(f"❌ {error_msg}")
+            else:
+                st.dataframe(columns, use_container_width=True, hide_index=True, height=200)
+    
+    sql = st.text_area("SQL", value=EXAMPLE_QUERY, height=200, key="local_sql_text",
+                       help="One read-only DuckDB query (SELECT, WITH, DESCRIBE, SUMMARIZE, SHOW); the Parquet "
+                            "files are scanned in place, reading only the columns and row groups the query needs")
+    if st.button("Run SQL", type="primary"):
+        start = datetime.now()
+        with st.spinner("Running..."):
+            df, error_msg = local_sql.run(sql)
+        if error_msg is not None:
+            st.error(f"❌ {error_msg}")
+            return
+        elapsed = (datetime.now() - start).total_seconds()
+        st.session_state.result_df = df
+        st.session_state.result_api = None
+        st.session_state.result_series = None
+        limited = f", first {MAX_RESULT_ROWS:,} rows kept" if len(df) == MAX_RESULT_ROWS else ""
+        st.session_state.query_info = f"Local SQL ({elapsed:.2f}s{limited})"
+        st.session_state.is_industry_data = False
+        if df.empty:
+            st.info("The statement returned no rows")
+
+def query_form_button(api_name, inputs):
+    """Execute Query button for a single-query form; returns the submitted job, if any"""
+    if not st.button("Execute Query", type="primary"):
+        return None
+    try:
+        params = build_params(api_name, inputs)
+    except ValueError as e:
+        st.error(f"Invalid parameters: {e}")
+        return None
+    # Runs in the background; the jobs panel polls it and shows the result when it is done
+    job = job_manager.submit(api_name, params, label=describe_query(api_name, params))
+    st.session_state.setdefault('job_ids', []).append(job.id)
+    return job
+
+def show_job_result(job):
+    """Make a finished job's result the one shown in the results panel"""
+    st.session_state.result_df = job.result
+    st.session_state.result_api = job.api_name
+    st.session_state.result_series = (job.params.get('frequency'), job.params.get('adjustflag'))
+    st.session_state.query_info = f"{job.label} ({job.elapsed:.1f}s)"
+    st.session_state.is_industry_data = job.api_name == "query_stock_industry"
+
+def collect_finished_jobs():
+    """Attach results of this session's jobs that finished since the last run; returns True if any finished"""
+    seen = st.session_state.setdefault('collected_job_ids', set())
+    finished = False
+    for job in job_manager.jobs(st.session_state.get('job_ids', [])):
+        if job.done and job.id not in seen:
+            seen.add(job.id)
+            if job.status == DONE:
+                show_job_result(job)
+            finished = True
+    return finished
+
+def jobs_panel():
+    """Running and recent jobs of this session"""
+    if collect_finished_jobs():
+        # A job finished while polling: rerun the whole page so the results panel and polling catch up
+        st.rerun()
+    jobs = job_manager.jobs(st.session_state.get('job_ids', []))
+    if not jobs:
+        return
+    with st.expander(f"⏳ Jobs ({sum(not job.done for job in jobs)} running)", expanded=True):
+        for job in reversed(jobs[-JOBS_SHOWN:]):
+            col_info, col_action = st.columns([4, 1])
+            with col_info:
+                if job.done:
+                    icon = {DONE: "✅", FAILED: "❌", CANCELLED: "⏹️"}[job.status]
+                    detail = f"{len(job.result):,} rows" if job.status == DONE else (job.error or job.status)
+                    st.caption(f"{icon} {job.label} · {detail} · {job.elapsed:.1f}s")
+                else:
+                    text = f"{job.label} · {job.message or job.status} · {job.elapsed:.0f}s"
+                    st.progress(job.progress or 0.0, text=text)
+            with col_action:
+                if not job.done:
+                    if st.button("Cancel", key=f"cancel_job_{job.id}"):
+                        job_manager.cancel(job.id)
+                        st.rerun()
+                elif job.status == DONE:
+                    if st.button("Show", key=f"show_job_{job.id}"):
+                        show_job_result(job)
+                        st.rerun()
+
+def query_form(spec):
+    """Widgets for every parameter of an API, driven by its registry entry; returns {name: value}"""
+    inputs = {}
+    for param in spec.params:
+        key = f"{spec.name}_{param.name}"
+        if param.kind in (CODE, OPTIONAL_CODE):
+            value = stock_selector(param.label, key=key, help_text=param.help)
+        elif param.kind == DATE:
+            value = st.date_input(param.label, value=datetime.now().date() + timedelta(days=param.default or 0),
+                                  key=key)
+        elif param.kind == YEAR:
+            value = st.number_input(param.label, min_value=2000, max_value=datetime.now().year,
+                                    value=param.default, key=key)
+        elif param.kind == CHOICE:
+            value = st.selectbox(param.label, param.options, index=param.options.index(param.default),
+                                 help=param.help, key=key)
+        elif param.kind == FIELDS:
+            # Keyed by frequency so switching frequency resets the list to that frequency's defaults
+            frequency = inputs.get('frequency', 'd')
+            value = st.text_area(param.label, value=default_fields(frequency), height=100,
+                                 key=f"{key}_{frequency}")
+        else:
+            value = st.text_input(param.label, value=param.default or "", help=param.help, key=key)
+        inputs[param.name] = value
+    
+    if spec.note:
+        st.info(spec.note)
+    if 'fields' in inputs and kline_store.supports(inputs['frequency'], inputs['adjustflag'], inputs['fields']):
+        st.caption("💽 Served from the local K-line store; only missing date ranges are downloaded")
+    return inputs
+
 # Main title
 st.title("📈 BaoStock Data Browser")
 st.markdown("---")
@@ -281,69 +646,6 @@ if 'selected_api' not in st.session_state:
 if 'selected_category' not in st.session_state:
     st.session_state.selected_category = None
 
-# Define API structure with categories and functions
-API_STRUCTURE = {
-    "K-Line Data": {
-        "icon": "📊",
-        "apis": {
-            "query_history_k_data_plus": "历史K线数据，支持多种频率"
-        }
-    },
-    "Dividend & Adjustment": {
-        "icon": "💰",
-        "apis": {
-            "query_dividend_data": "分红信息",
-            "query_adjust_factor": "复权因子"
-        }
-    },
-    "Financial Data": {
-        "icon": "📈",
-        "apis": {
-            "query_profit_data": "季度盈利能力",
-            "query_operation_data": "季度营运能力",
-            "query_growth_data": "季度成长能力",
-            "query_balance_data": "季度偿债能力",
-            "query_cash_flow_data": "季度现金流量",
-            "query_dupont_data": "季度杜邦分析"
-        }
-    },
-    "Company Reports": {
-        "icon": "📋",
-        "apis": {
-            "query_performance_express_report": "业绩快报",
-            "query_forecast_report": "业绩预告"
-        }
-    },
-    "Security Info": {
-        "icon": "🔍",
-        "apis": {
-            "query_trade_dates": "交易日历",
-            "query_all_stock": "所有股票代码",
-            "query_stock_basic": "股票基本信息"
-        }
-    },
-    "Macro Economy": {
-        "icon": "🌐",
-        "apis": {
-            "query_deposit_rate_data": "存款利率",
-            "query_loan_rate_data": "贷款利率",
-            "query_required_reserve_ratio_data": "存款准备金率",
-            "query_money_supply_data_month": "月度货币供应量",
-            "query_money_supply_data_year": "年度货币供应量",
-            "query_shibor_data": "SHIBOR利率"
-        }
-    },
-    "Sector Data": {
-        "icon": "🏢",
-        "apis": {
-            "query_stock_industry": "行业分类",
-            "query_sz50_stocks": "上证50成分股",
-            "query_hs300_stocks": "沪深300成分股",
-            "query_zz500_stocks": "中证500成分股"
-        }
-    }
-}
-
 # Display API menu with expanders
 for category, info in API_STRUCTURE.items():
     with st.sidebar.expander(f"{info['icon']} {category}", expanded=(st.session_state.selected_category == category)):
@@ -355,12 +657,22 @@ for category, info in API_STRUCTURE.items():
                 st.session_state.selected_category = category
                 st.rerun()
 
+if st.sidebar.button(f"🦆 {LOCAL_SQL}", key="btn_local_sql", use_container_width=True,
+                     help="Query everything stored locally with SQL"):
+    st.session_state.selected_api = LOCAL_SQL
+    st.session_state.selected_category = LOCAL_SQL
+    st.rerun()
+
 # Get current selections
 api_category = st.session_state.selected_category
 api_function = st.session_state.selected_api
 
 # Display current selection
-if api_category and api_function:
+if api_category == LOCAL_SQL:
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("**当前选择：**")
+    st.sidebar.info(f"🦆 {LOCAL_SQL}")
+elif api_category and api_function:
     st.sidebar.markdown("---")
     st.sidebar.markdown("**当前选择：**")
     st.sidebar.info(f"{API_STRUCTURE[api_category]['icon']} {api_category}\n\n🔹 {api_function}")
@@ -368,6 +680,98 @@ else:
     st.sidebar.markdown("---")
     st.sidebar.info("👆 请从上方菜单选择一个API接口")
 
+# Session status and per-query latency (reused connection vs. fresh login)
+with st.sidebar.expander("🔌 BaoStock Session", expanded=False):
+    latency = session.latency_summary()
+    st.write(f"Status: {'🟢 Logged in' if session.logged_in else '⚪ Not logged in'}")
+    st.write(f"Logins since start: {latency['login_count']}")
+    for kind, label in [('reused', "Query (reused session)"),
+                        ('with_login', "Query (incl. login)"),
+                        ('login', "Login handshake")]:
+        stats = latency[kind]
+        if stats['count']:
+            st.caption(f"{label}: {stats['avg_ms']:.0f} ms avg over {stats['count']}")
+
+# Local query cache counters
+with st.sidebar.expander("💽 Query Cache", expanded=False):
+    cache_stats = query_cache.stats()
+    st.write(f"Entries: {cache_stats['entries']} ({cache_stats['bytes'] / 1024 / 1024:.1f} MB "
+             f"of {cache_stats['budget_bytes'] / 1024 / 1024:.0f} MB)")
+    st.write(f"Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']} | Evictions: {cache_stats['evictions']}")
+    if cache_stats['hit_rate'] is not None:
+        st.caption(f"Hit rate: {cache_stats['hit_rate']:.0%}")
+    if st.button("🗑️ Clear Cache", key="clear_query_cache", use_container_width=True):
+        query_cache.clear()
+        st.rerun()
+
+# Results held in memory for all sessions
+with st.sidebar.expander("🧠 Shared Results", expanded=False):
+    store_stats = result_store.stats()
+    st.write(f"Entries: {store_stats['entries']} ({store_stats['bytes'] / 1024 / 1024:.1f} MB "
+             f"of {store_stats['budget_bytes'] / 1024 / 1024:.0f} MB resident)")
+    st.write(f"Hits: {store_stats['hits']} | Shared in-flight: {store_stats['shared']} | "
+             f"Misses: {store_stats['misses']} | Evictions: {store_stats['evictions']}")
+    if store_stats['hit_rate'] is not None:
+        st.caption(f"Hit rate: {store_stats['hit_rate']:.0%} · {store_stats['in_flight']} fetch(es) in flight")
+    store_entries = result_store.entries()
+    if store_entries:
+        entries_df = pd.DataFrame(store_entries)
+        entries_df['MB'] = (entries_df.pop('bytes') / 1024 / 1024).round(2)
+        st.dataframe(entries_df, use_container_width=True, hide_index=True, height=200)
+    if st.button("🗑️ Clear Shared Results", key="clear_result_store", use_container_width=True):
+        result_store.clear()
+        st.rerun()
+
+# Per-API latency, throughput and error rates from the stage timings
+with st.sidebar.expander("⏱️ Performance", expanded=False):
+    metrics = get_metrics()
+    gateway_stats = get_gateway().stats()
+    st.caption(f"Gateway: {gateway_stats['rate']:g} req/s, {gateway_stats['in_flight']}/{gateway_stats['limit']} in flight, "
+               f"circuit {gateway_stats['breaker']} | {gateway_stats['calls']} calls, {gateway_stats['retried']} retried, "
+               f"{gateway_stats['throttled']} throttled, {gateway_stats['rejected']} rejected")
+    api_summary = metrics.summary('query')
+    if api_summary:
+        st.caption("Queries by API (p50/p95 in ms, cached = share served without a download)")
+        st.dataframe(pd.DataFrame(api_summary).round(2), use_container_width=True, hide_index=True)
+        st.caption("Pipeline stages")
+        st.dataframe(pd.DataFrame(metrics.stage_summary()).round(2), use_container_width=True, hide_index=True)
+        col_jsonl, col_prom = st.columns(2)
+        with col_jsonl:
+            st.download_button("JSONL", data=metrics.to_jsonl, file_name="baostock_metrics.jsonl",
+                               mime="application/x-ndjson", on_click="ignore", use_container_width=True)
+        with col_prom:
+            st.download_button("Prometheus", data=metrics.to_prometheus, file_name="baostock_metrics.prom",
+                               mime="text/plain", on_click="ignore", use_container_width=True)
+        if st.button("🗑️ Clear Timings", key="clear_metrics", use_container_width=True):
+            metrics.clear()
+            st.rerun()
+    else:
+        st.caption("No queries timed yet")
+
+# Stock universe file; CSV is only used for import/export
+with st.sidebar.expander("📇 Stock Universe", expanded=False):
+    universe = load_stock_universe()
+    st.write(f"Stocks: {len(universe) if universe is not None else 0}")
+    col_import, col_export = st.columns(2)
+    with col_import:
+        if st.button("📥 Import CSV", key="import_stock_csv", use_container_width=True,
+                     help=f"Replace the universe with {STOCK_LIST_FILE}"):
+            try:
+                import_csv()
+                st.rerun()
+            except Exception as e:
+                st.error(f"Failed to import {STOCK_LIST_FILE}: {e}")
+    with col_export:
+        if st.button("📤 Export CSV", key="export_stock_csv", use_container_width=True,
+                     disabled=universe is None, help=f"Write the universe to {STOCK_LIST_FILE}"):
+            try:
+                st.success(f"✅ Exported {export_csv()} stocks to {STOCK_LIST_FILE}")
+            except Exception as e:
+                st.error(f"Failed to export {STOCK_LIST_FILE}: {e}")
+
+# Pick up results of background jobs that finished since the last run
+collect_finished_jobs()
+
 # Main content area with two columns
 col1, col2 = st.columns([1, 2])
 
@@ -394,371 +798,101 @@ with col1:
         - 💾 **数据导出**：支持CSV格式下载
         """)
     
-    # K-Line Data APIs
-    elif api_category == "K-Line Data":
-        if api_function == "query_history_k_data_plus":
-            code = stock_selector("Stock Code", key="kline_code", help_text="Select stock for K-line data")
-            if not code:
-                code = "sh.600000"  # Default value
-            
-            frequency = st.selectbox("Frequency", ["d", "w", "m", "5", "15", "30", "60"], 
-                                    index=0, help="d=daily, w=weekly, m=monthly, 5/15/30/60=minutes")
-            
-            # Default date range: last 30 days
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=30)
-            
-            start_date_input = st.date_input("Start Date", value=start_date)
-            end_date_input = st.date_input("End Date", value=end_date)
-            
-            adjustflag = st.selectbox("Adjust Flag", ["3", "1", "2"], 
-                                     index=0, help="3=No adjust, 1=Back adjust, 2=Forward adjust")
-            
-            # Fields selection based on frequency
-            if frequency in ["5", "15", "30", "60"]:
-                default_fields = "date,time,code,open,high,low,close,volume,amount,adjustflag"
-            else:
-                default_fields = "date,code,open,high,low,close,preclose,volume,amount,adjustflag,turn,tradestatus,pctChg,isST"
-            
-            fields = st.text_area("Fields", value=default_fields, height=100)
-            
-            if st.button("Execute Query", type="primary"):
-                if login_baostock():
-                    with st.spinner("Querying data..."):
-                        rs = bs.query_history_k_data_plus(
-                            code, fields,
-                            start_date=start_date_input.strftime("%Y-%m-%d"),
-                            end_date=end_date_input.strftime("%Y-%m-%d"),
-                            frequency=frequency,
-                            adjustflag=adjustflag
-                        )
-                        
-                        if rs.error_code == '0':
-                            df = result_to_dataframe(rs)
-                            st.session_state.result_df = df
-                            st.session_state.query_info = f"K-Line Data: {code}"
-                            st.session_state.is_industry_data = False
-                        else:
-                            st.error(f"Query failed: {rs.error_msg}")
-    
-    # Dividend & Adjustment APIs
-    elif api_category == "Dividend & Adjustment":
-        if api_function == "query_dividend_data":
-            code = stock_selector("Stock Code", key="dividend_code", help_text="Select stock for dividend data")
-            if not code:
-                code = "sh.600000"  # Default value
-            year = st.text_input("Year", value="2023")
-            yearType = st.selectbox("Year Type", ["report", "operate"], 
-                                   help="report=Report year, operate=Operation year")
-            
-            if st.button("Execute Query", type="primary"):
-                if login_baostock():
-                    with st.spinner("Querying data..."):
-                        rs = bs.query_dividend_data(code=code, year=year, yearType=yearType)
-                        if rs.error_code == '0':
-                            df = result_to_dataframe(rs)
-                            st.session_state.result_df = df
-                            st.session_state.query_info = f"Dividend Data: {code} ({year})"
-                        else:
-                            st.error(f"Query failed: {rs.error_msg}")
-        
-        elif api_function == "query_adjust_factor":
-            code = stock_selector("Stock Code", key="adjust_code", help_text="Select stock for adjust factor")
-            if not code:
-                code = "sh.600000"  # Default value
-            start_date_input = st.date_input("Start Date", value=datetime.now() - timedelta(days=365))
-            end_date_input = st.date_input("End Date", value=datetime.now())
-            
-            if st.button("Execute Query", type="primary"):
-                if login_baostock():
-                    with st.spinner("Querying data..."):
-                        rs = bs.query_adjust_factor(
-                            code=code,
-                            start_date=start_date_input.strftime("%Y-%m-%d"),
-                            end_date=end_date_input.strftime("%Y-%m-%d")
-                        )
-                        if rs.error_code == '0':
-                            df = result_to_dataframe(rs)
-                            st.session_state.result_df = df
-                            st.session_state.query_info = f"Adjust Factor: {code}"
-                        else:
-                            st.error(f"Query failed: {rs.error_msg}")
+    elif api_category == LOCAL_SQL:
+        local_sql_form()
     
-    # Financial Data APIs
-    elif api_category == "Financial Data":
-        code = stock_selector("Stock Code", key="financial_code", help_text="Select stock for financial data")
-        if not code:
-            code = "sh.600000"  # Default value
-        year = st.number_input("Year", min_value=2000, max_value=datetime.now().year, value=2023)
-        quarter = st.selectbox("Quarter", [1, 2, 3, 4], index=0)
-        
-        if st.button("Execute Query", type="primary"):
-            if login_baostock():
-                with st.spinner("Querying data..."):
-                    if api_function == "query_profit_data":
-                        rs = bs.query_profit_data(code=code, year=year, quarter=quarter)
-                    elif api_function == "query_operation_data":
-                        rs = bs.query_operation_data(code=code, year=year, quarter=quarter)
-                    elif api_function == "query_growth_data":
-                        rs = bs.query_growth_data(code=code, year=year, quarter=quarter)
-                    elif api_function == "query_balance_data":
-                        rs = bs.query_balance_data(code=code, year=year, quarter=quarter)
-                    elif api_function == "query_cash_flow_data":
-                        rs = bs.query_cash_flow_data(code=code, year=year, quarter=quarter)
-                    elif api_function == "query_dupont_data":
-                        rs = bs.query_dupont_data(code=code, year=year, quarter=quarter)
-                    
-                    if rs.error_code == '0':
-                        df = result_to_dataframe(rs)
-                        st.session_state.result_df = df
-                        st.session_state.query_info = f"{api_function}: {code} ({year}Q{quarter})"
-                    else:
-                        st.error(f"Query failed: {rs.error_msg}")
+    elif api_category == "K-Line Data" and (kline_mode := st.radio(
+            "Mode", ["Single stock", "Batch (multi-stock)", "Market screen"], horizontal=True)) != "Single stock":
+        if kline_mode == "Batch (multi-stock)":
+            bulk_kline_form()
+        else:
+            market_screen_form()
     
-    # Company Reports APIs
-    elif api_category == "Company Reports":
-        code = stock_selector("Stock Code", key="report_code", help_text="Select stock for company reports")
-        if not code:
-            code = "sh.600000"  # Default value
-        start_date_input = st.date_input("Start Date", value=datetime.now() - timedelta(days=365))
-        end_date_input = st.date_input("End Date", value=datetime.now())
-        
-        if st.button("Execute Query", type="primary"):
-            if login_baostock():
-                with st.spinner("Querying data..."):
-                    if api_function == "query_performance_express_report":
-                        rs = bs.query_performance_express_report(
-                            code,
-                            start_date=start_date_input.strftime("%Y-%m-%d"),
-                            end_date=end_date_input.strftime("%Y-%m-%d")
-                        )
-                    elif api_function == "query_forecast_report":
-                        rs = bs.query_forecast_report(
-                            code,
-                            start_date=start_date_input.strftime("%Y-%m-%d"),
-                            end_date=end_date_input.strftime("%Y-%m-%d")
-                        )
-                    
-                    if rs.error_code == '0':
-                        df = result_to_dataframe(rs)
-                        st.session_state.result_df = df
-                        st.session_state.query_info = f"{api_function}: {code}"
-                    else:
-                        st.error(f"Query failed: {rs.error_msg}")
+    elif api_category == "Financial Data" and st.radio(
+            "Mode", ["Single quarter", "Sweep (multi-period)"], horizontal=True,
+            key="financial_mode") == "Sweep (multi-period)":
+        financial_sweep_form()
     
-    # Security Info APIs
-    elif api_category == "Security Info":
-        if api_function == "query_trade_dates":
-            start_date_input = st.date_input("Start Date", value=datetime.now() - timedelta(days=30))
-            end_date_input = st.date_input("End Date", value=datetime.now())
-            
-            if st.button("Execute Query", type="primary"):
-                if login_baostock():
-                    with st.spinner("Querying data..."):
-                        rs = bs.query_trade_dates(
-                            start_date=start_date_input.strftime("%Y-%m-%d"),
-                            end_date=end_date_input.strftime("%Y-%m-%d")
-                        )
-                        if rs.error_code == '0':
-                            df = result_to_dataframe(rs)
-                            st.session_state.result_df = df
-                            st.session_state.query_info = "Trade Dates"
-                        else:
-                            st.error(f"Query failed: {rs.error_msg}")
+    else:
+        spec = get_spec(api_function)
+        inputs = query_form(spec)
         
-        elif api_function == "query_all_stock":
-            day_input = st.date_input("Query Date", value=datetime.now())
-            
-            if st.button("Execute Query", type="primary"):
-                if login_baostock():
-                    with st.spinner("Querying data..."):
-                        rs = bs.query_all_stock(day=day_input.strftime("%Y-%m-%d"))
-                        if rs.error_code == '0':
-                            df = result_to_dataframe(rs)
-                            st.session_state.result_df = df
-                            st.session_state.query_info = f"All Stocks ({day_input})"
-                        else:
-                            st.error(f"Query failed: {rs.error_msg}")
+        query_form_button(api_function, inputs)
         
-        elif api_function == "query_stock_basic":
-            use_selector = st.checkbox("Use stock selector", value=False, help="Check to use dropdown selector")
-            
-            if use_selector:
-                code = stock_selector("Stock Code", key="basic_code", help_text="Select stock for basic info")
-                code_name = ""
-            else:
-                code = st.text_input("Stock Code", value="", help="Leave empty to query all stocks")
-                code_name = st.text_input("Stock Name", value="", help="Support fuzzy search, leave empty to query all")
-            
-            st.info("💡 Tip: Leave both fields empty to get all A-share stocks basic information")
-            
-            if st.button("Execute Query", type="primary"):
-                if login_baostock():
-                    with st.spinner("Querying data..."):
-                        # If both parameters are empty, query all stocks
-                        if not code and not code_name:
-                            rs = bs.query_stock_basic()
-                            query_desc = "All Stocks"
-                        elif code:
-                            rs = bs.query_stock_basic(code=code)
-                            query_desc = f"Code: {code}"
-                        else:
-                            rs = bs.query_stock_basic(code_name=code_name)
-                            query_desc = f"Name: {code_name}"
-                        
-                        if rs.error_code == '0':
-                            df = result_to_dataframe(rs)
-                            st.session_state.result_df = df
-                            st.session_state.query_info = f"Stock Basic Info - {query_desc}"
-                        else:
-                            st.error(f"Query failed: {rs.error_msg}")
-    
-    # Macro Economy APIs
-    elif api_category == "Macro Economy":
-        if api_function in ["query_money_supply_data_month"]:
-            start_date_str = st.text_input("Start Date (YYYY-MM)", value="2023-01")
-            end_date_str = st.text_input("End Date (YYYY-MM)", value="2023-12")
-        elif api_function in ["query_money_supply_data_year"]:
-            start_date_str = st.text_input("Start Year (YYYY)", value="2020")
-            end_date_str = st.text_input("End Year (YYYY)", value="2023")
-        else:
-            start_date_input = st.date_input("Start Date", value=datetime.now() - timedelta(days=365))
-            end_date_input = st.date_input("End Date", value=datetime.now())
-            start_date_str = start_date_input.strftime("%Y-%m-%d")
-            end_date_str = end_date_input.strftime("%Y-%m-%d")
-        
-        if st.button("Execute Query", type="primary"):
-            if login_baostock():
-                with st.spinner("Querying data..."):
-                    if api_function == "query_deposit_rate_data":
-                        rs = bs.query_deposit_rate_data(start_date=start_date_str, end_date=end_date_str)
-                    elif api_function == "query_loan_rate_data":
-                        rs = bs.query_loan_rate_data(start_date=start_date_str, end_date=end_date_str)
-                    elif api_function == "query_required_reserve_ratio_data":
-                        rs = bs.query_required_reserve_ratio_data(start_date=start_date_str, end_date=end_date_str)
-                    elif api_function == "query_money_supply_data_month":
-                        rs = bs.query_money_supply_data_month(start_date=start_date_str, end_date=end_date_str)
-                    elif api_function == "query_money_supply_data_year":
-                        rs = bs.query_money_supply_data_year(start_date=start_date_str, end_date=end_date_str)
-                    elif api_function == "query_shibor_data":
-                        rs = bs.query_shibor_data(start_date=start_date_str, end_date=end_date_str)
-                    
-                    if rs.error_code == '0':
-                        df = result_to_dataframe(rs)
-                        st.session_state.result_df = df
-                        st.session_state.query_info = api_function
-                    else:
-                        st.error(f"Query failed: {rs.error_msg}")
-    
-    # Sector Data APIs
-    elif api_category == "Sector Data":
         if api_function == "query_stock_industry":
-            code = stock_selector("Stock Code (optional)", key="industry_code", help_text="Select stock or leave empty for all")
-            date_input = st.date_input("Query Date", value=datetime.now())
-            
-            if st.button("Execute Query", type="primary"):
-                if login_baostock():
-                    with st.spinner("Querying data..."):
-                        if code:
-                            rs = bs.query_stock_industry(code=code, date=date_input.strftime("%Y-%m-%d"))
-                        else:
-                            rs = bs.query_stock_industry()
-                        
-                        if rs.error_code == '0':
-                            df = result_to_dataframe(rs)
-                            st.session_state.result_df = df
-                            st.session_state.query_info = "Stock Industry"
-                            # Mark that this is industry data for save button
-                            st.session_state.is_industry_data = True
-                        else:
-                            st.error(f"Query failed: {rs.error_msg}")
-            
             # Add save button for industry data
             st.markdown("---")
             st.markdown("### 💾 Save Industry Data")
-            st.info("💡 Click the button below to save/update industry information to local stock_list.csv")
+            st.info("💡 Click the button below to save/update industry information in the local stock universe")
             
-            if st.button("💾 Save Industry Data to stock_list.csv", type="secondary", use_container_width=True):
+            if st.button("💾 Save Industry Data to Stock Universe", type="secondary", use_container_width=True):
                 if 'result_df' in st.session_state and not st.session_state.result_df.empty:
                     if 'is_industry_data' in st.session_state and st.session_state.is_industry_data:
-                        with st.spinner("Updating stock_list.csv with industry data..."):
+                        with st.spinner("Updating stock universe with industry data..."):
                             if update_stock_list_with_industry(st.session_state.result_df):
-                                st.success("✅ Successfully updated stock_list.csv with industry information!")
+                                st.success("✅ Successfully updated the stock universe with industry information!")
                                 st.balloons()
                             else:
-                                st.error("❌ Failed to update stock_list.csv")
+                                st.error("❌ Failed to update the stock universe")
                     else:
                         st.warning("⚠️ Current data is not industry data. Please query industry data first.")
                 else:
                     st.warning("⚠️ No industry data to save. Please execute query first.")
-        else:
-            date_input = st.date_input("Query Date", value=datetime.now())
-            
-            if st.button("Execute Query", type="primary"):
-                if login_baostock():
-                    with st.spinner("Querying data..."):
-                        if api_function == "query_sz50_stocks":
-                            rs = bs.query_sz50_stocks(date=date_input.strftime("%Y-%m-%d"))
-                        elif api_function == "query_hs300_stocks":
-                            rs = bs.query_hs300_stocks(date=date_input.strftime("%Y-%m-%d"))
-                        elif api_function == "query_zz500_stocks":
-                            rs = bs.query_zz500_stocks(date=date_input.strftime("%Y-%m-%d"))
-                        
-                        if rs.error_code == '0':
-                            df = result_to_dataframe(rs)
-                            st.session_state.result_df = df
-                            st.session_state.query_info = api_function
-                        else:
-                            st.error(f"Query failed: {rs.error_msg}")
 
 # Right column for results
 with col2:
     st.subheader("Query Results")
     
+    # Poll only while one of this session's jobs is still running
+    running = any(not job.done for job in job_manager.jobs(st.session_state.get('job_ids', [])))
+    st.fragment(jobs_panel, run_every=JOB_POLL_SECONDS if running else None)()
+    
     if 'result_df' in st.session_state and not st.session_state.result_df.empty:
         st.info(f"Query: {st.session_state.query_info}")
         st.write(f"Total Records: {len(st.session_state.result_df)}")
         
-        # Display dataframe with tooltips
-        display_dataframe_with_tooltips(st.session_state.result_df, api_category)
+        # Display one page of the result with tooltips; the full frame stays on the server
+        result_view = get_result_view(indicator_selector())
+        # Field descriptions are looked up in the result API's own group ('Profit Data', ...)
+        result_api = st.session_state.get('result_api')
+        paginated_result_grid(result_view, get_spec(result_api).field_group if result_api else "")
         
         # Action buttons
         col_download, col_save = st.columns([1, 1])
         
         with col_download:
-            # Download button
-            csv = st.session_state.result_df.to_csv(index=False).encode('utf-8-sig')
+            # Download button; the file is only written when clicked, then reused for this result
+            export_format = st.radio("Format", list(EXPORT_FORMATS), horizontal=True,
+                                     key="export_format", label_visibility="collapsed")
+            extension, mime = EXPORT_FORMATS[export_format]
             st.download_button(
-                label="📥 Download CSV",
-                data=csv,
-                file_name=f"baostock_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
+                label=f"📥 Download {export_format}",
+                data=get_result_export(result_view).opener(export_format),
+                file_name=f"baostock_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                mime=mime,
+                on_click="ignore",
                 use_container_width=True
             )
         
         with col_save:
             # Save industry data button (only show for industry data)
             if 'is_industry_data' in st.session_state and st.session_state.is_industry_data:
-                if st.button("💾 Save to stock_list.csv", use_container_width=True, type="secondary"):
-                    with st.spinner("Updating stock_list.csv..."):
+                if st.button("💾 Save to Stock Universe", use_container_width=True, type="secondary"):
+                    with st.spinner("Updating stock universe..."):
                         if update_stock_list_with_industry(st.session_state.result_df):
-                            st.success("✅ Successfully updated stock_list.csv!")
+                            st.success("✅ Successfully updated the stock universe!")
                             st.balloons()
                         else:
-                            st.error("❌ Failed to update stock_list.csv")
+                            st.error("❌ Failed to update the stock universe")
         
-        # Show basic statistics for numeric columns
-        numeric_cols = st.session_state.result_df.select_dtypes(include=['float64', 'int64']).columns
-        if len(numeric_cols) > 0:
+        # Show basic statistics for numeric columns (computed once per result)
+        statistics = result_view.statistics()
+        if not statistics.empty:
             with st.expander("View Statistics"):
-                st.write(st.session_state.result_df[numeric_cols].describe())
+                st.write(statistics)
     else:
         st.info("No data to display. Please execute a query from the left panel.")
 
 # Footer
 st.markdown("---")
 st.markdown("**BaoStock Data Browser** | Data source: [www.baostock.com](http://www.baostock.com)")
-
-# Cleanup on app close
-if st.session_state.logged_in:
-    logout_baostock()
@@ -0,0 +1,309 @@
+"""Run BaoStock browser queries from the command line
+
+    python baostock_cli.py list
+    python baostock_cli.py run query_history_k_data_plus -p code=sh.600000 -p start_date=2024-01-01 -o bars.parquet
+    python baostock_cli.py run query_history_k_data_plus -p code=sh.600000 --indicators MA20,RSI14,MACD
+    python baostock_cli.py batch nightly.jsonl --out-dir results --format parquet --workers 4
+    python baostock_cli.py members query_hs300_stocks --start 2020-01-01 --end 2024-12-31 -o hs300.csv
+    python baostock_cli.py market --update --filter "pctChg>9" --rank amount --top 20
+    python baostock_cli.py sql "SELECT code, avg(turn) FROM kline_d GROUP BY code" -o turn.parquet
+
+A batch file has one JSON object per line:
+
+    {"api": "query_profit_data", "params": {"code": "sh.600000", "year": 2023, "quarter": 4}, "name": "pf_600000"}
+
+"name" is optional and becomes the output file name. ``--metrics FILE``
+appends the stage timings of a run or batch to FILE as JSON lines, or as
+Prometheus text when FILE ends in .prom.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from api_registry import API_REGISTRY, API_STRUCTURE
+from call_gateway import get_gateway
+from cross_section import get_cross_section_store, parse_filter, previous_trading_day
+from local_sql import MAX_RESULT_ROWS, get_local_sql
+from index_membership import INDEX_APIS, get_index_membership
+from indicators import get_indicator_engine
+from perf_metrics import get_metrics
+from query_engine import build_params, describe_query, run_query
+from trade_calendar import to_date
+from result_export import EXPORT_FORMATS, WRITERS
+from worker_pool import get_worker_pool
+
+# --format value -> result_export format
+FORMATS = {fmt.lower(): fmt for fmt in EXPORT_FORMATS}
+
+
+def parse_param(text):
+    name, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected name=value, got {text!r}")
+    return name.strip(), value
+
+
+def write_result(df, path, fmt):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    WRITERS[FORMATS[fmt]](df, path)
+
+
+def format_from_path(path, default="parquet"):
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    for fmt, export_format in FORMATS.items():
+        if EXPORT_FORMATS[export_format][0] == extension:
+            return fmt
+    return default
+
+
+def write_metrics(path):
+    metrics = get_metrics()
+    if path.endswith(".prom"):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(metrics.to_prometheus())
+    else:
+        metrics.write_jsonl(path)
+
+
+def cmd_list(args):
+    for category, info in API_STRUCTURE.items():
+        print(f"{info['icon']} {category}")
+        for api_name, description in info['apis'].items():
+            print(f"    {api_name:<36} {description}  ({', '.join(API_REGISTRY[api_name].param_names)})")
+    return 0
+
+
+def cmd_run(args):
+    try:
+        params = build_params(args.api, dict(args.param))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    start = time.perf_counter()
+    df, error_msg = run_query(args.api, params, notify=lambda msg: print(msg, file=sys.stderr))
+    if error_msg is not None:
+        print(f"Query failed: {error_msg}", file=sys.stderr)
+        return 1
+    print(f"{describe_query(args.api, params)}: {len(df)} rows in {time.perf_counter() - start:.1f}s",
+          file=sys.stderr)
+    if args.indicators:
+        try:
+            df = get_indicator_engine().apply(df, args.indicators)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+    if args.output:
+        write_result(df, args.output, args.format or format_from_path(args.output))
+    else:
+        print(df.to_string(max_rows=20))
+    return 0
+
+
+def read_batch(path):
+    """[(name, api_name, params)] from a JSON-lines batch file"""
+    queries = []
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entry = json.loads(line)
+                api_name = entry['api']
+                params = build_params(api_name, entry.get('params', {}))
+            except (ValueError, KeyError) as e:
+                raise ValueError(f"{path}:{line_no}: {e}") from None
+            name = entry.get('name') or f"{len(queries):04d}_{api_name}"
+            queries.append((name, api_name, params))
+    return queries
+
+
+def cmd_batch(args):
+    try:
+        queries = read_batch(args.file)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    if args.rate:
+        get_gateway().set_rate(args.rate)
+    pool = get_worker_pool(args.workers)
+    extension = EXPORT_FORMATS[FORMATS[args.format]][0]
+    started = time.perf_counter()
+
+    def run_one(name, api_name, params):
+        df, error_msg = run_query(api_name, params, pool=pool)
+        if error_msg is None:
+            write_result(df, os.path.join(args.out_dir, f"{name}.{extension}"), args.format)
+            return len(df), None
+        return 0, error_msg
+
+    failures = 0
+    # Threads only wait on the worker processes and write files, so they can outnumber the workers
+    with ThreadPoolExecutor(max_workers=args.workers * 2) as executor:
+        futures = {executor.submit(run_one, *query): query for query in queries}
+        for future in as_completed(futures):
+            name, api_name, _ = futures[future]
+            try:
+                rows, error_msg = future.result()
+            except Exception as e:
+                rows, error_msg = 0, str(e)
+            if error_msg is not None:
+                failures += 1
+                print(f"FAIL {name} ({api_name}): {error_msg}", file=sys.stderr)
+            else:
+                print(f"ok   {name} ({api_name}): {rows} rows", file=sys.stderr)
+    gateway = get_gateway().stats()
+    print(f"{len(queries) - failures}/{len(queries)} queries succeeded in {time.perf_counter() - started:.1f}s "
+          f"({gateway['retried']} retries, {gateway['throttled']} throttled)", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def cmd_members(args):
+    start = args.start or args.date
+    end = args.end or args.date or start
+    history, error_msg = get_index_membership().history(args.index, start, end,
+                                                        pool=get_worker_pool(args.workers))
+    if error_msg is not None:
+        print(f"Membership history failed: {error_msg}", file=sys.stderr)
+        return 1
+    if args.date:
+        codes = history.constituents(min(to_date(args.date), history.end))
+        df = history.intervals[history.intervals['code'].isin(codes)].drop_duplicates('code')[['code', 'code_name']]
+    else:
+        codes = history.members_between(history.start, history.end)
+        df = history.intervals
+    print(f"{args.index}: {len(codes)} codes, {len(history.intervals)} membership intervals "
+          f"{history.start} → {history.end}", file=sys.stderr)
+    if args.output:
+        write_result(df, args.output, args.format or format_from_path(args.output))
+    else:
+        print(df.to_string(max_rows=20, index=False))
+    return 0
+
+
+def cmd_market(args):
+    market = get_cross_section_store()
+    end = args.end or previous_trading_day().isoformat()
+    start = args.start or end
+    if args.update:
+        def on_progress(p):
+            if p.done == p.total or p.done % 500 == 0:
+                print(f"{p.done}/{p.total} codes, {p.rows:,} rows, {len(p.failures)} failed", file=sys.stderr)
+        stats, error_msg = market.update(start, end, get_worker_pool(args.workers), progress=on_progress)
+        if error_msg is not None:
+            print(f"Update failed: {error_msg}", file=sys.stderr)
+            return 1
+        if stats is not None:
+            print(f"{len(stats.succeeded)} codes, {stats.rows:,} new rows in {stats.elapsed:.1f}s", file=sys.stderr)
+    try:
+        if args.rank:
+            df, error_msg = market.top(start, end, args.rank, args.top, args.ascending, args.filter)
+        else:
+            df, error_msg = market.read(start, end, filters=args.filter)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if error_msg is not None:
+        print(f"Screen failed: {error_msg}", file=sys.stderr)
+        return 1
+    print(f"Market {start} → {end}: {len(df)} rows", file=sys.stderr)
+    if args.output:
+        write_result(df, args.output, args.format or format_from_path(args.output))
+    else:
+        print(df.to_string(max_rows=40, index=False))
+    return 0
+
+
+def cmd_sql(args):
+    local_sql = get_local_sql()
+    if args.query is None:
+        print(local_sql.tables().to_string(index=False))
+        return 0
+    started = time.perf_counter()
+    df, error_msg = local_sql.run(args.query, args.max_rows)
+    if error_msg is not None:
+        print(error_msg, file=sys.stderr)
+        return 1
+    print(f"{len(df):,} rows in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    if args.output:
+        write_result(df, args.output, args.format or format_from_path(args.output))
+    else:
+        print(df.to_string(max_rows=40, index=False))
+    return 0
+
+
+def _filter_arg(text):
+    try:
+        return parse_filter(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="List the available APIs and their parameters")
+
+    run = commands.add_parser("run", help="Run one query")
+    run.add_argument("api")
+    run.add_argument("-p", "--param", type=parse_param, action="append", default=[], metavar="NAME=VALUE")
+    run.add_argument("-o", "--output", help="Write the result to this file instead of printing it")
+    run.add_argument("--format", choices=sorted(FORMATS), help="Output format (default: from the file extension)")
+    run.add_argument("--indicators", metavar="LIST",
+                     help="Add indicator columns to K-line results, e.g. MA20,EMA12,RSI14,MACD,ATR14,BOLL20")
+
+    batch = commands.add_parser("batch", help="Run a JSON-lines file of queries in parallel")
+    batch.add_argument("file")
+    batch.add_argument("--out-dir", default="results")
+    batch.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    batch.add_argument("--workers", type=int, default=4, help="BaoStock worker processes")
+    batch.add_argument("--rate", type=float, help="Requests per second across all workers (default: BAOSTOCK_RATE or 20)")
+
+    members = commands.add_parser("members", help="Index membership intervals, or the constituents on one date")
+    members.add_argument("index", choices=INDEX_APIS)
+    members.add_argument("--date", help="Constituents on this date")
+    members.add_argument("--start", help="Start of the membership history (default: --date)")
+    members.add_argument("--end", help="End of the membership history (default: --date, or today)")
+    members.add_argument("-o", "--output", help="Write the result to this file instead of printing it")
+    members.add_argument("--format", choices=sorted(FORMATS), help="Output format (default: from the file extension)")
+    members.add_argument("--workers", type=int, default=4, help="BaoStock worker processes")
+
+    market = commands.add_parser("market", help="Screen and rank the whole market's daily bars")
+    market.add_argument("--start", help="First day (default: --end)")
+    market.add_argument("--end", help="Last day (default: the last trading day with final bars)")
+    market.add_argument("--update", action="store_true", help="Download the missing days of the range first")
+    market.add_argument("--filter", type=_filter_arg, action="append", default=[], metavar="EXPR",
+                        help="Condition such as pctChg>9 or isST=0; repeat to combine")
+    market.add_argument("--rank", metavar="COLUMN", help="Rank each day's rows by this column")
+    market.add_argument("--top", type=int, default=20, help="Rows kept per day when ranking")
+    market.add_argument("--ascending", action="store_true", help="Rank smallest first")
+    market.add_argument("-o", "--output", help="Write the result to this file instead of printing it")
+    market.add_argument("--format", choices=sorted(FORMATS), help="Output format (default: from the file extension)")
+    market.add_argument("--workers", type=int, default=4, help="BaoStock worker processes")
+
+    sql = commands.add_parser("sql", help="Run SQL over everything stored locally; without a query, list the tables")
+    sql.add_argument("query", nargs="?", help="Read-only DuckDB query (SELECT, WITH, DESCRIBE, SUMMARIZE, SHOW)")
+    sql.add_argument("--max-rows", type=int, default=MAX_RESULT_ROWS, help="Rows of the result kept")
+    sql.add_argument("-o", "--output", help="Write the result to this file instead of printing it")
+    sql.add_argument("--format", choices=sorted(FORMATS), help="Output format (default: from the file extension)")
+
+    for command in (run, batch):
+        command.add_argument("--metrics", metavar="FILE", help="Write stage timings (JSON lines, or .prom)")
+
+    args = parser.parse_args(argv)
+    handler = {'list': cmd_list, 'run': cmd_run, 'batch': cmd_batch, 'members': cmd_members,
+               'market': cmd_market,
+               'sql': cmd_sql}[args.command]
+    status = handler(args)
+    if getattr(args, 'metrics', None):
+        write_metrics(args.metrics)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
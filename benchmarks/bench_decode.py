@@ -0,0 +1,84 @@
+"""Compare the old row-by-row result_to_dataframe with the typed columnar decoder
+
+Runs offline on a synthetic 5-minute K-line fixture:
+
+    python benchmarks/bench_decode.py --rows 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from bs_session import ResultSnapshot
+from result_decoder import decode_result
+
+FIELDS = "date,time,code,open,high,low,close,volume,amount,adjustflag".split(",")
+
+
+def make_fixture(n_rows, seed=0):
+    """5-minute bars for sh.600000 rendered as BaoStock strings"""
+    rnd = random.Random(seed)
+    rows = []
+    t = datetime(2015, 1, 5, 9, 35)
+    price = 10.0
+    for _ in range(n_rows):
+        price = max(0.5, price + rnd.uniform(-0.05, 0.05))
+        rows.append([
+            t.strftime("%Y-%m-%d"), t.strftime("%Y%m%d%H%M%S000"), "sh.600000",
+            f"{price:.4f}", f"{price + 0.02:.4f}", f"{price - 0.02:.4f}", f"{price + 0.01:.4f}",
+            str(rnd.randint(1000, 500000)), f"{rnd.uniform(1e4, 1e7):.4f}", "3",
+        ])
+        t += timedelta(minutes=5)
+    return rows
+
+
+def legacy_result_to_dataframe(rs):
+    """The original implementation, kept here for comparison"""
+    data_list = []
+    while (rs.error_code == '0') & rs.next():
+        data_list.append(rs.get_row_data())
+    if data_list:
+        return pd.DataFrame(data_list, columns=rs.fields)
+    return pd.DataFrame()
+
+
+def measure(label, decoder, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        rs = ResultSnapshot('0', 'success', FIELDS, rows)
+        start = time.perf_counter()
+        df = decoder(rs)
+        best = min(best, time.perf_counter() - start)
+
+    rs = ResultSnapshot('0', 'success', FIELDS, rows)
+    tracemalloc.start()
+    df = decoder(rs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    frame_mb = df.memory_usage(deep=True).sum() / 1e6
+    numeric = len(df.select_dtypes(include=['float64', 'int64']).columns)
+    print(f"{label:<10} best={best * 1000:8.1f} ms  peak={peak / 1e6:7.1f} MB  "
+          f"frame={frame_mb:7.1f} MB  numeric columns={numeric}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_fixture(args.rows)
+    measure("legacy", legacy_result_to_dataframe, rows, args.repeat)
+    measure("typed", decode_result, rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
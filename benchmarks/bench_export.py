@@ -0,0 +1,53 @@
+"""Compare the old per-rerun CSV encode with the lazy, chunked exports
+
+    python benchmarks/bench_export.py --rows 1000000
+    python benchmarks/bench_export.py --rows 100000 --memory   # peak memory; slow under tracemalloc
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_result_grid import make_frame
+from result_export import EXPORT_FORMATS, ResultExport
+
+
+def measure(func, memory=False):
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    peak = 0
+    if memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return seconds, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--memory", action="store_true", help="also trace peak Python memory")
+    args = parser.parse_args()
+    df = make_frame(args.rows)
+
+    seconds, peak, data = measure(lambda: df.to_csv(index=False).encode('utf-8-sig'), args.memory)
+    print(f"legacy csv (every rerun)   {seconds * 1000:8.0f} ms  peak {peak / 1e6:7.1f} MB  "
+          f"size {len(data) / 1e6:7.1f} MB")
+
+    export = ResultExport(df)
+    for fmt in EXPORT_FORMATS:
+        seconds, peak, path = measure(lambda: export.path(fmt), args.memory)
+        again, _, _ = measure(lambda: export.path(fmt))
+        print(f"{fmt:<8} first click          {seconds * 1000:8.0f} ms  peak {peak / 1e6:7.1f} MB  "
+              f"size {os.path.getsize(path) / 1e6:7.1f} MB  (repeat {again * 1e6:.0f} us, rerun 0 ms)")
+
+
+if __name__ == "__main__":
+    main()
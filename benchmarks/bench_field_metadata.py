@@ -0,0 +1,80 @@
+"""Compare the old iterrows field-description load and per-rerun tooltip build with the memoized metadata
+
+Runs offline against the bundled field_descriptions.csv:
+
+    python benchmarks/bench_field_metadata.py --reruns 200
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+from field_metadata import FIELD_DESC_FILE, FieldMetadata
+from kline_store import DAILY_FIELDS
+
+
+def legacy_load(path):
+    """The original load_field_descriptions body"""
+    df = pd.read_csv(path, encoding='utf-8-sig')
+    desc_dict = {}
+    for _, row in df.iterrows():
+        desc_dict[row['field_name']] = {
+            'category': row['api_category'],
+            'description': row['field_description'],
+            'detail': row['field_detail']
+        }
+    return desc_dict
+
+
+def legacy_rerun(field_desc, columns):
+    """Help texts and panel entries rebuilt on every rerun"""
+    config = {}
+    panel = []
+    for col_name in columns:
+        info = field_desc.get(col_name)
+        if info is not None:
+            help_text = info['description']
+            if info['detail']:
+                help_text += f"\n{info['detail']}"
+            panel.append((col_name, info['description'], info['detail']))
+        else:
+            help_text = f"{col_name} (No description available)"
+            panel.append((col_name, None, None))
+        config[col_name] = {'label': col_name, 'help': help_text, 'width': 'medium'}
+    return config, panel
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=200)
+    args = parser.parse_args()
+    columns = tuple(DAILY_FIELDS.split(","))
+
+    print(f"load     legacy={best_of(lambda: legacy_load(FIELD_DESC_FILE), 10) * 1000:7.2f} ms  "
+          f"vectorized={best_of(lambda: FieldMetadata(FIELD_DESC_FILE), 10) * 1000:7.2f} ms")
+
+    field_desc = legacy_load(FIELD_DESC_FILE)
+    metadata = FieldMetadata(FIELD_DESC_FILE)
+    metadata.schema(columns, "K-Line Data")
+    legacy = best_of(lambda: legacy_rerun(field_desc, columns), args.reruns)
+    memo = best_of(lambda: metadata.schema(columns, "K-Line Data"), args.reruns)
+    print(f"rerun    legacy={legacy * 1e6:7.1f} us  memoized={memo * 1e6:7.1f} us  "
+          f"({len(columns)} columns, panel widgets {len(columns) * 4} -> 1)")
+
+
+if __name__ == "__main__":
+    main()
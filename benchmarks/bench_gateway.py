@@ -0,0 +1,99 @@
+"""Throughput against a throttling server: fixed per-worker pacing vs the adaptive call gateway
+
+Runs offline against a simulated server that drops requests once more than
+``--capacity`` are in flight:
+
+    python benchmarks/bench_gateway.py --calls 400 --workers 8 --capacity 3
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from call_gateway import TRANSIENT_ERROR_CODES, CallGateway, CircuitBreaker
+
+# Scaled-down timings so a run takes seconds
+SERVICE_SECONDS = 0.01
+BACKOFF = 0.05
+
+
+class ThrottlingServer:
+    """Answers in SERVICE_SECONDS while under capacity; beyond it, requests fail after a timeout"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.in_flight = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def call(self):
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+            overloaded = self.in_flight > self.capacity
+        try:
+            # A dropped request costs the client a receive timeout
+            time.sleep(SERVICE_SECONDS * (3 if overloaded else 1))
+            return '10002007' if overloaded else '0'
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def fixed_pacing(server, calls, workers, retries=3):
+    """What the worker pool used to do: every worker retries on its own, at a fixed concurrency"""
+    def one(_):
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            if server.call() not in TRANSIENT_ERROR_CODES:
+                return True
+        return False
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(one, range(calls)))
+
+
+def gateway_pacing(server, calls, workers):
+    gateway = CallGateway(rate=10_000, concurrency=workers, max_concurrency=workers, backoff=BACKOFF,
+                          breaker=CircuitBreaker(failures=10_000))
+
+    def one(_):
+        error_code, _ = gateway.call(lambda: (server.call(), None))
+        return error_code == '0'
+
+    with ThreadPoolExecutor(max_workers=workers * 2) as executor:
+        ok = sum(executor.map(one, range(calls)))
+    return ok, gateway.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--capacity", type=int, default=3, help="concurrent requests the server accepts")
+    args = parser.parse_args()
+
+    server = ThrottlingServer(args.capacity)
+    start = time.perf_counter()
+    ok = fixed_pacing(server, args.calls, args.workers)
+    seconds = time.perf_counter() - start
+    print(f"fixed    {ok}/{args.calls} ok in {seconds:6.2f}s  {ok / seconds:7.1f} calls/s  "
+          f"{server.requests} requests sent")
+
+    server = ThrottlingServer(args.capacity)
+    start = time.perf_counter()
+    ok, stats = gateway_pacing(server, args.calls, args.workers)
+    seconds = time.perf_counter() - start
+    print(f"gateway  {ok}/{args.calls} ok in {seconds:6.2f}s  {ok / seconds:7.1f} calls/s  "
+          f"{server.requests} requests sent  (limit settled at {stats['limit']}, {stats['retried']} retries)")
+
+
+if __name__ == "__main__":
+    main()
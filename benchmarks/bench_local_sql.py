@@ -0,0 +1,94 @@
+"""Local SQL: DuckDB over the K-line store files vs loading the same files into pandas
+
+Writes a synthetic daily K-line store (one Parquet file per code, laid out
+like cache/kline) and times typical queries, the first one including the
+Parquet footer reads:
+
+    python benchmarks/bench_local_sql.py --codes 5000 --days 2500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH)
+sys.path.insert(0, ROOT)
+# The stand-in client, so importing the module needs no BaoStock install
+sys.path.insert(0, os.path.join(BENCH, "standin"))
+
+import numpy as np
+import pandas as pd
+
+from local_sql import LocalSQL
+
+QUERIES = {
+    'count': "SELECT count(*) FROM kline_d",
+    'aggregate': "SELECT code, avg(pctChg) AS pct, sum(amount) AS amount FROM kline_d "
+                 "WHERE date >= DATE '2020-01-01' GROUP BY code ORDER BY amount DESC LIMIT 20",
+    'one code': "SELECT date, close FROM kline_d WHERE code = 'sh.600100' ORDER BY date",
+    'limit-ups': "SELECT date, count(*) AS n FROM kline_d WHERE pctChg > 9.9 GROUP BY date ORDER BY n DESC LIMIT 10",
+}
+
+
+class NoCache:
+    def entry_files(self):
+        return {}
+
+
+def write_store(root, codes, days):
+    dates = pd.bdate_range("2014-01-01", periods=days)
+    rnd = np.random.default_rng(0)
+    for i in range(codes):
+        code = f"sh.{600000 + i}"
+        pct = rnd.normal(0, 2, days).clip(-10, 10)
+        close = 10 * np.cumprod(1 + pct / 100)
+        df = pd.DataFrame({
+            'date': dates, 'code': code, 'open': close, 'high': close * 1.01, 'low': close * 0.99,
+            'close': close, 'preclose': np.r_[close[0], close[:-1]],
+            'volume': rnd.integers(1e5, 1e7, days), 'amount': close * rnd.integers(1e5, 1e7, days),
+            'adjustflag': '3', 'turn': rnd.random(days), 'tradestatus': '1', 'pctChg': pct,
+        })
+        series_dir = os.path.join(root, code, "d_3")
+        os.makedirs(series_dir)
+        df.to_parquet(os.path.join(series_dir, "bars.parquet"), index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--codes", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=2500, help="trading days per code")
+    parser.add_argument("--pandas", action="store_true", help="also time loading every file into pandas")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="local_sql_")
+    started = time.perf_counter()
+    write_store(root, args.codes, args.days)
+    print(f"{args.codes:,} codes × {args.days:,} days = {args.codes * args.days:,} rows "
+          f"written in {time.perf_counter() - started:.1f}s")
+
+    engine = LocalSQL(kline_root=root, cross_section_root=os.path.join(root, "none"),
+                      membership_root=os.path.join(root, "none"), query_cache=NoCache(),
+                      universe_file=os.path.join(root, "none"))
+    for name, sql in QUERIES.items():
+        timings = []
+        for _ in range(3):
+            started = time.perf_counter()
+            df, error_msg = engine.run(sql)
+            timings.append(time.perf_counter() - started)
+            if error_msg is not None:
+                raise SystemExit(error_msg)
+        print(f"{name:10} first {timings[0]:6.2f}s   then {min(timings[1:]):6.2f}s   {len(df):,} rows")
+
+    if args.pandas:
+        started = time.perf_counter()
+        paths = [os.path.join(root, code, "d_3", "bars.parquet") for code in sorted(os.listdir(root))]
+        df = pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+        df[df['date'] >= '2020-01-01'].groupby('code')['amount'].sum().nlargest(20)
+        print(f"pandas     load + aggregate {time.perf_counter() - started:6.2f}s, "
+              f"{df.memory_usage(deep=True).sum() / 1024 ** 3:.1f} GB resident")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Index membership history: snapshots fetched by sampling and bisection vs one per trading day
+
+Runs offline against a simulated index that is rebalanced twice a year plus
+a few one-off replacements, checks every trading day against the truth and
+times the as-of lookups:
+
+    python benchmarks/bench_membership.py --years 10 --size 300
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH)
+sys.path.insert(0, ROOT)
+# The stand-in client, so importing the module needs no BaoStock install
+sys.path.insert(0, os.path.join(BENCH, "standin"))
+
+import numpy as np
+import pandas as pd
+
+from index_membership import IndexMembership
+
+INDEX = 'query_hs300_stocks'
+
+
+class SimulatedIndex:
+    """Constituents that change on rebalance days; answers like BaoStock's index queries"""
+
+    def __init__(self, days, size, seed=0):
+        rnd = random.Random(seed)
+        pool = [f"sh.{600000 + i}" for i in range(size * 4)]
+        members = set(rnd.sample(pool, size))
+        self.changes = [(days[0], frozenset(members))]
+        for day in days[1:]:
+            rebalance = day.month in (6, 12) and 8 <= day.day <= 14 and day.weekday() == 0
+            if rebalance or rnd.random() < 0.004:
+                leaving = rnd.sample(sorted(members), rnd.randint(5, size // 10) if rebalance else 1)
+                joining = rnd.sample([c for c in pool if c not in members], len(leaving))
+                members = (members - set(leaving)) | set(joining)
+                self.changes.append((day, frozenset(members)))
+        self._days = np.array([d for d, _ in self.changes], dtype='datetime64[D]')
+
+    def members(self, day):
+        return self.changes[np.searchsorted(self._days, np.datetime64(day, 'D'), side='right') - 1]
+
+    def fetch(self, func, date):
+        updated, members = self.members(date)
+        codes = sorted(members)
+        return pd.DataFrame({'updateDate': updated.isoformat(), 'code': codes, 'code_name': codes}), None
+
+
+class WeekdayCalendar:
+    def __init__(self, days):
+        self.days = np.array(days, dtype='datetime64[D]')
+
+    def trading_days(self, start, end):
+        lo = np.searchsorted(self.days, np.datetime64(start, 'D'))
+        hi = np.searchsorted(self.days, np.datetime64(end, 'D'), side='right')
+        return self.days[lo:hi], None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--size", type=int, default=300, help="constituents")
+    parser.add_argument("--lookups", type=int, default=10_000)
+    args = parser.parse_args()
+
+    start = date(2024 - args.years, 1, 1)
+    days = [start + timedelta(days=i) for i in range((date(2023, 12, 31) - start).days + 1)]
+    days = [d for d in days if d.weekday() < 5]
+    index = SimulatedIndex(days, args.size)
+    membership = IndexMembership(query_cache=index, calendar=WeekdayCalendar(days),
+                                 root=tempfile.mkdtemp(prefix="membership_"))
+
+    started = time.perf_counter()
+    history, error_msg = membership.history(INDEX, days[0], days[-1])
+    if error_msg is not None:
+        raise SystemExit(error_msg)
+    print(f"{len(days):,} trading days, {len(index.changes) - 1} changes: {membership.snapshots} snapshots "
+          f"instead of {len(days):,} ({time.perf_counter() - started:.2f}s), "
+          f"{len(history.intervals):,} intervals")
+
+    wrong = [d for d in days if set(history.constituents(d)) != index.members(d)[1]]
+    print(f"constituents match the truth on {len(days) - len(wrong):,}/{len(days):,} days")
+
+    rnd = random.Random(1)
+    probes = [rnd.choice(days) for _ in range(args.lookups)]
+    codes = sorted(set().union(*(m for _, m in index.changes)))
+    started = time.perf_counter()
+    for day in probes:
+        history.constituents(day)
+    as_of = (time.perf_counter() - started) / len(probes)
+    started = time.perf_counter()
+    for day in probes:
+        history.contains(rnd.choice(codes), day)
+    contains = (time.perf_counter() - started) / len(probes)
+    print(f"constituents(day) {as_of * 1e6:7.1f} µs   contains(code, day) {contains * 1e6:7.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
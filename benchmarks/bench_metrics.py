@@ -0,0 +1,42 @@
+"""Overhead of timing a stage, compared with an empty loop
+
+    python benchmarks/bench_metrics.py --spans 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from perf_metrics import MetricsRecorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spans", type=int, default=1_000_000)
+    args = parser.parse_args()
+    recorder = MetricsRecorder()
+
+    start = time.perf_counter()
+    for _ in range(args.spans):
+        pass
+    empty = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.spans):
+        with recorder.timed('query', 'query_trade_dates') as span:
+            with recorder.timed('server'):
+                pass
+            span.set(rows=10)
+    nested = time.perf_counter() - start
+
+    per_span = (nested - empty) / (args.spans * 2)
+    print(f"{args.spans * 2:,} spans: {per_span * 1e6:.2f} us per span "
+          f"(ring buffer holds {len(recorder.records()):,} records)")
+    print(f"summary over the buffer: {recorder.summary()[0]['p50_ms']:.4f} ms p50")
+
+
+if __name__ == "__main__":
+    main()
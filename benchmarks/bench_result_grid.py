@@ -0,0 +1,78 @@
+"""Browser payload and rerun time: whole result vs one server-side page
+
+st.dataframe ships its frame to the browser as Arrow IPC, so the payload is
+measured as the serialized size of what each approach hands to it:
+
+    python benchmarks/bench_result_grid.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from result_grid import DEFAULT_PAGE_SIZE, ResultView
+
+
+def make_frame(n_rows, seed=0):
+    """Minute-bar shaped result with typed columns"""
+    rng = np.random.default_rng(seed)
+    close = 10 + rng.standard_normal(n_rows).cumsum() * 0.01
+    return pd.DataFrame({
+        'date': pd.Timestamp("2015-01-05") + pd.to_timedelta(np.arange(n_rows) // 48, unit='D'),
+        'time': pd.Timestamp("2015-01-05 09:35") + pd.to_timedelta(np.arange(n_rows) * 5, unit='min'),
+        'code': pd.Categorical(rng.choice(["sh.600000", "sz.000001", "sh.601398"], n_rows)),
+        'open': close + 0.01, 'high': close + 0.02, 'low': close - 0.02, 'close': close,
+        'volume': rng.integers(1000, 500000, n_rows),
+        'amount': rng.uniform(1e4, 1e7, n_rows),
+    })
+
+
+def arrow_bytes(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().size
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    filters = [("code", "=", "sh.600000")]
+    for n_rows in args.sizes:
+        df = make_frame(n_rows)
+        full_seconds, full_bytes = timed(lambda: arrow_bytes(df))
+
+        view = ResultView(df)
+        first_seconds, _ = timed(lambda: view.page(1, DEFAULT_PAGE_SIZE, "close", False, filters))
+        # Later reruns (page flips, unrelated widgets) hit the cached row order
+        rerun_seconds, (page_df, total, pages) = timed(
+            lambda: view.page(pages_mid(view, filters), DEFAULT_PAGE_SIZE, "close", False, filters)
+        )
+        page_bytes = arrow_bytes(page_df)
+        print(f"{n_rows:>9} rows  full: {full_bytes / 1e6:8.2f} MB {full_seconds * 1000:8.1f} ms  |  "
+              f"page: {page_bytes / 1e3:6.1f} KB, first sort+filter {first_seconds * 1000:7.1f} ms, "
+              f"rerun {rerun_seconds * 1000:5.2f} ms ({total} matching, {pages} pages)")
+
+
+def pages_mid(view, filters):
+    return max(1, len(view.rows("close", False, filters)) // DEFAULT_PAGE_SIZE // 2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Simulate many sessions asking for the same result, with and without the shared result store
+
+Runs offline; the "server call" is a sleep that builds an HS300-sized frame:
+
+    python benchmarks/bench_result_store.py --sessions 10 --latency 0.5
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+from result_store import ResultStore, frame_bytes
+
+
+def make_constituents(rows=300):
+    return pd.DataFrame({
+        'updateDate': ['2024-01-02'] * rows,
+        'code': [f"sh.{600000 + i}" for i in range(rows)],
+        'code_name': [f"股票{i}" for i in range(rows)],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per simulated server call")
+    args = parser.parse_args()
+    calls = []
+
+    def server_call():
+        calls.append(1)
+        time.sleep(args.latency)
+        return make_constituents(), None
+
+    params = {'date': '2024-01-02'}
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        start = time.perf_counter()
+        frames = [df for df, _ in executor.map(lambda _: server_call(), range(args.sessions))]
+        seconds = time.perf_counter() - start
+    resident = sum(frame_bytes(df) for df in frames)
+    print(f"per-session      calls {len(calls):3d}  wall {seconds:5.2f} s  resident {resident / 1e3:8.1f} kB")
+
+    calls.clear()
+    store = ResultStore()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        start = time.perf_counter()
+        frames = [df for df, _ in executor.map(
+            lambda _: store.get_or_compute('query_hs300_stocks', params, server_call), range(args.sessions)
+        )]
+        seconds = time.perf_counter() - start
+    resident = sum(frame_bytes(df) for df in {id(df): df for df in frames}.values())
+    stats = store.stats()
+    print(f"shared store     calls {len(calls):3d}  wall {seconds:5.2f} s  resident {resident / 1e3:8.1f} kB  "
+          f"(shared in-flight {stats['shared']}, hit rate {stats['hit_rate']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
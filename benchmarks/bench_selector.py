@@ -0,0 +1,68 @@
+"""Compare the old per-rerun selector option build with the indexed stock universe
+
+Runs offline against the bundled stock_list.csv:
+
+    python benchmarks/bench_selector.py --reruns 50
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+from stock_universe import StockUniverse
+
+QUERIES = ["600000", "sh.6000", "浦发", "银行", "pufa", "000001", "平安银行", "中国"]
+
+
+def legacy_rerun(stock_list):
+    """What stock_selector used to do on every rerun"""
+    stock_list['display'] = stock_list['code'] + ' - ' + stock_list['code_name']
+    options = [''] + stock_list['display'].tolist()
+    selected = options[len(options) // 2]
+    return selected.split(' - ')[0], len(options)
+
+
+def indexed_rerun(universe, query):
+    options = universe.search(query)
+    labels = [universe.label(c) for c in options]
+    return (options[0] if options else ""), len(labels)
+
+
+def best_of(func, reruns):
+    best = float("inf")
+    result = None
+    for _ in range(reruns):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file", default=os.path.join(ROOT, "stock_list.csv"))
+    parser.add_argument("--reruns", type=int, default=50)
+    args = parser.parse_args()
+
+    stock_list = pd.read_csv(args.file, encoding='utf-8-sig', dtype={'code': str})
+    print(f"{len(stock_list)} stocks")
+
+    seconds, (_, n_options) = best_of(lambda: legacy_rerun(stock_list), args.reruns)
+    print(f"legacy     per rerun={seconds * 1000:8.2f} ms  options sent={n_options}")
+
+    start = time.perf_counter()
+    universe = StockUniverse(stock_list)
+    print(f"universe   build (once per process)={(time.perf_counter() - start) * 1000:8.2f} ms")
+
+    for query in QUERIES:
+        seconds, (_, n_options) = best_of(lambda: indexed_rerun(universe, query), args.reruns)
+        print(f"search {query!r:<12} per rerun={seconds * 1000:8.3f} ms  options sent={n_options}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Compare per-query latency with a login per query against a reused session
+
+Needs network access to the BaoStock server:
+
+    python benchmarks/bench_session.py --queries 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import baostock as bs
+
+from bs_session import BaoStockSession, drain_result
+
+
+def run_query():
+    return bs.query_trade_dates(start_date="2024-01-01", end_date="2024-01-31")
+
+
+def login_per_query(n):
+    """Old behaviour: every query pays for bs.login() and bs.logout()"""
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        bs.login()
+        drain_result(run_query())
+        bs.logout()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def reused_session(n):
+    session = BaoStockSession(keepalive_interval=0)
+    samples = []
+    try:
+        for _ in range(n):
+            start = time.perf_counter()
+            session.query(bs.query_trade_dates, start_date="2024-01-01", end_date="2024-01-31")
+            samples.append(time.perf_counter() - start)
+    finally:
+        session.logout()
+    return samples
+
+
+def report(label, samples):
+    ms = sorted(s * 1000 for s in samples)
+    print(f"{label:<20} n={len(ms):<4} mean={statistics.mean(ms):8.1f} ms  "
+          f"median={statistics.median(ms):8.1f} ms  max={ms[-1]:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    report("login per query", login_per_query(args.queries))
+    report("reused session", reused_session(args.queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Cold-start load of the stock list: CSV parse vs memory-mapped Arrow universe file
+
+Each loader runs in a fresh interpreter so nothing is shared between runs:
+
+    python benchmarks/bench_universe.py --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Runs in the child: imports first, then measures only the load itself
+CHILD = r"""
+import json, sys, time, tracemalloc
+sys.path.insert(0, {root!r})
+import pandas as pd
+import pyarrow as pa
+from stock_universe import read_stock_csv, read_universe_table
+
+tracemalloc.start()
+start = time.perf_counter()
+if {kind!r} == "csv":
+    df = read_stock_csv({csv!r})
+else:
+    df = read_universe_table({arrow!r}).to_pandas(types_mapper=pd.ArrowDtype)
+seconds = time.perf_counter() - start
+_, peak = tracemalloc.get_traced_memory()
+print(json.dumps({{
+    "seconds": seconds,
+    "peak_heap_mb": peak / 1e6,
+    "arrow_heap_mb": pa.total_allocated_bytes() / 1e6,
+    "frame_mb": df.memory_usage(deep=True).sum() / 1e6,
+    "rows": len(df),
+}}))
+"""
+
+# The old industry save parsed, merged and rewrote the whole CSV
+INDUSTRY_CHILD = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+import pandas as pd
+from stock_universe import read_stock_csv, replace_industry_columns
+
+stock_df = read_stock_csv({csv!r})
+industry_df = stock_df[['code']].copy()
+industry_df['industry'] = 'C36汽车制造业'
+industry_df['industryClassification'] = '申万一级行业'
+
+start = time.perf_counter()
+if {kind!r} == "csv":
+    current = pd.read_csv({csv_copy!r}, encoding='utf-8-sig')
+    current = current.drop(columns=[c for c in ('industry', 'industryClassification') if c in current.columns])
+    current.merge(industry_df, on='code', how='left').to_csv({csv_copy!r}, index=False, encoding='utf-8-sig')
+else:
+    replace_industry_columns(industry_df, {arrow!r})
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+
+def run_child(source):
+    out = subprocess.run([sys.executable, "-c", source], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(label, results, keys):
+    best = {k: min(r[k] for r in results) for k in keys}
+    print(f"{label:<22} " + "  ".join(f"{k}={best[k]:.4f}" if k == "seconds" else f"{k}={best[k]:.1f}"
+                                      for k in keys))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", default=os.path.join(ROOT, "stock_list.csv"))
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    from stock_universe import import_csv
+
+    with tempfile.TemporaryDirectory() as tmp:
+        arrow = os.path.join(tmp, "stock_universe.arrow")
+        csv_copy = os.path.join(tmp, "stock_list.csv")
+        import_csv(args.csv, arrow)
+        with open(args.csv, 'rb') as src, open(csv_copy, 'wb') as dst:
+            dst.write(src.read())
+        print(f"csv {os.path.getsize(args.csv) / 1024:.0f} KB, arrow {os.path.getsize(arrow) / 1024:.0f} KB")
+
+        params = dict(root=ROOT, csv=args.csv, arrow=arrow, csv_copy=csv_copy)
+        load_keys = ["seconds", "peak_heap_mb", "arrow_heap_mb", "frame_mb"]
+        for kind in ("csv", "arrow"):
+            results = [run_child(CHILD.format(kind=kind, **params)) for _ in range(args.runs)]
+            summarize(f"load {kind}", results, load_keys)
+        for kind in ("csv", "arrow"):
+            results = [run_child(INDUSTRY_CHILD.format(kind=kind, **params)) for _ in range(args.runs)]
+            summarize(f"industry save {kind}", results, ["seconds"])
+
+
+if __name__ == "__main__":
+    main()
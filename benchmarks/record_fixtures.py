@@ -0,0 +1,261 @@
+"""Record the BaoStock result sets the offline benchmark suite replays
+
+By default the fixtures are generated: the bundled stock list, a weekday
+trade calendar and random-walk K-lines, deterministic for a given seed, so
+the suite runs without network access. With --live the same calls are sent
+to the real BaoStock server and its answers are recorded instead:
+
+    python benchmarks/record_fixtures.py                  # synthetic
+    python benchmarks/record_fixtures.py --live --codes 20
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STANDIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "standin")
+sys.path.insert(0, ROOT)
+# Appended, not prepended: --live must import the real client, not the stand-in
+sys.path.append(STANDIN)
+
+from api_registry import API_REGISTRY, DEFAULT_CODE
+from kline_store import store_fields
+from price_adjust import FACTOR_START
+from replay_fixtures import FIXTURE_DIR, write_calls
+from result_decoder import FIELD_DTYPES
+from stock_universe import read_stock_csv
+from trade_calendar import CALENDAR_START
+
+# Recorded K-line span; benchmark ranges must fall inside it
+KLINE_START = "2015-01-01"
+KLINE_END = "2024-12-31"
+MINUTE_START = "2024-01-01"
+
+# Codes that also get 5-minute bars
+MINUTE_CODES = 2
+
+# Rows generated for APIs whose content the benchmarks do not look at
+OTHER_ROWS = 8
+
+INDEX_SIZES = {'query_sz50_stocks': 50, 'query_hs300_stocks': 300, 'query_zz500_stocks': 500}
+
+# Calls answered from the stock list or calendar rather than per code
+LIST_APIS = ('query_trade_dates', 'query_stock_basic', 'query_all_stock') + tuple(INDEX_SIZES)
+
+# Recorded for every code with K-lines
+PER_CODE_APIS = ('query_history_k_data_plus', 'query_adjust_factor')
+
+
+def stock_codes(stocks, n):
+    """First ``n`` listed A-shares, starting with the default code"""
+    shares = stocks[(stocks['type'].astype(str) == '1') & (stocks['status'].astype(str) == '1')]
+    codes = [DEFAULT_CODE] + [c for c in shares['code'] if c != DEFAULT_CODE]
+    return codes[:n]
+
+
+def plan_calls(codes):
+    """(api_name, params) of every call to record"""
+    calls = [
+        ('query_trade_dates', dict(start_date=CALENDAR_START, end_date=f"{date.today().year}-12-31")),
+        ('query_stock_basic', {}),
+        ('query_all_stock', dict(day=KLINE_END)),
+    ]
+    calls += [(api, dict(date=KLINE_END)) for api in INDEX_SIZES]
+    for code in codes:
+        calls.append(('query_history_k_data_plus', dict(
+            code=code, fields=",".join(store_fields("d")), start_date=KLINE_START, end_date=KLINE_END,
+            frequency="d", adjustflag="3")))
+    for code in codes:
+        calls.append(('query_adjust_factor', dict(code=code, start_date=FACTOR_START, end_date=KLINE_END)))
+    for code in codes[:MINUTE_CODES]:
+        calls.append(('query_history_k_data_plus', dict(
+            code=code, fields=",".join(store_fields("5")), start_date=MINUTE_START, end_date=KLINE_END,
+            frequency="5", adjustflag="3")))
+    for api in API_REGISTRY:
+        if api in LIST_APIS or api in PER_CODE_APIS:
+            continue
+        spec = API_REGISTRY[api]
+        params = {'code': DEFAULT_CODE} if 'code' in spec.param_names else {}
+        calls.append((api, params))
+    return calls
+
+
+class SyntheticServer:
+    """Answers planned calls with generated rows, as BaoStock strings"""
+
+    def __init__(self, stocks, seed=0):
+        self.stocks = stocks
+        self.seed = seed
+
+    def query(self, api_name, params):
+        """(error_code, error_msg, fields, rows)"""
+        rnd = random.Random(f"{self.seed}:{api_name}:{sorted(params.items())}")
+        if api_name == 'query_trade_dates':
+            fields, rows = self._calendar(params)
+        elif api_name == 'query_stock_basic':
+            fields = ['code', 'code_name', 'ipoDate', 'outDate', 'type', 'status']
+            rows = [[_text(v) for v in row] for row in self.stocks[fields].itertuples(index=False)]
+        elif api_name == 'query_all_stock':
+            fields = ['code', 'tradeStatus', 'code_name']
+            rows = [[c, '1', n] for c, n in zip(self.stocks['code'], self.stocks['code_name'])]
+        elif api_name in INDEX_SIZES:
+            fields = ['updateDate', 'code', 'code_name']
+            shares = self.stocks[self.stocks['type'].astype(str) == '1'].head(INDEX_SIZES[api_name])
+            rows = [[params['date'], c, n] for c, n in zip(shares['code'], shares['code_name'])]
+        elif api_name == 'query_history_k_data_plus':
+            fields, rows = self._kline(params, rnd)
+        elif api_name == 'query_adjust_factor':
+            fields, rows = self._adjust_factor(params, rnd)
+        else:
+            fields, rows = self._other(api_name, params, rnd)
+        return '0', 'success', fields, rows
+
+    def _calendar(self, params):
+        day = date.fromisoformat(params['start_date'])
+        end = date.fromisoformat(params['end_date'])
+        rows = []
+        while day <= end:
+            rows.append([day.isoformat(), '1' if day.weekday() < 5 else '0'])
+            day += timedelta(days=1)
+        return ['calendar_date', 'is_trading_day'], rows
+
+    def _kline(self, params, rnd):
+        fields = params['fields'].split(",")
+        minute = params['frequency'] != "d"
+        price = rnd.uniform(5, 50)
+        rows = []
+        day = date.fromisoformat(params['start_date'])
+        end = date.fromisoformat(params['end_date'])
+        while day <= end:
+            if day.weekday() < 5:
+                for stamp in _bar_times(day) if minute else [None]:
+                    preclose = price
+                    price = max(0.5, price * (1 + rnd.gauss(0, 0.002 if minute else 0.02)))
+                    high = max(price, preclose) * (1 + rnd.uniform(0, 0.01))
+                    low = min(price, preclose) * (1 - rnd.uniform(0, 0.01))
+                    volume = rnd.randint(10_000, 5_000_000)
+                    bar = {
+                        'date': day.isoformat(), 'time': stamp, 'code': params['code'],
+                        'open': preclose, 'high': high, 'low': low, 'close': price, 'preclose': preclose,
+                        'volume': str(volume), 'amount': volume * price, 'adjustflag': params['adjustflag'],
+                        'turn': rnd.uniform(0.1, 5), 'tradestatus': '1', 'pctChg': (price / preclose - 1) * 100,
+                        'peTTM': rnd.uniform(5, 40), 'pbMRQ': rnd.uniform(0.5, 5), 'psTTM': rnd.uniform(0.5, 10),
+                        'pcfNcfTTM': rnd.uniform(-20, 40), 'isST': '0',
+                    }
+                    rows.append([_text(bar[f]) for f in fields])
+            day += timedelta(days=1)
+        return fields, rows
+
+    def _adjust_factor(self, params, rnd):
+        """One ex-dividend date a year, each raising the back-adjustment factor a little"""
+        back = 1.0
+        dates = []
+        for year in range(int(KLINE_START[:4]), int(params['end_date'][:4]) + 1):
+            back *= 1 + rnd.uniform(0.005, 0.04)
+            dates.append((date(year, 7, 1) + timedelta(days=rnd.randint(0, 30)), back))
+        latest = dates[-1][1]
+        fields = ['code', 'dividOperateDate', 'foreAdjustFactor', 'backAdjustFactor', 'adjustFactor']
+        rows = [[params['code'], day.isoformat(), _text(factor / latest), _text(factor), _text(factor)]
+                for day, factor in dates]
+        return fields, rows
+
+    def _other(self, api_name, params, rnd):
+        spec = API_REGISTRY[api_name]
+        fields = list(spec.fields)
+        rows = []
+        for i in range(OTHER_ROWS):
+            day = date(2024, 1, 1) + timedelta(days=45 * i)
+            row = []
+            for field in fields:
+                kind = FIELD_DTYPES.get(field, 'string')
+                if field == 'code':
+                    row.append(params.get('code', DEFAULT_CODE))
+                elif kind == 'date':
+                    row.append(day.isoformat())
+                elif kind == 'int':
+                    row.append(str(day.year if field.startswith('stat') else rnd.randint(1, 12)))
+                elif kind in ('category', 'string'):
+                    row.append('1')
+                else:
+                    row.append(_text(rnd.uniform(-10, 100)))
+            rows.append(row)
+        return fields, rows
+
+
+def _bar_times(day):
+    """BaoStock 'time' stamps of the 5-minute bars of a trading day"""
+    stamps = []
+    for start, end in (((9, 35), (11, 30)), ((13, 5), (15, 0))):
+        t = datetime(day.year, day.month, day.day, *start)
+        stop = datetime(day.year, day.month, day.day, *end)
+        while t <= stop:
+            stamps.append(t.strftime("%Y%m%d%H%M%S000"))
+            t += timedelta(minutes=5)
+    return stamps
+
+
+def _text(value):
+    if value is None or value != value:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.4f}"
+    return str(value)
+
+
+class LiveServer:
+    """Answers planned calls from the real BaoStock server"""
+
+    def __init__(self):
+        import baostock
+        from bs_session import BaoStockSession
+
+        self.bs = baostock
+        self.session = BaoStockSession(keepalive_interval=0)
+
+    def query(self, api_name, params):
+        rs = self.session.query(getattr(self.bs, api_name), **params)
+        return rs.error_code, rs.error_msg, rs.fields, rs.rows
+
+    def close(self):
+        self.session.logout()
+
+
+def record(server, calls, root):
+    """Run every call and write the fixtures; returns {api_name: rows recorded}"""
+    recorded = {}
+    for api_name, params in calls:
+        error_code, error_msg, fields, rows = server.query(api_name, params)
+        if error_code != '0':
+            print(f"{api_name} {params.get('code', '')}: {error_code} {error_msg}", file=sys.stderr)
+        recorded.setdefault(api_name, []).append(
+            dict(params=params, error_code=error_code, error_msg=error_msg, fields=list(fields), rows=rows))
+    for api_name, api_calls in recorded.items():
+        write_calls(root, api_name, api_calls)
+    return {api_name: sum(len(c['rows']) for c in api_calls) for api_name, api_calls in recorded.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default=FIXTURE_DIR)
+    parser.add_argument("--codes", type=int, default=20, help="stocks with recorded K-lines")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--live", action="store_true", help="record from the BaoStock server")
+    args = parser.parse_args()
+
+    stocks = read_stock_csv(os.path.join(ROOT, "stock_list.csv"))
+    calls = plan_calls(stock_codes(stocks, args.codes))
+    server = LiveServer() if args.live else SyntheticServer(stocks, args.seed)
+    try:
+        counts = record(server, calls, args.out)
+    finally:
+        if args.live:
+            server.close()
+    for api_name, rows in sorted(counts.items()):
+        print(f"{api_name:<36} {rows:>9,} rows")
+    print(f"{len(calls)} calls written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""Offline benchmark suite replaying recorded BaoStock results, checked against a baseline
+
+Every ``import baostock`` (worker processes included) gets the replaying
+stand-in in benchmarks/standin, so nothing touches the network. Fixtures are
+generated with record_fixtures.py on first use. Each case reports the median
+of its repeats; a case slower than the baseline by more than the tolerance
+fails the run with a non-zero exit status.
+
+    python benchmarks/run_suite.py                          # compare with benchmarks/baseline.json
+    python benchmarks/run_suite.py --save-baseline          # accept the current timings
+    python benchmarks/run_suite.py --latency 0.05 --errors 0.02 --cases bulk_kline
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH)
+STANDIN = os.path.join(BENCH, "standin")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH)
+# First, so the stand-in shadows the real client here and in spawned workers
+sys.path.insert(0, STANDIN)
+
+import baostock as bs
+import numpy as np
+import pandas as pd
+
+import kline_store
+import price_adjust
+import query_cache
+import trade_calendar
+from bench_selector import QUERIES
+from bs_session import BaoStockSession, ResultSnapshot
+from bulk_download import BulkDownloader
+from call_gateway import CallGateway
+from indicators import DEFAULT_INDICATORS, IndicatorEngine
+from kline_resample import resample_bars
+from kline_store import KLineStore
+from price_adjust import FactorTable, PriceAdjuster, adjust_bars
+from query_cache import QueryCache
+from record_fixtures import KLINE_END, SyntheticServer, plan_calls, record, stock_codes
+from replay_fixtures import FIXTURE_DIR, read_calls, recorded_apis
+from result_decoder import decode_result, decode_rows
+from result_export import EXPORT_FORMATS, ResultExport
+from stock_universe import StockUniverse, import_csv, read_stock_csv
+from trade_calendar import TradeCalendar
+from worker_pool import BaoStockWorkerPool
+
+BASELINE_FILE = os.path.join(BENCH, "baseline.json")
+
+# A case fails when its median exceeds the baseline by this share...
+DEFAULT_TOLERANCE = 0.25
+# ...and by at least this many seconds, so microsecond cases do not flap
+DEFAULT_FLOOR = 0.005
+
+# Range downloaded by the bulk K-line case; inside the recorded span
+BULK_START = "2020-01-01"
+
+# Process-wide singletons the cases reach through get_*(); the suite installs
+# its own and clears them on close so none outlives the scratch directory
+SINGLETONS = ((query_cache, '_cache'), (trade_calendar, '_calendar'), (price_adjust, '_adjuster'),
+              (kline_store, '_store'))
+
+
+class Suite:
+    """Benchmark cases sharing one scratch directory, fixture set and worker pool"""
+
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.stocks = read_stock_csv(os.path.join(ROOT, "stock_list.csv"))
+        self.codes = stock_codes(self.stocks, args.codes)
+        self.universe_file = os.path.join(workdir, "stock_universe.arrow")
+        import_csv(os.path.join(ROOT, "stock_list.csv"), self.universe_file)
+        self.universe = StockUniverse.from_arrow(self.universe_file)
+        self.gateway = CallGateway(rate=args.rate, concurrency=args.workers, max_concurrency=args.workers)
+        # Absolute paths under the scratch directory, never the caller's cache/
+        self.query_cache = QueryCache(cache_dir=os.path.join(workdir, "queries"))
+        self.calendar = TradeCalendar(self.query_cache)
+        self.adjuster = PriceAdjuster(self.query_cache)
+        query_cache._cache = self.query_cache
+        trade_calendar._calendar = self.calendar
+        price_adjust._adjuster = self.adjuster
+        self._pool = None
+        self._frame = None
+        self._factors = None
+        self._minutes = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = BaoStockWorkerPool(self.args.workers, self.gateway)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+        # Flushed now, while the scratch directory still exists, rather than at exit
+        self.query_cache.close()
+        for module, name in SINGLETONS:
+            setattr(module, name, None)
+
+    def _kline_calls(self, frequency):
+        return [c for c in read_calls(self.args.fixtures, 'query_history_k_data_plus')
+                if c['params']['frequency'] == frequency]
+
+    def session_setup(self):
+        """Login plus the first query on a fresh session"""
+        session = BaoStockSession(keepalive_interval=0)
+        rs = session.query(bs.query_trade_dates, start_date="2024-01-01", end_date="2024-12-31")
+        session.logout()
+        return len(rs.rows)
+
+    def pool_startup(self):
+        """Spawn the worker pool and get one answer from every worker"""
+        pool = BaoStockWorkerPool(self.args.workers, self.gateway)
+        try:
+            futures = [pool.submit('query_trade_dates', start_date="2024-01-01", end_date="2024-01-31")
+                       for _ in range(self.args.workers)]
+            return sum(len(f.result()[0]) for f in futures)
+        finally:
+            pool.shutdown()
+
+    def decode(self):
+        """Typed decoding of the recorded 5-minute K-lines"""
+        rows = 0
+        for call in self._kline_calls("5"):
+            rows += len(decode_result(ResultSnapshot('0', 'success', call['fields'], call['rows'])))
+        return rows
+
+    def stock_list(self):
+        """Load the stock universe file and build its indexes"""
+        return len(StockUniverse.from_arrow(self.universe_file))
+
+    def selector(self):
+        """Selector searches and labels for a handful of typed queries"""
+        options = 0
+        for query in QUERIES:
+            options += len([self.universe.label(c) for c in self.universe.search(query)])
+        return options
+
+    def bulk_kline(self):
+        """Daily bars for every recorded code fanned out over the pool into an empty store"""
+        store = KLineStore(calendar=self.calendar, adjuster=self.adjuster,
+                           root=tempfile.mkdtemp(prefix="kline_", dir=self.workdir))
+        stats = BulkDownloader(store=store, pool=self.pool).download(self.codes, BULK_START, KLINE_END)
+        if stats.failures:
+            raise RuntimeError(f"bulk download failed: {stats.failures[:3]}")
+        return stats.rows
+
+    def frame(self):
+        if self._frame is None:
+            frames = [decode_rows(c['fields'], c['rows']) for c in self._kline_calls("d")]
+            self._frame = pd.concat(frames, ignore_index=True)
+        return self._frame
+
+    def adjust(self):
+        """Forward adjustment of the recorded daily K-lines of every code in one pass"""
+        if self._factors is None:
+            self._factors = {
+                c['params']['code']: FactorTable.from_frame(decode_rows(c['fields'], c['rows']))
+                for c in read_calls(self.args.fixtures, 'query_adjust_factor')
+            }
+        return len(adjust_bars(self.frame(), self._factors, "2"))
+
+    def resample(self):
+        """Weekly bars from the recorded daily K-lines and 60-minute bars from the 5-minute ones"""
+        daily = self.frame()
+        trading_days = np.unique(daily['date'].to_numpy('datetime64[D]'))
+        if self._minutes is None:
+            self._minutes = [decode_rows(c['fields'], c['rows']) for c in self._kline_calls("5")]
+        rows = len(resample_bars(daily, "w", trading_days))
+        for bars in self._minutes:
+            rows += len(resample_bars(bars, "60"))
+        return rows
+
+    def indicators(self):
+        """Every browser indicator over the recorded daily K-lines of all codes, from scratch"""
+        return len(IndicatorEngine().apply(self.frame(), DEFAULT_INDICATORS))
+
+    def export(self, fmt):
+        """Write the recorded daily K-lines as one export file"""
+        def run():
+            df = self.frame()
+            ResultExport(df).path(fmt)
+            return len(df)
+        run.__doc__ = f"{fmt} export of the recorded daily K-lines"
+        return run
+
+    def cases(self):
+        cases = {
+            'session_setup': self.session_setup,
+            'pool_startup': self.pool_startup,
+            'decode': self.decode,
+            'stock_list': self.stock_list,
+            'selector': self.selector,
+            'bulk_kline': self.bulk_kline,
+            'adjust': self.adjust,
+            'resample': self.resample,
+            'indicators': self.indicators,
+        }
+        for fmt in EXPORT_FORMATS:
+            cases[f"export_{fmt.lower()}"] = self.export(fmt)
+        return cases
+
+
+def measure(func, repeat, warmup=1):
+    """Median, min and max seconds over ``repeat`` calls after ``warmup`` untimed ones"""
+    for _ in range(warmup):
+        rows = func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = func()
+        samples.append(time.perf_counter() - start)
+    return {'seconds': statistics.median(samples), 'min': min(samples), 'max': max(samples), 'rows': rows}
+
+
+def settings(args):
+    """Options that change what the timings mean; a baseline only applies to the same ones"""
+    return {
+        'codes': args.codes, 'workers': args.workers, 'rate': args.rate,
+        'latency': args.latency, 'jitter': args.jitter, 'errors': args.errors,
+    }
+
+
+def compare(results, baseline, tolerance, floor):
+    """[(case, seconds, baseline seconds or None, failed)]"""
+    rows = []
+    for case, result in results.items():
+        before = baseline.get(case, {}).get('seconds')
+        failed = before is not None and result['seconds'] > before * (1 + tolerance) \
+            and result['seconds'] - before > floor
+        rows.append((case, result['seconds'], before, failed))
+    return rows
+
+
+def ensure_fixtures(root, seed):
+    if recorded_apis(root):
+        return
+    print(f"No fixtures in {root}; generating synthetic ones")
+    stocks = read_stock_csv(os.path.join(ROOT, "stock_list.csv"))
+    record(SyntheticServer(stocks, seed), plan_calls(stock_codes(stocks, 20)), root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these timings as the baseline")
+    parser.add_argument("--cases", help="comma-separated subset of cases to run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--codes", type=int, default=20, help="codes in the bulk K-line case")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=1000.0, help="requests per second across the workers")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per simulated round trip")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency varies by this fraction")
+    parser.add_argument("--errors", type=float, default=0.0, help="share of calls failing with a socket error")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--floor", type=float, default=DEFAULT_FLOOR, help="seconds")
+    parser.add_argument("--out", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    args.fixtures = os.path.abspath(args.fixtures)
+    ensure_fixtures(args.fixtures, args.seed)
+    # Read by the stand-in in this process and in every worker it spawns
+    os.environ.update({
+        'BAOSTOCK_FIXTURES': args.fixtures,
+        'BAOSTOCK_REPLAY_LATENCY': str(args.latency),
+        'BAOSTOCK_REPLAY_JITTER': str(args.jitter),
+        'BAOSTOCK_REPLAY_ERRORS': str(args.errors),
+        'BAOSTOCK_REPLAY_SEED': str(args.seed),
+    })
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="baostock_bench_") as workdir:
+        # Caches, stores and exports all land in the scratch directory
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        suite = Suite(args, workdir)
+        try:
+            cases = suite.cases()
+            wanted = args.cases.split(",") if args.cases else list(cases)
+            unknown = [c for c in wanted if c not in cases]
+            if unknown:
+                parser.error(f"unknown cases: {', '.join(unknown)} (choose from {', '.join(cases)})")
+            for case in wanted:
+                results[case] = measure(cases[case], args.repeat)
+                print(f"{case:<16} {results[case]['seconds'] * 1000:10.2f} ms  "
+                      f"(min {results[case]['min'] * 1000:.2f}, max {results[case]['max'] * 1000:.2f}, "
+                      f"{results[case]['rows']:,} rows)  {cases[case].__doc__.strip()}")
+        finally:
+            suite.close()
+            os.chdir(cwd)
+
+    report = {'settings': settings(args), 'python': platform.python_version(), 'cases': results}
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        baseline = {'cases': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        if baseline.get('settings', report['settings']) != report['settings']:
+            baseline['cases'] = {}
+        # Cases not run this time keep their stored timings
+        report['cases'] = {**baseline['cases'], **results}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"FAIL: no baseline at {args.baseline}; run with --save-baseline to store one", file=sys.stderr)
+        return 2
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('settings') != report['settings']:
+        print(f"FAIL: baseline was recorded with {baseline.get('settings')}, this run used {report['settings']}; "
+              f"rerun with matching options or --save-baseline", file=sys.stderr)
+        return 2
+
+    failures = 0
+    print(f"\n{'case':<16} {'ms':>10} {'baseline':>10} {'change':>8}")
+    for case, seconds, before, failed in compare(results, baseline['cases'], args.tolerance, args.floor):
+        change = f"{(seconds / before - 1) * 100:+7.1f}%" if before else "     new"
+        before_ms = f"{before * 1000:10.2f}" if before is not None else f"{'-':>10}"
+        print(f"{case:<16} {seconds * 1000:10.2f} {before_ms} {change}{'  FAIL' if failed else ''}")
+        failures += failed
+    if failures:
+        print(f"FAIL: {failures} case(s) slower than the baseline by more than {args.tolerance:.0%}",
+              file=sys.stderr)
+        return 1
+    print("OK: no case slower than the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""Stand-in for the baostock client that replays recorded result sets
+
+Put benchmarks/standin first on sys.path (or PYTHONPATH) and every
+``import baostock`` — worker processes included — gets this module
+instead of the real client. Calls are answered from the fixtures written
+by benchmarks/record_fixtures.py; nothing touches the network.
+
+    BAOSTOCK_FIXTURES        fixture directory (default benchmarks/fixtures)
+    BAOSTOCK_REPLAY_LATENCY  seconds per round trip; results are paged like the
+                             real server, one round trip per PAGE_ROWS rows (default 0)
+    BAOSTOCK_REPLAY_JITTER   latency varies by up to this fraction either way (default 0)
+    BAOSTOCK_REPLAY_ERRORS   share of calls failing with a socket error (default 0)
+    BAOSTOCK_REPLAY_SEED     seed for jitter and injected errors
+
+K-line and trade-calendar calls are answered from a recording over a wider
+range, cut to the requested dates and fields. Other calls need a recording
+with the same parameters; failing that, one for the same code, and failing
+that any recording of the API.
+"""
+import math
+import os
+import random
+import threading
+import time
+
+from replay_fixtures import FIXTURE_DIR, call_key, read_calls
+
+# Rows per page of the real server
+PAGE_ROWS = 10000
+
+# Returned when an error is injected (a receive failure, which clients retry after a new login)
+INJECTED_ERROR = ('10002007', "网络接收错误 (injected by the replay stand-in)")
+NO_FIXTURE_ERROR = '10004020'
+
+_fixtures = {}
+_fixtures_lock = threading.Lock()
+_random = None
+_logged_in = False
+
+
+def _setting(name, default=0.0):
+    return float(os.environ.get(name, default))
+
+
+class ResultData:
+    """The parts of baostock's ResultData the browser uses"""
+
+    def __init__(self, error_code='0', error_msg='success', fields=None, rows=None):
+        self.error_code = error_code
+        self.error_msg = error_msg
+        self.fields = list(fields or [])
+        self.data = rows if rows is not None else []
+        self._pos = -1
+
+    def next(self):
+        self._pos += 1
+        return self._pos < len(self.data)
+
+    def get_row_data(self):
+        return self.data[self._pos]
+
+    def get_data(self):
+        import pandas as pd
+        return pd.DataFrame(self.data, columns=self.fields)
+
+
+def _calls(api_name):
+    with _fixtures_lock:
+        calls = _fixtures.get(api_name)
+        if calls is None:
+            calls = _fixtures[api_name] = read_calls(os.environ.get('BAOSTOCK_FIXTURES', FIXTURE_DIR), api_name)
+        return calls
+
+
+def _rng():
+    # Seeded on first use so settings made after import still apply
+    global _random
+    if _random is None:
+        _random = random.Random(os.environ.get('BAOSTOCK_REPLAY_SEED'))
+    return _random
+
+
+def _wait(rows):
+    latency = _setting('BAOSTOCK_REPLAY_LATENCY')
+    if not latency:
+        return
+    jitter = _setting('BAOSTOCK_REPLAY_JITTER')
+    pages = max(1, math.ceil(rows / PAGE_ROWS))
+    time.sleep(sum(latency * (1 + _rng().uniform(-jitter, jitter)) for _ in range(pages)))
+
+
+def _inject_error():
+    rate = _setting('BAOSTOCK_REPLAY_ERRORS')
+    return rate and _rng().random() < rate
+
+
+def _in_range(fields, rows, column, start, end):
+    if column not in fields or not (start or end):
+        return rows
+    i = fields.index(column)
+    return [row for row in rows if (not start or row[i] >= start) and (not end or row[i] <= end)]
+
+
+def _lookup(api_name, params, match=None):
+    """Recorded result for a call, before any latency is added"""
+    if not _logged_in:
+        return ResultData('10001001', "用户未登录")
+    if _inject_error():
+        return ResultData(*INJECTED_ERROR)
+    calls = _calls(api_name)
+    candidates = [c for c in calls if match(c['params'])] if match else []
+    if not candidates:
+        key = call_key(params)
+        candidates = [c for c in calls if call_key(c['params']) == key]
+    if not candidates and params.get('code'):
+        candidates = [c for c in calls if c['params'].get('code') == params['code']]
+    if not candidates:
+        candidates = calls
+    if not candidates:
+        return ResultData(NO_FIXTURE_ERROR, f"no recorded result for {api_name}")
+    call = candidates[-1]
+    return ResultData(call['error_code'], call['error_msg'], call['fields'], call['rows'])
+
+
+def _replay(api_name, params, match=None):
+    rs = _lookup(api_name, params, match)
+    _wait(len(rs.data))
+    return rs
+
+
+def login(user_id='anonymous', password='123456'):
+    global _logged_in
+    _wait(0)
+    _logged_in = True
+    return ResultData()
+
+
+def logout(user_id='anonymous'):
+    global _logged_in
+    _logged_in = False
+    return ResultData()
+
+
+def query_history_k_data_plus(code, fields, start_date=None, end_date=None, frequency='d', adjustflag='3'):
+    series = (code, str(frequency), str(adjustflag))
+    rs = _lookup('query_history_k_data_plus', dict(code=code, frequency=frequency, adjustflag=adjustflag),
+                 lambda p: (p.get('code'), p.get('frequency', 'd'), p.get('adjustflag', '3')) == series)
+    if rs.error_code != '0':
+        _wait(0)
+        return rs
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    missing = [f for f in wanted if f not in rs.fields]
+    if missing:
+        _wait(0)
+        return ResultData('10004004', f"fields not recorded: {','.join(missing)}")
+    rows = _in_range(rs.fields, rs.data, 'date', start_date, end_date)
+    positions = [rs.fields.index(f) for f in wanted]
+    rows = [[row[i] for i in positions] for row in rows]
+    _wait(len(rows))
+    return ResultData('0', 'success', wanted, rows)
+
+
+def query_trade_dates(start_date=None, end_date=None):
+    rs = _lookup('query_trade_dates', {}, lambda p: True)
+    rows = _in_range(rs.fields, rs.data, 'calendar_date', start_date, end_date)
+    _wait(len(rows))
+    return ResultData(rs.error_code, rs.error_msg, rs.fields, rows)
+
+
+def query_dividend_data(code, year=None, yearType='report'):
+    return _replay('query_dividend_data', dict(code=code, year=year, yearType=yearType))
+
+
+def query_adjust_factor(code, start_date=None, end_date=None):
+    return _replay('query_adjust_factor', dict(code=code, start_date=start_date, end_date=end_date))
+
+
+def _statement(api_name):
+    def query(code, year=None, quarter=None):
+        return _replay(api_name, dict(code=code, year=year, quarter=quarter))
+    query.__name__ = api_name
+    return query
+
+
+query_profit_data = _statement('query_profit_data')
+query_operation_data = _statement('query_operation_data')
+query_growth_data = _statement('query_growth_data')
+query_balance_data = _statement('query_balance_data')
+query_cash_flow_data = _statement('query_cash_flow_data')
+query_dupont_data = _statement('query_dupont_data')
+
+
+def query_performance_express_report(code, start_date=None, end_date=None):
+    return _replay('query_performance_express_report', dict(code=code, start_date=start_date, end_date=end_date))
+
+
+def query_forecast_report(code, start_date=None, end_date=None):
+    return _replay('query_forecast_report', dict(code=code, start_date=start_date, end_date=end_date))
+
+
+def query_all_stock(day=None):
+    return _replay('query_all_stock', dict(day=day))
+
+
+def query_stock_basic(code='', code_name=''):
+    return _replay('query_stock_basic', dict(code=code, code_name=code_name))
+
+
+def query_stock_industry(code='', date=''):
+    return _replay('query_stock_industry', dict(code=code, date=date))
+
+
+def _dated_range(api_name):
+    def query(start_date='', end_date=''):
+        return _replay(api_name, dict(start_date=start_date, end_date=end_date))
+    query.__name__ = api_name
+    return query
+
+
+query_deposit_rate_data = _dated_range('query_deposit_rate_data')
+query_loan_rate_data = _dated_range('query_loan_rate_data')
+query_money_supply_data_month = _dated_range('query_money_supply_data_month')
+query_money_supply_data_year = _dated_range('query_money_supply_data_year')
+query_shibor_data = _dated_range('query_shibor_data')
+
+
+def query_required_reserve_ratio_data(start_date='', end_date='', yearType='0'):
+    return _replay('query_required_reserve_ratio_data', dict(start_date=start_date, end_date=end_date,
+                                                             yearType=yearType))
+
+
+def _index(api_name):
+    def query(date=''):
+        return _replay(api_name, dict(date=date))
+    query.__name__ = api_name
+    return query
+
+
+query_sz50_stocks = _index('query_sz50_stocks')
+query_hs300_stocks = _index('query_hs300_stocks')
+query_zz500_stocks = _index('query_zz500_stocks')
@@ -0,0 +1,49 @@
+"""On-disk format of recorded BaoStock result sets
+
+One gzipped JSON-lines file per API; each line is one recorded call:
+
+    {"params": {"code": "sh.600000", ...}, "error_code": "0", "error_msg": "success",
+     "fields": ["date", ...], "rows": [["2024-01-02", ...], ...]}
+
+Shared by the recorder (which imports the real baostock client) and the
+replaying stand-in, so it must not import baostock itself.
+"""
+import gzip
+import json
+import os
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures")
+
+
+def fixture_path(root, api_name):
+    return os.path.join(root, f"{api_name}.jsonl.gz")
+
+
+def call_key(params):
+    """Identity of a call: its non-empty parameters as strings"""
+    return json.dumps({k: str(v) for k, v in params.items() if v not in (None, "")}, sort_keys=True,
+                      ensure_ascii=False)
+
+
+def write_calls(root, api_name, calls):
+    """Replace the fixture for an API with these recorded calls"""
+    os.makedirs(root, exist_ok=True)
+    path = fixture_path(root, api_name)
+    with gzip.open(path + ".tmp", 'wt', encoding='utf-8') as f:
+        for call in calls:
+            f.write(json.dumps(call, ensure_ascii=False) + "\n")
+    os.replace(path + ".tmp", path)
+
+
+def read_calls(root, api_name):
+    path = fixture_path(root, api_name)
+    if not os.path.exists(path):
+        return []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def recorded_apis(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(name[:-len(".jsonl.gz")] for name in os.listdir(root) if name.endswith(".jsonl.gz"))
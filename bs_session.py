@@ -0,0 +1,209 @@
+"""Process-wide BaoStock session shared across Streamlit reruns and browser sessions"""
+import atexit
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import baostock as bs
+
+from call_gateway import (CIRCUIT_OPEN_ERROR_CODE, EXCEPTION_ERROR_CODE, RELOGIN_ERROR_CODES, CircuitOpenError,
+                          get_gateway)
+from perf_metrics import timed
+
+# Seconds of idleness after which a keep-alive request is sent
+KEEPALIVE_INTERVAL = 60
+
+# Number of recent query latencies kept for reporting
+LATENCY_HISTORY = 200
+
+
+class ResultSnapshot:
+    """Fully drained BaoStock result that no longer needs the socket
+
+    BaoStock pages large results lazily through ``rs.next()``, which talks to
+    the shared socket. The session drains every page while it holds the
+    connection lock and hands out this snapshot, which mimics the parts of
+    ``ResultData`` the browser uses.
+    """
+
+    def __init__(self, error_code, error_msg, fields=None, rows=None):
+        self.error_code = error_code
+        self.error_msg = error_msg
+        self.fields = list(fields or [])
+        self.rows = rows if rows is not None else []
+        self._pos = -1
+
+    def next(self):
+        self._pos += 1
+        return self._pos < len(self.rows)
+
+    def get_row_data(self):
+        return self.rows[self._pos]
+
+
+def drain_result(rs):
+    """Read every page of a BaoStock result into a ResultSnapshot"""
+    rows = []
+    while (rs.error_code == '0') & rs.next():
+        rows.append(rs.get_row_data())
+    return ResultSnapshot(rs.error_code, rs.error_msg, rs.fields, rows)
+
+
+class BaoStockSession:
+    """One authenticated BaoStock connection reused by every caller in the process
+
+    The baostock client keeps a single global socket, so all calls are
+    serialized through a lock. Login happens lazily on first use and again
+    whenever a call fails with an auth or socket error. With a gateway,
+    every query is paced and retried by it (see call_gateway).
+    """
+
+    def __init__(self, keepalive_interval=KEEPALIVE_INTERVAL, gateway=None):
+        self.keepalive_interval = keepalive_interval
+        self.gateway = gateway
+        self.logged_in = False
+        self.login_count = 0
+        self.last_used = 0.0
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._keepalive_thread = None
+        self._latencies = {
+            'reused': deque(maxlen=LATENCY_HISTORY),
+            'with_login': deque(maxlen=LATENCY_HISTORY),
+            'login': deque(maxlen=LATENCY_HISTORY),
+        }
+
+    def _login(self):
+        start = time.perf_counter()
+        with timed('login') as span:
+            lg = bs.login()
+            span.set(error=lg.error_code != '0')
+        self._latencies['login'].append(time.perf_counter() - start)
+        self.logged_in = lg.error_code == '0'
+        if self.logged_in:
+            self.login_count += 1
+            self.last_used = time.monotonic()
+            self._start_keepalive()
+        return lg
+
+    def ensure_login(self):
+        """Log in if needed; returns the failed login result or None on success"""
+        with self._lock:
+            if self.logged_in:
+                return None
+            lg = self._login()
+            return None if lg.error_code == '0' else lg
+
+    def query(self, func, *args, **kwargs):
+        """Call a ``bs.query_*`` function on the shared connection
+
+        Returns a ResultSnapshot with all pages already read. On an auth or
+        socket error the session logs in again and retries the call once.
+        """
+        if self.gateway is None:
+            return self._query(func, args, kwargs)
+
+        def attempt():
+            try:
+                result = self._query(func, args, kwargs)
+            except Exception as e:
+                result = ResultSnapshot(EXCEPTION_ERROR_CODE, str(e))
+            return result.error_code, result
+
+        try:
+            return self.gateway.call(attempt, func.__name__)[1]
+        except CircuitOpenError as e:
+            return ResultSnapshot(CIRCUIT_OPEN_ERROR_CODE, str(e))
+
+    def _query(self, func, args, kwargs):
+        with self._lock:
+            start = time.perf_counter()
+            fresh = not self.logged_in
+            if fresh:
+                lg = self._login()
+                if lg.error_code != '0':
+                    return ResultSnapshot(lg.error_code, f"Login failed: {lg.error_msg}")
+
+            result = drain_result(func(*args, **kwargs))
+            if result.error_code in RELOGIN_ERROR_CODES:
+                self.logged_in = False
+                lg = self._login()
+                if lg.error_code != '0':
+                    return ResultSnapshot(lg.error_code, f"Login failed: {lg.error_msg}")
+                fresh = True
+                result = drain_result(func(*args, **kwargs))
+
+            self.last_used = time.monotonic()
+            kind = 'with_login' if fresh else 'reused'
+            self._latencies[kind].append(time.perf_counter() - start)
+            return result
+
+    def logout(self):
+        """Log out and stop the keep-alive thread"""
+        self._stop.set()
+        with self._lock:
+            if self.logged_in:
+                try:
+                    bs.logout()
+                finally:
+                    self.logged_in = False
+
+    def _start_keepalive(self):
+        if self._keepalive_thread is not None and self._keepalive_thread.is_alive():
+            return
+        if not self.keepalive_interval:
+            return
+        self._stop.clear()
+        self._keepalive_thread = threading.Thread(
+            target=self._keepalive_loop, name="baostock-keepalive", daemon=True
+        )
+        self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive_interval / 2):
+            if not self.logged_in:
+                continue
+            if time.monotonic() - self.last_used < self.keepalive_interval:
+                continue
+            # Never make a user query wait behind a keep-alive
+            if not self._lock.acquire(blocking=False):
+                continue
+            try:
+                today = datetime.now().strftime("%Y-%m-%d")
+                rs = drain_result(bs.query_trade_dates(start_date=today, end_date=today))
+                if rs.error_code in RELOGIN_ERROR_CODES:
+                    # Re-login lazily on the next real query
+                    self.logged_in = False
+                else:
+                    self.last_used = time.monotonic()
+            except Exception:
+                self.logged_in = False
+            finally:
+                self._lock.release()
+
+    def latency_summary(self):
+        """Average latency in milliseconds for reused-session queries, queries that logged in, and logins"""
+        summary = {}
+        for kind, samples in self._latencies.items():
+            values = list(samples)
+            summary[kind] = {
+                'count': len(values),
+                'avg_ms': (sum(values) / len(values) * 1000) if values else None,
+            }
+        summary['login_count'] = self.login_count
+        return summary
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide BaoStock session, creating it on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = BaoStockSession(gateway=get_gateway())
+            atexit.register(_session.logout)
+        return _session
@@ -0,0 +1,188 @@
+"""Multi-stock K-line downloads fanned out over the BaoStock worker pool"""
+import re
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import pandas as pd
+
+from kline_store import complete_through, get_kline_store, series_flag, split_fields, store_fields
+from price_adjust import adjust_bars
+from trade_calendar import to_date
+from worker_pool import get_worker_pool
+
+_CODE_SPLIT = re.compile(r"[\s,;，；]+")
+
+
+def parse_codes(text):
+    """Codes from pasted text; bare 6-digit codes get their exchange prefix
+
+    Index codes such as 000001 exist on both exchanges, so they must be
+    pasted with the prefix (sh.000001).
+    """
+    codes = []
+    for token in _CODE_SPLIT.split(text or ""):
+        token = token.strip().lower()
+        if not token:
+            continue
+        if re.fullmatch(r"\d{6}", token):
+            token = ("sh." if token[0] in "569" else "sz.") + token
+        elif re.fullmatch(r"(sh|sz)\d{6}", token):
+            token = token[:2] + "." + token[2:]
+        if token not in codes:
+            codes.append(token)
+    return codes
+
+
+class BulkProgress:
+    """Running totals for a batch download"""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.rows = 0
+        self.failures = []
+        self.succeeded = []
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def codes_per_sec(self):
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+class BulkDownloader:
+    """Downloads bars for many codes concurrently and streams them into the K-line store"""
+
+    def __init__(self, store=None, pool=None, max_outstanding=None):
+        self.store = store or get_kline_store()
+        self.pool = pool or get_worker_pool()
+        # Bar requests this downloader keeps in the shared pool at once; None queues them all
+        self.max_outstanding = max_outstanding
+
+    def download(self, codes, start_date, end_date, frequency="d", adjustflag="3", progress=None):
+        """Fetch every missing range for every code; returns a BulkProgress
+
+        ``progress`` is called with the BulkProgress after each code finishes.
+        """
+        adjustflag = str(adjustflag)
+        start, end = to_date(start_date), to_date(end_date)
+        fields = ",".join(store_fields(frequency))
+        fetch_flag = series_flag(frequency, adjustflag)
+        stats = BulkProgress(len(codes))
+
+        if not self.store.supports(frequency, adjustflag):
+            stats.failures = [(code, f"adjustflag {adjustflag} bars at frequency {frequency} cannot be stored locally")
+                              for code in codes]
+            stats.done = len(codes)
+            return stats
+
+        if fetch_flag != adjustflag:
+            # Unadjusted bars are stored; each code also needs its factor table to be adjusted
+            _, failures = self.store.adjuster.load(codes, self.pool)
+            for code, error_msg in failures.items():
+                stats.failures.append((code, f"Adjustment factors: {error_msg}"))
+                stats.done += 1
+            codes = [c for c in codes if c not in failures]
+
+        pending = {}
+        gaps = deque()
+        for code in codes:
+            missing, error_msg = self.store.missing_ranges(code, start, end, frequency, adjustflag)
+            if error_msg is not None:
+                stats.failures.append((code, error_msg))
+                stats.done += 1
+                continue
+            pending[code] = len(missing)
+            gaps.extend((code, gap_start, gap_end) for gap_start, gap_end in missing)
+
+        # Codes already fully stored finish immediately
+        for code in [c for c, n in pending.items() if n == 0]:
+            self._finish_code(code, start, end, frequency, adjustflag, stats)
+            pending.pop(code)
+        if progress:
+            progress(stats)
+
+        failed = set()
+        futures = {}
+        limit = self.max_outstanding or len(gaps)
+
+        def submit_gaps():
+            while gaps and len(futures) < limit:
+                code, gap_start, gap_end = gaps.popleft()
+                if code in failed:
+                    continue
+                future = self.pool.submit(
+                    'query_history_k_data_plus', code, fields,
+                    start_date=gap_start.isoformat(), end_date=gap_end.isoformat(),
+                    frequency=frequency, adjustflag=fetch_flag
+                )
+                futures[future] = (code, gap_start, gap_end)
+
+        submit_gaps()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                code, gap_start, gap_end = futures.pop(future)
+                try:
+                    df, error_msg = future.result()
+                except Exception as e:
+                    df, error_msg = None, str(e)
+                if code in failed:
+                    continue
+                if error_msg is not None:
+                    failed.add(code)
+                    pending.pop(code, None)
+                    stats.failures.append((code, error_msg))
+                    stats.done += 1
+                else:
+                    self.store.ingest(code, frequency, adjustflag, df, gap_start, gap_end)
+                    stats.rows += len(df)
+                    pending[code] -= 1
+                    if pending[code] == 0:
+                        pending.pop(code)
+                        self._finish_code(code, start, end, frequency, adjustflag, stats)
+                if progress:
+                    progress(stats)
+            submit_gaps()
+        return stats
+
+    def _finish_code(self, code, start, end, frequency, adjustflag, stats):
+        # Every trading day in the range is now stored; remember the whole span
+        self.store.ingest(code, frequency, adjustflag, None, start, min(end, complete_through(frequency)))
+        stats.succeeded.append(code)
+        stats.done += 1
+
+    def load(self, codes, start_date, end_date, frequency="d", adjustflag="3", fields=None):
+        """Stacked bars for several codes, read from the local store
+
+        Bars stored unadjusted are stacked first and adjusted in one pass.
+        """
+        adjustflag = str(adjustflag)
+        stored_flag = series_flag(frequency, adjustflag)
+        columns = split_fields(fields) if fields else None
+        read_fields = columns
+        if columns is not None and stored_flag != adjustflag:
+            read_fields = list(dict.fromkeys(columns + ['code', 'date']))
+        frames = [
+            self.store.read(code, start_date, end_date, frequency, stored_flag, read_fields)
+            for code in codes
+        ]
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        if stored_flag != adjustflag:
+            tables, failures = self.store.adjuster.load(codes, self.pool)
+            if failures:
+                code, error_msg = next(iter(failures.items()))
+                raise RuntimeError(f"Adjustment factors for {code}: {error_msg}")
+            df = adjust_bars(df, tables, adjustflag)
+        return df[columns] if columns is not None else df
@@ -0,0 +1,291 @@
+"""Process-wide gateway every BaoStock call passes through
+
+BaoStock throttles or drops requests when it is sent too many at once, and
+hammering it harder only makes that worse. The gateway paces calls with a
+token bucket, caps how many are in flight with a limit that grows by one per
+round of successes and halves when the server starts failing or slowing
+down (AIMD), retries transient failures with jittered exponential backoff,
+and stops sending anything for a while once failures pile up (circuit
+breaker), so a struggling server gets room to recover.
+
+Worker processes make single attempts; the retries, pacing and limits all
+live in the main process, which sees every call.
+"""
+import os
+import random
+import threading
+import time
+
+from perf_metrics import get_metrics
+
+# Requests per second across the whole process; override with BAOSTOCK_RATE
+DEFAULT_RATE = 20.0
+# Requests that may be sent back to back after a quiet spell
+DEFAULT_BURST = 5
+
+# Calls in flight at first, and the bounds the adaptive limit stays within;
+# override the maximum with BAOSTOCK_MAX_CONCURRENCY
+DEFAULT_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 8
+# The limit is multiplied by this when the server struggles
+DECREASE_FACTOR = 0.5
+
+# A success this many times slower than usual (and slower than the floor) counts as congestion
+SLOW_FACTOR = 4.0
+SLOW_FLOOR_SECONDS = 2.0
+# Weight of the newest success in the usual latency
+LATENCY_SMOOTHING = 0.05
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+
+# Consecutive transient failures that open the circuit, and how long it stays open
+BREAKER_FAILURES = 8
+BREAKER_COOLDOWN = 30.0
+
+# Error codes meaning the login or the socket is gone; a fresh login may fix them
+RELOGIN_ERROR_CODES = {
+    '10001001',  # not logged in
+    '10002001',  # socket error
+    '10002002',  # connect failed
+    '10002003',  # connect timeout
+    '10002004',  # connection closed while receiving
+    '10002005',  # send failed
+    '10002006',  # send timeout
+    '10002007',  # receive failed
+    '10002008',  # receive timeout
+}
+
+# Raised inside the client rather than returned as an error code
+EXCEPTION_ERROR_CODE = 'exception'
+# Not sent at all: the circuit is open
+CIRCUIT_OPEN_ERROR_CODE = 'circuit_open'
+
+# Failures worth retrying: connection problems plus server-side hiccups
+TRANSIENT_ERROR_CODES = RELOGIN_ERROR_CODES | {
+    EXCEPTION_ERROR_CODE,
+    '10004003',  # unknown client error
+    '10005001',  # system error
+}
+
+# Circuit breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling BaoStock while the circuit is open"""
+
+
+class TokenBucket:
+    """Allows ``rate`` calls per second on average and ``burst`` back to back"""
+
+    def __init__(self, rate, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Take a token, sleeping until one is available; returns the seconds waited"""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            # A negative balance is a reservation: this caller sleeps until it is repaid
+            delay = -self._tokens / self.rate if self._tokens < 0 and self.rate else 0.0
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class CircuitBreaker:
+    """Opens after a run of transient failures; one probe call is let through after the cooldown"""
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened = 0
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                return True
+            return self.state == CLOSED
+
+    def retry_in(self):
+        """Seconds until the next probe is allowed"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def success(self):
+        with self._lock:
+            self.state = CLOSED
+            self._consecutive = 0
+
+    def failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self.state == HALF_OPEN or self._consecutive >= self.failures:
+                if self.state != OPEN:
+                    self.opened += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+
+class CallGateway:
+    """Token-bucket pacing, AIMD concurrency, retries and a circuit breaker for BaoStock calls"""
+
+    def __init__(self, rate=None, burst=DEFAULT_BURST, concurrency=DEFAULT_CONCURRENCY,
+                 max_concurrency=None, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, breaker=None):
+        if rate is None:
+            rate = float(os.environ.get('BAOSTOCK_RATE', DEFAULT_RATE))
+        if max_concurrency is None:
+            max_concurrency = int(os.environ.get('BAOSTOCK_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = breaker or CircuitBreaker()
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(concurrency, max_concurrency))
+        self.retries = retries
+        self.backoff = backoff
+        self.in_flight = 0
+        self.usual_latency = None
+        self.calls = 0
+        self.retried = 0
+        self.throttled = 0
+        self.slow = 0
+        self.rejected = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def set_rate(self, rate):
+        self.bucket.set_rate(rate)
+
+    def call(self, attempt, api=None):
+        """Run ``attempt()`` under the gateway's limits, retrying transient failures
+
+        ``attempt`` makes one BaoStock call and returns (error_code, value);
+        the (error_code, value) of the last attempt is returned. Raises
+        CircuitOpenError while the circuit is open. Exceptions from
+        ``attempt`` are not retried.
+        """
+        for n in range(self.retries + 1):
+            if n:
+                with self._cond:
+                    self.retried += 1
+                # Jittered exponential backoff so callers do not retry in lockstep
+                time.sleep(min(MAX_BACKOFF, self.backoff * 2 ** (n - 1)) * random.uniform(0.5, 1.5))
+            error_code, value = self._attempt(attempt, api)
+            if error_code not in TRANSIENT_ERROR_CODES:
+                break
+        return error_code, value
+
+    def _attempt(self, attempt, api):
+        if not self.breaker.allow():
+            with self._cond:
+                self.rejected += 1
+            raise CircuitOpenError(f"BaoStock is failing repeatedly; calls paused for "
+                                   f"{self.breaker.retry_in():.0f}s")
+        start = time.perf_counter()
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        try:
+            self.bucket.acquire()
+            get_metrics().record('gateway_wait', time.perf_counter() - start, api=api)
+            start = time.perf_counter()
+            try:
+                error_code, value = attempt()
+            except Exception:
+                self.breaker.failure()
+                raise
+            self._observe(error_code, start, time.perf_counter() - start)
+            return error_code, value
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def _observe(self, error_code, start, seconds):
+        with self._cond:
+            self.calls += 1
+            if error_code in TRANSIENT_ERROR_CODES:
+                self.throttled += 1
+                self._decrease(start)
+            elif error_code == '0' and self._is_slow(seconds):
+                self.slow += 1
+                self._decrease(start)
+            else:
+                # Additive increase: about one more slot per round of `limit` good calls
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            if error_code == '0':
+                previous = self.usual_latency or seconds
+                self.usual_latency = previous + LATENCY_SMOOTHING * (seconds - previous)
+        if error_code in TRANSIENT_ERROR_CODES:
+            self.breaker.failure()
+        else:
+            # The server answered, even if it refused the request
+            self.breaker.success()
+
+    def _is_slow(self, seconds):
+        return (self.usual_latency is not None and seconds > SLOW_FLOOR_SECONDS
+                and seconds > SLOW_FACTOR * self.usual_latency)
+
+    def _decrease(self, start):
+        # Calls sent before the last cut report the congestion that caused it; cut once per round
+        if start >= self._last_decrease:
+            self.limit = max(MIN_CONCURRENCY, self.limit * DECREASE_FACTOR)
+            self._last_decrease = time.perf_counter()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'rate': self.rate,
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'breaker': self.breaker.state,
+                'calls': self.calls,
+                'retried': self.retried,
+                'throttled': self.throttled,
+                'slow': self.slow,
+                'rejected': self.rejected,
+                'usual_ms': self.usual_latency * 1000 if self.usual_latency is not None else None,
+            }
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Return the process-wide call gateway"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = CallGateway()
+        return _gateway
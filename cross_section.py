@@ -0,0 +1,247 @@
+"""Whole-market daily bars partitioned by trading day, for screens and rankings across codes
+
+BaoStock serves K-lines one code at a time, so a day of the whole market
+costs one call per code. The store fills a date range with one call per
+code listed by query_all_stock (over the worker pool, through the K-line
+store), then writes one Parquet file per trading day holding every code's
+bar. Screens and rankings read only the day files they need, with the
+filters pushed down into the Parquet reader.
+"""
+import json
+import os
+import re
+import threading
+from concurrent.futures import as_completed
+from datetime import date, timedelta
+
+import baostock as bs
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from bulk_download import BulkDownloader
+from kline_store import complete_through, get_kline_store, merge_ranges, normalize_bars, store_fields
+from query_cache import get_query_cache, normalize_params
+from result_decoder import FIELD_DTYPES
+from trade_calendar import get_trade_calendar, to_date
+from worker_pool import get_worker_pool
+
+CROSS_SECTION_DIR = os.path.join("cache", "cross_section")
+COVERAGE_FILE = "coverage.json"
+
+# Trading days whose day files are written from one load of the K-line store
+WRITE_DAYS = 20
+
+SCREEN_OPERATORS = ("=", "!=", ">", ">=", "<", "<=")
+
+# Arrow types of the decoder's field kinds; anything else is stored as a string
+ARROW_TYPES = {'float': pa.float64(), 'int': pa.int64(), 'date': pa.timestamp('ns')}
+
+_FILTER = re.compile(r"\s*(\w+)\s*(>=|<=|!=|=|>|<)\s*(.+?)\s*$")
+
+
+def parse_filter(text):
+    """(column, operator, value) from text such as 'pctChg>9'; raises ValueError"""
+    match = _FILTER.match(text)
+    if not match:
+        raise ValueError(f"expected column, operator and value, e.g. pctChg>9; got {text!r}")
+    return match.groups()
+
+
+def filter_expression(filters):
+    """Arrow expression for [(column, operator, value)], values converted to the column's type"""
+    terms = []
+    for column, operator, value in filters:
+        if operator not in SCREEN_OPERATORS:
+            raise ValueError(f"Unknown filter operator: {operator}")
+        if column not in store_fields("d"):
+            raise ValueError(f"Unknown column: {column}")
+        kind = FIELD_DTYPES.get(column, 'string')
+        if kind in ('float', 'int'):
+            value = float(value)
+        elif kind == 'date':
+            value = pd.Timestamp(value)
+        else:
+            value = str(value)
+        terms.append((column, "==" if operator == "=" else operator, value))
+    return pq.filters_to_expression(terms) if terms else None
+
+
+def day_schema():
+    """Arrow schema every day file is written with, so days without bars match the others"""
+    return pa.schema([(field, ARROW_TYPES.get(FIELD_DTYPES.get(field), pa.string()))
+                      for field in store_fields("d")])
+
+
+def rank_by(df, column, top=None, ascending=False):
+    """Rows ranked by ``column`` within each day, best first, with a 'rank' column; the top ``top`` per day"""
+    ranked = df.dropna(subset=[column]).sort_values(['date', column], ascending=[True, ascending], kind='stable')
+    ranked.insert(0, 'rank', ranked.groupby('date', observed=True).cumcount().to_numpy() + 1)
+    if top:
+        ranked = ranked[ranked['rank'] <= top]
+    return ranked.reset_index(drop=True)
+
+
+class CrossSectionStore:
+    """One Parquet file of every code's daily bar per trading day, with recorded date coverage"""
+
+    def __init__(self, kline_store=None, query_cache=None, calendar=None, root=CROSS_SECTION_DIR):
+        self.kline_store = kline_store or get_kline_store()
+        self.query_cache = query_cache or get_query_cache()
+        self.calendar = calendar or get_trade_calendar()
+        self.root = root
+        self._lock = threading.Lock()
+
+    def day_path(self, day):
+        day = to_date(day)
+        return os.path.join(self.root, f"{day:%Y}", f"{day.isoformat()}.parquet")
+
+    def coverage(self):
+        """Date ranges held"""
+        try:
+            with open(os.path.join(self.root, COVERAGE_FILE), encoding='utf-8') as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return merge_ranges([(date.fromisoformat(s), date.fromisoformat(e)) for s, e in raw.get('ranges', [])])
+
+    def _mark_covered(self, start, end):
+        ranges = self.coverage() + [(start, end)]
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, COVERAGE_FILE)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({'ranges': [[s.isoformat(), e.isoformat()] for s, e in merge_ranges(ranges)]}, f)
+        os.replace(path + ".tmp", path)
+
+    def missing_days(self, start_date, end_date):
+        """Trading days in the range without a final day file; returns (list of dates, error_msg)"""
+        end = min(to_date(end_date), complete_through("d"))
+        days, error_msg = self.calendar.trading_days(to_date(start_date), end)
+        if error_msg is not None:
+            return None, error_msg
+        held = self.coverage()
+        return [d for d in (to_date(d) for d in days) if not any(s <= d <= e for s, e in held)], None
+
+    def market_codes(self, days, pool=None):
+        """Every code query_all_stock lists on any of ``days``; returns (sorted codes, error_msg)"""
+        pool = pool or get_worker_pool()
+        codes, futures = set(), {}
+        for day in days:
+            params = normalize_params(bs.query_all_stock, (), {'day': day.isoformat()})
+            df = self.query_cache.get('query_all_stock', params)
+            if df is not None:
+                codes.update(df['code'])
+            else:
+                futures[pool.submit('query_all_stock', day=day.isoformat())] = params
+        for future in as_completed(futures):
+            df, error_msg = future.result()
+            if error_msg is not None:
+                return None, f"query_all_stock: {error_msg}"
+            self.query_cache.put('query_all_stock', futures[future], df)
+            codes.update(df['code'])
+        return sorted(codes), None
+
+    def update(self, start_date, end_date, pool=None, progress=None):
+        """Fill the missing trading days of the range; returns (BulkProgress or None, error_msg)
+
+        Only days whose bars are final are filled, so running this after the
+        close appends the new day. Codes already held in the K-line store are
+        not downloaded again. Nothing is written unless every code succeeded.
+        """
+        pool = pool or get_worker_pool()
+        with self._lock:
+            days, error_msg = self.missing_days(start_date, end_date)
+            if error_msg is not None or not days:
+                return None, error_msg
+            codes, error_msg = self.market_codes(days, pool)
+            if error_msg is not None:
+                return None, error_msg
+            downloader = BulkDownloader(self.kline_store, pool)
+            stats = downloader.download(codes, days[0], days[-1], "d", "3", progress=progress)
+            if stats.failures:
+                code, error_msg = stats.failures[0]
+                return stats, f"{len(stats.failures)} codes failed, e.g. {code}: {error_msg}"
+            for i in range(0, len(days), WRITE_DAYS):
+                chunk = days[i:i + WRITE_DAYS]
+                self._write_days(downloader.load(codes, chunk[0], chunk[-1], "d", "3"), chunk)
+            # The calendar has no trading days in between, so the whole span is held
+            self._mark_covered(to_date(start_date), days[-1])
+            return stats, None
+
+    def _write_days(self, df, days):
+        schema = day_schema()
+        parts = {}
+        if not df.empty:
+            df = df.reindex(columns=schema.names)
+            # Categories are written as plain strings and volume as a nullable integer
+            for column in df.columns:
+                if isinstance(df[column].dtype, pd.CategoricalDtype):
+                    df[column] = df[column].astype(object)
+            df['volume'] = df['volume'].astype('Int64')
+            parts = dict(tuple(df.groupby('date')))
+        for day in days:
+            part = parts.get(pd.Timestamp(day))
+            if part is None:
+                table = schema.empty_table()
+            else:
+                table = pa.Table.from_pandas(part.sort_values('code'), schema=schema, preserve_index=False)
+            path = self.day_path(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pq.write_table(table, path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+    def read(self, start_date, end_date=None, columns=None, filters=()):
+        """Bars of every code on the held trading days of the range; returns (DataFrame, error_msg)
+
+        ``filters`` is [(column, operator, value)], all of which must hold.
+        Raises ValueError for an unknown column or operator.
+        """
+        start = to_date(start_date)
+        end = to_date(end_date or start_date)
+        days, error_msg = self.calendar.trading_days(start, end)
+        if error_msg is not None:
+            return None, error_msg
+        paths = [p for p in (self.day_path(d) for d in days) if os.path.exists(p)]
+        expression = filter_expression(filters)
+        if columns is not None:
+            columns = list(dict.fromkeys(['date', 'code'] + list(columns)))
+        if not paths:
+            return pd.DataFrame(columns=columns or store_fields("d")), None
+        table = ds.dataset(paths, format='parquet').to_table(columns=columns, filter=expression)
+        return normalize_bars(table.to_pandas()), None
+
+    def top(self, start_date, end_date, column, n=20, ascending=False, filters=(), columns=None):
+        """The ``n`` best rows by ``column`` on each day; returns (DataFrame, error_msg)"""
+        if columns is not None:
+            columns = list(dict.fromkeys(list(columns) + [column]))
+        df, error_msg = self.read(start_date, end_date, columns, filters)
+        if error_msg is not None:
+            return None, error_msg
+        return rank_by(df, column, n, ascending), None
+
+    def held_through(self):
+        """Last day held, or None"""
+        held = self.coverage()
+        return held[-1][1] if held else None
+
+
+def previous_trading_day(calendar=None, before=None):
+    """Last trading day whose daily bars are final, on or before ``before``"""
+    calendar = calendar or get_trade_calendar()
+    end = min(to_date(before or date.today()), complete_through("d"))
+    days, _ = calendar.trading_days(end - timedelta(days=30), end)
+    return to_date(days[-1]) if days is not None and len(days) else end
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_cross_section_store():
+    """Return the process-wide cross-section store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CrossSectionStore()
+        return _store
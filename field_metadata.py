@@ -0,0 +1,93 @@
+"""Field descriptions loaded once per process, with memoized per-schema help texts"""
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+FIELD_DESC_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "field_descriptions.csv")
+
+# Distinct (columns, category) schemas kept in the memo
+SCHEMA_CACHE_SIZE = 64
+
+NO_DESCRIPTION = "No description available"
+
+
+class FieldMetadata:
+    """Read-only {field_name: info} lookup plus memoized help texts per result schema"""
+
+    def __init__(self, path=FIELD_DESC_FILE):
+        df = pd.read_csv(path, encoding='utf-8-sig', dtype=str).fillna("")
+        # Fields such as code, date and pubDate are described once per API category
+        self._by_category = {
+            (category, name): {'category': category, 'description': description, 'detail': detail}
+            for name, category, description, detail in zip(
+                df['field_name'], df['api_category'], df['field_description'], df['field_detail']
+            )
+        }
+        # Without a category, later rows win, as with the old row-by-row dict build
+        self.fields = {name: info for (_, name), info in self._by_category.items()}
+        self._schemas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def info(self, field_name, api_category=""):
+        """{category, description, detail} of a field, preferring the category's own row; None if unknown"""
+        info = self._by_category.get((api_category, field_name))
+        return info if info is not None else self.fields.get(field_name)
+
+    def help_text(self, field_name, api_category=""):
+        info = self.info(field_name, api_category)
+        if info is None:
+            return f"{field_name} ({NO_DESCRIPTION})"
+        if info['detail']:
+            return f"{info['description']}\n{info['detail']}"
+        return info['description']
+
+    def schema(self, columns, api_category=""):
+        """Help texts and the description-panel markdown for a column tuple, built once per schema
+
+        ``api_category`` is the field group in the descriptions file ('Profit
+        Data', 'K-Line Data', ...).
+        """
+        key = (tuple(columns), api_category)
+        with self._lock:
+            cached = self._schemas.get(key)
+            if cached is not None:
+                self._schemas.move_to_end(key)
+                return cached
+        cached = {
+            'help': {col: self.help_text(col, api_category) for col in key[0]},
+            'panel': self._panel_markdown(key[0], api_category),
+        }
+        with self._lock:
+            self._schemas[key] = cached
+            while len(self._schemas) > SCHEMA_CACHE_SIZE:
+                self._schemas.popitem(last=False)
+        return cached
+
+    def _panel_markdown(self, columns, api_category=""):
+        lines = ["| Field | Description | Detail |", "| --- | --- | --- |"]
+        for col in columns:
+            info = self.info(col, api_category)
+            if info is None:
+                lines.append(f"| `{col}` | {NO_DESCRIPTION} | |")
+            else:
+                lines.append(f"| `{col}` | {_cell(info['description'])} | {_cell(info['detail'])} |")
+        return "\n".join(lines)
+
+
+def _cell(text):
+    return text.replace("|", "\\|").replace("\n", " ")
+
+
+_metadata = None
+_metadata_lock = threading.Lock()
+
+
+def get_field_metadata(path=FIELD_DESC_FILE):
+    """Return the process-wide field metadata; raises OSError if the file is missing"""
+    global _metadata
+    with _metadata_lock:
+        if _metadata is None:
+            _metadata = FieldMetadata(path)
+        return _metadata
@@ -0,0 +1,111 @@
+"""Sweep quarterly financial statements over many codes, years and quarters in one job"""
+import time
+from concurrent.futures import as_completed
+from itertools import product
+
+import baostock as bs
+import pandas as pd
+
+from query_cache import get_query_cache, normalize_params
+from worker_pool import get_worker_pool
+
+# Statement name -> BaoStock API
+STATEMENT_APIS = {
+    'profit': 'query_profit_data',
+    'operation': 'query_operation_data',
+    'growth': 'query_growth_data',
+    'balance': 'query_balance_data',
+    'cash_flow': 'query_cash_flow_data',
+    'dupont': 'query_dupont_data',
+}
+
+PANEL_KEY = ['code', 'statDate', 'pubDate', 'statement']
+PANEL_COLUMNS = PANEL_KEY + ['field', 'value']
+
+
+class SweepProgress:
+    """Running totals for a sweep"""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.cached = 0
+        self.fetched = 0
+        self.failures = []
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def to_long(df, statement):
+    """Melt one statement result into (code, statDate, pubDate, statement, field, value) rows"""
+    if df is None or df.empty:
+        return None
+    id_vars = [c for c in ('code', 'statDate', 'pubDate') if c in df.columns]
+    long_df = df.melt(id_vars=id_vars, var_name='field', value_name='value')
+    long_df['statement'] = statement
+    long_df['value'] = pd.to_numeric(long_df['value'], errors='coerce')
+    return long_df
+
+
+class FinancialSweep:
+    """Runs the code x year x quarter x statement product concurrently
+
+    Cells already in the query cache are read locally; closed quarters are
+    cached without expiry, so repeated sweeps only fetch recent quarters.
+    """
+
+    def __init__(self, query_cache=None, pool=None):
+        self.query_cache = query_cache or get_query_cache()
+        self.pool = pool or get_worker_pool()
+
+    def cells(self, codes, years, quarters, statements):
+        return list(product(codes, years, quarters, statements))
+
+    def run(self, codes, years, quarters, statements, progress=None):
+        """Tidy long panel keyed by (code, statDate, pubDate, statement); returns (DataFrame, SweepProgress)"""
+        cells = self.cells(codes, years, quarters, statements)
+        stats = SweepProgress(len(cells))
+        frames = []
+        futures = {}
+
+        for code, year, quarter, statement in cells:
+            api_name = STATEMENT_APIS[statement]
+            kwargs = {'code': code, 'year': int(year), 'quarter': int(quarter)}
+            params = normalize_params(getattr(bs, api_name), (), kwargs)
+            df = self.query_cache.get(api_name, params)
+            if df is not None:
+                frames.append(to_long(df, statement))
+                stats.cached += 1
+                stats.done += 1
+                continue
+            future = self.pool.submit(api_name, **kwargs)
+            futures[future] = (code, year, quarter, statement, api_name, params)
+        if progress:
+            progress(stats)
+
+        for future in as_completed(futures):
+            code, year, quarter, statement, api_name, params = futures[future]
+            try:
+                df, error_msg = future.result()
+            except Exception as e:
+                df, error_msg = None, str(e)
+            stats.done += 1
+            if error_msg is not None:
+                stats.failures.append((code, f"{year}Q{quarter}", statement, error_msg))
+            else:
+                self.query_cache.put(api_name, params, df)
+                frames.append(to_long(df, statement))
+                stats.fetched += 1
+            if progress:
+                progress(stats)
+
+        frames = [f for f in frames if f is not None]
+        if not frames:
+            return pd.DataFrame(columns=PANEL_COLUMNS), stats
+        panel = pd.concat(frames, ignore_index=True).reindex(columns=PANEL_COLUMNS)
+        panel['statement'] = panel['statement'].astype('category')
+        panel = panel.sort_values(PANEL_KEY + ['field'], ignore_index=True)
+        return panel, stats
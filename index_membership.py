@@ -0,0 +1,280 @@
+"""Index constituent history as per-code membership intervals, with as-of lookups
+
+query_sz50_stocks, query_hs300_stocks and query_zz500_stocks return the
+constituents on one date. Membership changes a few times a year, so instead
+of a snapshot per trading day the history is sampled every SAMPLE_DAYS
+trading days and only the stretches where two samples differ are bisected
+down to the first trading day of each change. The result is held as one
+[in, out) interval per stay of a code in the index, persisted per index and
+loaded into sorted arrays for lookups.
+"""
+import json
+import os
+import threading
+from concurrent.futures import as_completed
+from datetime import date
+
+import baostock as bs
+import numpy as np
+import pandas as pd
+
+from query_cache import get_query_cache, normalize_params
+from trade_calendar import get_trade_calendar, to_date
+
+INDEX_APIS = ('query_sz50_stocks', 'query_hs300_stocks', 'query_zz500_stocks')
+
+MEMBERSHIP_DIR = os.path.join("cache", "index_membership")
+COVERAGE_FILE = "coverage.json"
+INTERVALS_FILE = "intervals.parquet"
+
+# Trading days between samples; a change is then located by bisection
+SAMPLE_DAYS = 20
+
+
+class MembershipHistory:
+    """Sorted membership intervals of one index over its sampled date range"""
+
+    def __init__(self, intervals, start, end):
+        self.intervals = intervals.sort_values(['in_date', 'code'], kind='stable').reset_index(drop=True)
+        self.start, self.end = start, end
+        self._codes = self.intervals['code'].to_numpy()
+        self._in = self.intervals['in_date'].to_numpy('datetime64[D]')
+        # Open intervals run past any date looked up
+        self._out = self.intervals['out_date'].to_numpy('datetime64[D]')
+        self._out = np.where(np.isnat(self._out), np.datetime64('9999-12-31'), self._out)
+        self._by_code = {}
+        for code, rows in self.intervals.groupby('code', sort=False).indices.items():
+            self._by_code[code] = (self._in[rows], self._out[rows])
+
+    def _day(self, day):
+        day = to_date(day)
+        if not self.start <= day <= self.end:
+            raise ValueError(f"{day} is outside the sampled range {self.start} → {self.end}")
+        return np.datetime64(day, 'D')
+
+    def constituents(self, day):
+        """Sorted codes in the index on ``day``"""
+        day = self._day(day)
+        entered = np.searchsorted(self._in, day, side='right')
+        return sorted(self._codes[:entered][self._out[:entered] > day])
+
+    def contains(self, code, day):
+        """Whether ``code`` was in the index on ``day``"""
+        day = self._day(day)
+        spans = self._by_code.get(code)
+        if spans is None:
+            return False
+        ins, outs = spans
+        i = np.searchsorted(ins, day, side='right') - 1
+        return bool(i >= 0 and outs[i] > day)
+
+    def members_between(self, start, end):
+        """Sorted codes in the index on any day of [start, end], leavers included"""
+        start, end = self._day(start), self._day(end)
+        entered = np.searchsorted(self._in, end, side='right')
+        return sorted(set(self._codes[:entered][self._out[:entered] > start]))
+
+
+def _snapshot_key(df):
+    """What identifies a constituent list: its update date and its codes"""
+    if df is None or df.empty:
+        return None, ()
+    updated = str(df['updateDate'].iloc[0]) if 'updateDate' in df.columns else None
+    return updated, tuple(sorted(df['code']))
+
+
+def intervals_from_changes(changes):
+    """Membership intervals from [(first day, constituents DataFrame)] in date order
+
+    Codes still in after the last change get an open (NaT) out date.
+    """
+    opened, names, rows = {}, {}, []
+    for day, df in changes:
+        codes = set() if df is None or df.empty else set(df['code'])
+        if df is not None and not df.empty and 'code_name' in df.columns:
+            names.update(zip(df['code'], df['code_name']))
+        for code in [c for c in opened if c not in codes]:
+            rows.append((code, opened.pop(code), day))
+        for code in codes - set(opened):
+            opened[code] = day
+    rows += [(code, day, None) for code, day in opened.items()]
+    intervals = pd.DataFrame(rows, columns=['code', 'in_date', 'out_date'])
+    intervals.insert(1, 'code_name', intervals['code'].map(names))
+    for column in ('in_date', 'out_date'):
+        intervals[column] = pd.to_datetime(intervals[column])
+    return intervals
+
+
+def changes_from_intervals(intervals):
+    """[(first day, constituents DataFrame)] at every boundary of stored intervals"""
+    if intervals.empty:
+        return []
+    ins = intervals['in_date'].to_numpy('datetime64[D]')
+    outs = intervals['out_date'].to_numpy('datetime64[D]')
+    changes = []
+    for day in np.unique(np.concatenate([ins, outs[~np.isnat(outs)]])):
+        members = intervals[(ins <= day) & (np.isnat(outs) | (outs > day))]
+        changes.append((to_date(day), members[['code', 'code_name']].reset_index(drop=True)))
+    return changes
+
+
+class IndexMembership:
+    """Membership intervals per index, sampled from BaoStock on demand and kept on disk"""
+
+    def __init__(self, query_cache=None, calendar=None, root=MEMBERSHIP_DIR):
+        self.query_cache = query_cache or get_query_cache()
+        self.calendar = calendar or get_trade_calendar()
+        self.root = root
+        self.snapshots = 0
+        self._histories = {}
+        self._locks = {index: threading.Lock() for index in INDEX_APIS}
+
+    def _dir(self, index):
+        return os.path.join(self.root, index)
+
+    def coverage(self, index):
+        """(start, end) of the sampled range, or None"""
+        try:
+            with open(os.path.join(self._dir(index), COVERAGE_FILE), encoding='utf-8') as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return date.fromisoformat(raw['start']), date.fromisoformat(raw['end'])
+
+    def _load(self, index):
+        coverage = self.coverage(index)
+        path = os.path.join(self._dir(index), INTERVALS_FILE)
+        if coverage is None or not os.path.exists(path):
+            return None
+        return MembershipHistory(pd.read_parquet(path), *coverage)
+
+    def _save(self, index, intervals, start, end):
+        index_dir = self._dir(index)
+        os.makedirs(index_dir, exist_ok=True)
+        path = os.path.join(index_dir, INTERVALS_FILE)
+        intervals.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        path = os.path.join(index_dir, COVERAGE_FILE)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({'start': start.isoformat(), 'end': end.isoformat()}, f)
+        os.replace(path + ".tmp", path)
+
+    def history(self, index, start=None, end=None, pool=None):
+        """Membership history covering [start, end], sampling what is missing; returns (MembershipHistory, error_msg)
+
+        ``end`` defaults to today and ``start`` to ``end``. With a worker pool
+        the regular samples are fetched in parallel.
+        """
+        if index not in INDEX_APIS:
+            return None, f"Unknown index: {index}"
+        end = min(to_date(end or date.today()), date.today())
+        start = min(to_date(start or end), end)
+        with self._locks[index]:
+            history = self._histories.get(index) or self._load(index)
+            if history is not None and history.start <= start and end <= history.end:
+                self._histories[index] = history
+                return history, None
+            try:
+                history = self._extend(index, history, start, end, pool)
+            except RuntimeError as e:
+                return None, str(e)
+            self._histories[index] = history
+            return history, None
+
+    def _extend(self, index, history, start, end, pool):
+        if history is None:
+            changes = self._walk(index, start, end, pool)
+        else:
+            # Walk only the days before and after the stored range; the walks share its boundary days
+            start, end = min(start, history.start), max(end, history.end)
+            changes = changes_from_intervals(history.intervals)
+            if start < history.start:
+                changes = [c for c in self._walk(index, start, history.start, pool)
+                           if c[0] < history.start] + changes
+            if end > history.end:
+                changes += [c for c in self._walk(index, history.end, end, pool) if c[0] > history.end]
+        changes = _drop_repeats(changes)
+        intervals = intervals_from_changes(changes)
+        self._save(index, intervals, start, end)
+        return MembershipHistory(intervals, start, end)
+
+    def _walk(self, index, start, end, pool):
+        """[(first day, constituents)] for [start, end]: the first day plus every change"""
+        days, error_msg = self.calendar.trading_days(start, end)
+        if error_msg is not None:
+            raise RuntimeError(error_msg)
+        if not len(days):
+            raise RuntimeError(f"No trading days between {start} and {end}")
+        days = [to_date(d) for d in days]
+        samples = sorted(set(range(0, len(days), SAMPLE_DAYS)) | {len(days) - 1})
+        snapshots = self._snapshots(index, [days[i] for i in samples], pool)
+        changes = [(days[0], snapshots[0])]
+        for (i, a), (j, b) in zip(zip(samples, snapshots), zip(samples[1:], snapshots[1:])):
+            if _snapshot_key(a) != _snapshot_key(b):
+                changes += self._bisect(index, days, i, a, j, b)
+        return changes
+
+    def _bisect(self, index, days, i, a, j, b):
+        """Changes on days (i, j] between the constituents ``a`` on days[i] and ``b`` on days[j]"""
+        if j - i == 1:
+            return [(days[j], b)]
+        m = (i + j) // 2
+        middle = self._snapshot(index, days[m])
+        changes = []
+        if _snapshot_key(middle) != _snapshot_key(a):
+            changes += self._bisect(index, days, i, a, m, middle)
+        if _snapshot_key(middle) != _snapshot_key(b):
+            changes += self._bisect(index, days, m, middle, j, b)
+        return changes
+
+    def _snapshot(self, index, day):
+        self.snapshots += 1
+        df, error_msg = self.query_cache.fetch(getattr(bs, index), date=day.isoformat())
+        if error_msg is not None:
+            raise RuntimeError(f"{index} on {day}: {error_msg}")
+        return df
+
+    def _snapshots(self, index, days, pool):
+        """Constituents on each day, fetching uncached ones over the worker pool"""
+        if pool is None:
+            return [self._snapshot(index, day) for day in days]
+        self.snapshots += len(days)
+        found, futures = {}, {}
+        for day in days:
+            params = normalize_params(getattr(bs, index), (), {'date': day.isoformat()})
+            df = self.query_cache.get(index, params)
+            if df is not None:
+                found[day] = df
+            else:
+                futures[pool.submit(index, date=day.isoformat())] = (day, params)
+        for future in as_completed(futures):
+            day, params = futures[future]
+            df, error_msg = future.result()
+            if error_msg is not None:
+                raise RuntimeError(f"{index} on {day}: {error_msg}")
+            self.query_cache.put(index, params, df)
+            found[day] = df
+        return [found[day] for day in days]
+
+
+def _drop_repeats(changes):
+    """Changes whose constituents differ from the previous ones"""
+    kept = []
+    for day, df in changes:
+        codes = _snapshot_key(df)[1]
+        if not kept or codes != _snapshot_key(kept[-1][1])[1]:
+            kept.append((day, df))
+    return kept
+
+
+_membership = None
+_membership_lock = threading.Lock()
+
+
+def get_index_membership():
+    """Return the process-wide index membership store"""
+    global _membership
+    with _membership_lock:
+        if _membership is None:
+            _membership = IndexMembership()
+        return _membership
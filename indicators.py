@@ -0,0 +1,375 @@
+"""Technical indicators over K-line results, per code and extended incrementally
+
+Indicators are named by kind and window, e.g. MA20, EMA12, RSI14, ATR14,
+BOLL20 and MACD (12/26/9). Every computation runs over all codes of a
+stacked frame at once with grouped pandas windows; nothing loops over bars
+in Python. The engine keeps each series' indicator columns together with
+the state at its last bar (EMA values, Wilder averages, the window tail),
+so when the same series comes back with bars appended only the new bars
+are computed.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Window used when a name gives none, e.g. "RSI"
+DEFAULT_WINDOWS = {'MA': 20, 'EMA': 20, 'RSI': 14, 'ATR': 14, 'BOLL': 20}
+
+# Offered in the browser
+DEFAULT_INDICATORS = ("MA5", "MA10", "MA20", "MA60", "EMA12", "EMA26", "MACD", "RSI14", "ATR14", "BOLL20")
+
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+
+# Bollinger bands lie this many standard deviations from the moving average
+BOLL_WIDTH = 2.0
+
+# Bars of indicator columns kept for incremental updates, across all series
+CACHE_BARS = 2_000_000
+
+
+def parse_indicator(name):
+    """(kind, window) of an indicator name; raises ValueError for an unknown one"""
+    match = re.fullmatch(r"([A-Za-z]+)(\d*)", str(name).strip())
+    kind = match.group(1).upper() if match else None
+    if kind == 'MACD' and not match.group(2):
+        return kind, None
+    if kind not in DEFAULT_WINDOWS:
+        raise ValueError(f"Unknown indicator: {name}")
+    window = int(match.group(2)) if match.group(2) else DEFAULT_WINDOWS[kind]
+    if window < 1:
+        raise ValueError(f"Indicator window must be positive: {name}")
+    return kind, window
+
+
+def indicator_name(name):
+    """Canonical spelling, e.g. 'rsi' -> 'RSI14'"""
+    kind, window = parse_indicator(name)
+    return kind if window is None else f"{kind}{window}"
+
+
+def parse_indicators(names):
+    """Canonical names from a list or a comma-separated string, without duplicates"""
+    if isinstance(names, str):
+        names = names.split(",")
+    return list(dict.fromkeys(indicator_name(n) for n in names if str(n).strip()))
+
+
+def indicator_columns(name):
+    """Columns an indicator adds"""
+    kind, window = parse_indicator(name)
+    if kind == 'MACD':
+        return ['macd', 'macd_signal', 'macd_hist']
+    if kind == 'BOLL':
+        return [f"boll{window}_mid", f"boll{window}_upper", f"boll{window}_lower"]
+    return [f"{kind.lower()}{window}"]
+
+
+def required_columns(name):
+    kind, _ = parse_indicator(name)
+    return ['close', 'high', 'low'] if kind == 'ATR' else ['close']
+
+
+# Grouped building blocks. Rows are sorted by code and time, ``starts`` holds
+# the first row of each code, and ``states`` one dict per code (None for a
+# code computed from its first bar).
+
+def _sizes(starts, n):
+    return np.diff(np.append(starts, n))
+
+
+def _seeds(states, key):
+    return np.array([np.nan if s is None else s[key] for s in states], dtype=np.float64)
+
+
+def _ewm(values, starts, alpha, seeds):
+    """Per-code exponentially weighted mean without bias adjustment, each continuing from its seed"""
+    extended = np.insert(values, starts, seeds)
+    labels = np.repeat(np.arange(len(starts)), _sizes(starts, len(values)) + 1)
+    out = pd.Series(extended).groupby(labels, sort=False).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    # A NaN seed leads the group, so the average starts at its first bar
+    return np.delete(out, starts + np.arange(len(starts)))
+
+
+def _rolling(values, starts, window, tails):
+    """Per-code rolling mean and population std, each code preceded by its tail of earlier values"""
+    pieces, keep, first = [], [], []
+    length = 0
+    for i, part in enumerate(np.split(values, starts[1:])):
+        tail = tails[i] if tails[i] is not None else values[:0]
+        pieces += [tail, part]
+        keep += [np.zeros(len(tail), dtype=bool), np.ones(len(part), dtype=bool)]
+        first.append(np.full(len(tail) + len(part), length))
+        length += len(tail) + len(part)
+    extended = np.concatenate(pieces)
+    # One pass over all codes; windows reaching back into the previous code are blanked
+    rolling = pd.Series(extended).rolling(window)
+    crosses = np.arange(len(extended)) - window + 1 < np.concatenate(first)
+    mean = np.where(crosses, np.nan, rolling.mean().to_numpy())
+    std = np.where(crosses, np.nan, rolling.std(ddof=0).to_numpy())
+    keep = np.concatenate(keep)
+    return mean[keep], std[keep]
+
+
+def _tails(values, starts, tails, length):
+    """Last ``length`` values of each code, earlier tail included"""
+    if length <= 0:
+        return [values[:0]] * len(starts)
+    out = []
+    for i, part in enumerate(np.split(values, starts[1:])):
+        if len(part) < length and tails[i] is not None:
+            part = np.concatenate([tails[i], part])
+        out.append(part[len(part) - min(length, len(part)):].copy())
+    return out
+
+
+def _previous(values, starts, seeds):
+    """Each code's values shifted by one bar, the first taking its seed"""
+    prev = np.empty_like(values)
+    prev[1:] = values[:-1]
+    prev[starts] = seeds
+    return prev
+
+
+def _count(valid, starts, seeds):
+    """Running count of valid values per code, on top of its seed"""
+    sizes = _sizes(starts, len(valid))
+    total = np.concatenate(([0], np.cumsum(valid)))
+    seeds = np.nan_to_num(seeds)
+    return total[1:] - np.repeat(total[starts], sizes) + np.repeat(seeds, sizes)
+
+
+def _last(values, starts):
+    return values[np.append(starts[1:], len(values)) - 1]
+
+
+def _moving_average(window, bars, starts, states):
+    tails = [s and s['tail'] for s in states]
+    mean, _ = _rolling(bars['close'], starts, window, tails)
+    new_tails = _tails(bars['close'], starts, tails, window - 1)
+    return [mean], [{'tail': t} for t in new_tails]
+
+
+def _bollinger(window, bars, starts, states):
+    tails = [s and s['tail'] for s in states]
+    mean, std = _rolling(bars['close'], starts, window, tails)
+    new_tails = _tails(bars['close'], starts, tails, window - 1)
+    columns = [mean, mean + BOLL_WIDTH * std, mean - BOLL_WIDTH * std]
+    return columns, [{'tail': t} for t in new_tails]
+
+
+def _exponential_average(window, bars, starts, states):
+    ema = _ewm(bars['close'], starts, 2.0 / (window + 1), _seeds(states, 'ema'))
+    return [ema], [{'ema': v} for v in _last(ema, starts)]
+
+
+def _macd(window, bars, starts, states):
+    close = bars['close']
+    fast = _ewm(close, starts, 2.0 / (MACD_FAST + 1), _seeds(states, 'fast'))
+    slow = _ewm(close, starts, 2.0 / (MACD_SLOW + 1), _seeds(states, 'slow'))
+    macd = fast - slow
+    signal = _ewm(macd, starts, 2.0 / (MACD_SIGNAL + 1), _seeds(states, 'signal'))
+    new_states = [{'fast': f, 'slow': s, 'signal': g}
+                  for f, s, g in zip(_last(fast, starts), _last(slow, starts), _last(signal, starts))]
+    return [macd, signal, macd - signal], new_states
+
+
+def _rsi(window, bars, starts, states):
+    """Wilder's RSI: smoothed gains over smoothed gains plus losses"""
+    close = bars['close']
+    change = close - _previous(close, starts, _seeds(states, 'prev'))
+    valid = ~np.isnan(change)
+    gain = np.where(valid, np.maximum(change, 0), np.nan)
+    loss = np.where(valid, np.maximum(-change, 0), np.nan)
+    avg_gain = _ewm(gain, starts, 1.0 / window, _seeds(states, 'gain'))
+    avg_loss = _ewm(loss, starts, 1.0 / window, _seeds(states, 'loss'))
+    count = _count(valid, starts, _seeds(states, 'count'))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsi = 100 * avg_gain / (avg_gain + avg_loss)
+    rsi[count < window] = np.nan
+    new_states = [{'prev': p, 'gain': g, 'loss': l, 'count': c} for p, g, l, c in zip(
+        _last(close, starts), _last(avg_gain, starts), _last(avg_loss, starts), _last(count, starts))]
+    return [rsi], new_states
+
+
+def _atr(window, bars, starts, states):
+    """Wilder's average true range"""
+    high, low = bars['high'], bars['low']
+    prev = _previous(bars['close'], starts, _seeds(states, 'prev'))
+    # fmax skips the missing previous close of a code's first bar
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+    atr = _ewm(true_range, starts, 1.0 / window, _seeds(states, 'atr'))
+    count = _count(~np.isnan(true_range), starts, _seeds(states, 'count'))
+    atr[count < window] = np.nan
+    new_states = [{'prev': p, 'atr': a, 'count': c} for p, a, c in zip(
+        _last(bars['close'], starts), _last(atr, starts), _last(count, starts))]
+    return [atr], new_states
+
+
+INDICATOR_FUNCTIONS = {
+    'MA': _moving_average,
+    'EMA': _exponential_average,
+    'MACD': _macd,
+    'RSI': _rsi,
+    'ATR': _atr,
+    'BOLL': _bollinger,
+}
+
+
+class _Series:
+    """Indicator columns of one code's series and the state at its last bar"""
+
+    __slots__ = ('times', 'first_close', 'last_close', 'columns', 'state')
+
+    def __init__(self, times, close, columns, state):
+        self.times = times
+        self.first_close = close[0]
+        self.last_close = close[-1]
+        self.columns = columns
+        self.state = state
+
+    def extends(self, times, close):
+        """Whether a series is this one with bars appended (and prices not rescaled)"""
+        n = len(self.times)
+        if len(times) < n or not np.array_equal(times[:n], self.times):
+            return False
+        # Forward adjustment rescales the whole history at every ex-dividend date
+        return close[0] == self.first_close and close[n - 1] == self.last_close
+
+
+def _bar_times(df):
+    if 'time' in df.columns:
+        return df['time'].to_numpy('datetime64[ns]').astype(np.int64)
+    return df['date'].to_numpy('datetime64[ns]').astype(np.int64)
+
+
+class IndicatorEngine:
+    """Adds indicator columns to K-line frames, extending cached series instead of recomputing them"""
+
+    def __init__(self, cache_bars=CACHE_BARS):
+        self.cache_bars = cache_bars
+        self.bars = 0
+        self.computed = 0
+        self.extended = 0
+        self.reused = 0
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def apply(self, df, names, series=None):
+        """Copy of K-line bars with the indicator columns appended
+
+        ``df`` may stack several codes. ``series`` (e.g. frequency and adjust
+        flag) keeps cached states of different series of one code apart.
+        Raises ValueError for an unknown indicator or missing price columns.
+        """
+        names = parse_indicators(names)
+        for name in names:
+            missing = [c for c in required_columns(name) if c not in df.columns]
+            if missing:
+                raise ValueError(f"{name} needs the {', '.join(missing)} column(s)")
+        out = df.copy(deep=False)
+        if not names or df.empty:
+            for name in names:
+                for column in indicator_columns(name):
+                    out[column] = np.full(len(df), np.nan)
+            return out
+
+        codes = df['code'].astype(str).to_numpy() if 'code' in df.columns else np.full(len(df), "")
+        code_ids, code_names = pd.factorize(codes)
+        times = _bar_times(df)
+        order = np.lexsort((times, code_ids))
+        sorted_ids = code_ids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+        groups = np.split(order, starts[1:])
+        bars = {c: df[c].to_numpy(np.float64) for c in ('close', 'high', 'low') if c in df.columns}
+
+        group_codes = code_names[sorted_ids[starts]]
+        for name in names:
+            values = self._compute(name, groups, group_codes, times, bars, series)
+            for column, values in zip(indicator_columns(name), values):
+                full = np.empty(len(df))
+                full[order] = values
+                out[column] = full
+        return out
+
+    def _compute(self, name, groups, codes, times, bars, series):
+        """Indicator columns over all groups, in sorted row order"""
+        kind, window = parse_indicator(name)
+        cached, done = [], []
+        for code, rows in zip(codes, groups):
+            with self._lock:
+                entry = self._series.get((code, series, name))
+                if entry is not None:
+                    self._series.move_to_end((code, series, name))
+            if entry is not None and entry.extends(times[rows], bars['close'][rows]):
+                cached.append(entry)
+                done.append(len(entry.times))
+            else:
+                cached.append(None)
+                done.append(0)
+
+        # Only bars after each cached series are computed, all codes in one pass
+        todo = [i for i, rows in enumerate(groups) if len(rows) > done[i]]
+        new_columns, new_states = [], []
+        if todo:
+            rows = np.concatenate([groups[i][done[i]:] for i in todo])
+            sizes = [len(groups[i]) - done[i] for i in todo]
+            starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+            new_columns, new_states = INDICATOR_FUNCTIONS[kind](
+                window, {c: v[rows] for c, v in bars.items()}, starts,
+                [cached[i] and cached[i].state for i in todo])
+            new_columns = [np.split(c, starts[1:]) for c in new_columns]
+
+        columns = [[] for _ in indicator_columns(name)]
+        position = {i: j for j, i in enumerate(todo)}
+        for i, rows in enumerate(groups):
+            entry = cached[i]
+            j = position.get(i)
+            if j is None:
+                self.reused += 1
+                parts = entry.columns
+            else:
+                parts = [c[j] for c in new_columns]
+                if entry is not None:
+                    self.extended += 1
+                    parts = [np.concatenate([old, new]) for old, new in zip(entry.columns, parts)]
+                else:
+                    self.computed += 1
+                self._keep((codes[i], series, name),
+                           _Series(times[rows], bars['close'][rows], parts, new_states[j]))
+            for column, part in zip(columns, parts):
+                column.append(part)
+        return [np.concatenate(c) for c in columns]
+
+    def _keep(self, key, entry):
+        with self._lock:
+            old = self._series.pop(key, None)
+            if old is not None:
+                self.bars -= len(old.times)
+            self._series[key] = entry
+            self.bars += len(entry.times)
+            while self.bars > self.cache_bars and len(self._series) > 1:
+                _, evicted = self._series.popitem(last=False)
+                self.bars -= len(evicted.times)
+
+    def stats(self):
+        with self._lock:
+            return {'series': len(self._series), 'bars': self.bars, 'computed': self.computed,
+                    'extended': self.extended, 'reused': self.reused}
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_indicator_engine():
+    """Return the process-wide indicator engine"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = IndicatorEngine()
+        return _engine
@@ -0,0 +1,205 @@
+"""Split long K-line ranges into trading-day chunks fetched in parallel"""
+import threading
+import time
+from concurrent.futures import as_completed
+
+import baostock as bs
+import pandas as pd
+
+from bs_session import get_session
+from kline_store import MINUTE_FREQUENCIES, normalize_bars
+from perf_metrics import get_metrics, timed
+from result_decoder import decode_result
+from trade_calendar import get_trade_calendar, to_date
+from worker_pool import get_worker_pool
+
+# Approximate bars per trading day for each frequency
+BARS_PER_DAY = {'5': 48, '15': 16, '30': 8, '60': 4, 'd': 1, 'w': 0.2, 'm': 0.05}
+
+# Aim for chunks that take about this long to download
+TARGET_CHUNK_SECONDS = 3.0
+
+# Starting chunk size before any latency has been observed (one BaoStock page)
+INITIAL_CHUNK_ROWS = 10000
+MIN_CHUNK_ROWS = 2000
+MAX_CHUNK_ROWS = 100000
+
+# Extra attempts for a chunk after the worker's own retries gave up
+CHUNK_RETRIES = 2
+
+# Weight of the newest sample in the latency average
+EWMA_ALPHA = 0.3
+
+
+class ChunkPlanner:
+    """Chooses chunk sizes from the frequency and the latency seen so far"""
+
+    def __init__(self):
+        self._seconds_per_row = {}
+        self._lock = threading.Lock()
+
+    def observe(self, frequency, rows, seconds):
+        if rows <= 0:
+            return
+        sample = seconds / rows
+        with self._lock:
+            previous = self._seconds_per_row.get(frequency)
+            if previous is None:
+                self._seconds_per_row[frequency] = sample
+            else:
+                self._seconds_per_row[frequency] = EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * previous
+
+    def chunk_rows(self, frequency):
+        with self._lock:
+            seconds_per_row = self._seconds_per_row.get(frequency)
+        if not seconds_per_row:
+            return INITIAL_CHUNK_ROWS
+        rows = int(TARGET_CHUNK_SECONDS / seconds_per_row)
+        return max(MIN_CHUNK_ROWS, min(MAX_CHUNK_ROWS, rows))
+
+    def chunk_days(self, frequency):
+        return max(1, int(self.chunk_rows(frequency) / BARS_PER_DAY.get(frequency, 1)))
+
+
+def split_trading_days(days, chunk_days):
+    """Consecutive (first_day, last_day) slices of a sorted trading-day array"""
+    return [
+        (to_date(days[i]), to_date(days[min(i + chunk_days, len(days)) - 1]))
+        for i in range(0, len(days), chunk_days)
+    ]
+
+
+class ChunkProgress:
+    """Counts reported to the progress callback"""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.rows = 0
+        self.retries = 0
+
+
+class ChunkedFetcher:
+    """Fetches one code's bars as trading-day-aligned chunks over the worker pool"""
+
+    def __init__(self, pool=None, session=None, calendar=None, planner=None):
+        self.pool = pool
+        self.session = session or get_session()
+        self.calendar = calendar or get_trade_calendar()
+        self.planner = planner or get_chunk_planner()
+
+    def plan(self, start_date, end_date, frequency="d"):
+        """Chunks for a range; returns (list of (start, end) dates, error_msg)"""
+        days, error_msg = self.calendar.trading_days(to_date(start_date), to_date(end_date))
+        if error_msg is not None:
+            return None, error_msg
+        return split_trading_days(days, self.planner.chunk_days(frequency)), None
+
+    def fetch(self, code, start_date, end_date, frequency="d", adjustflag="3", fields=None,
+              progress=None, on_chunk=None):
+        """Bars for the range reassembled in order; returns (DataFrame, error_msg)
+
+        ``on_chunk(start, end, df)`` is called as each chunk arrives, so callers
+        can keep finished chunks even if a later one fails for good.
+        """
+        chunks, error_msg = self.plan(start_date, end_date, frequency)
+        if error_msg is not None:
+            return None, error_msg
+        if not chunks:
+            return pd.DataFrame(), None
+        stats = ChunkProgress(len(chunks))
+
+        # A single chunk is not worth a trip through the process pool
+        if len(chunks) == 1:
+            start = time.perf_counter()
+            with timed('server', 'query_history_k_data_plus') as span:
+                rs = self.session.query(
+                    bs.query_history_k_data_plus, code, fields,
+                    start_date=chunks[0][0].isoformat(), end_date=chunks[0][1].isoformat(),
+                    frequency=frequency, adjustflag=str(adjustflag)
+                )
+                span.set(error=rs.error_code != '0')
+            if rs.error_code != '0':
+                return None, rs.error_msg
+            with timed('decode', 'query_history_k_data_plus') as span:
+                df = decode_result(rs)
+                span.set(rows=len(df))
+            self.planner.observe(frequency, len(df), time.perf_counter() - start)
+            if on_chunk:
+                on_chunk(chunks[0][0], chunks[0][1], df)
+            stats.done, stats.rows = 1, len(df)
+            if progress:
+                progress(stats)
+            return df, None
+
+        pool = self.pool or get_worker_pool()
+        attempts = {}
+        results = {}
+        futures = {}
+
+        def submit(chunk):
+            future = pool.submit_timed(
+                'query_history_k_data_plus', code, fields,
+                start_date=chunk[0].isoformat(), end_date=chunk[1].isoformat(),
+                frequency=frequency, adjustflag=str(adjustflag)
+            )
+            futures[future] = chunk
+
+        for chunk in chunks:
+            submit(chunk)
+
+        try:
+            while futures:
+                future = next(as_completed(list(futures)))
+                chunk = futures.pop(future)
+                try:
+                    df, error_msg, seconds = future.result()
+                except Exception as e:
+                    df, error_msg, seconds = None, str(e), 0.0
+                get_metrics().record('server', seconds, 'query_history_k_data_plus',
+                                     rows=len(df) if df is not None else None, error=error_msg is not None)
+                if error_msg is not None:
+                    attempts[chunk] = attempts.get(chunk, 0) + 1
+                    if attempts[chunk] > CHUNK_RETRIES:
+                        for pending in futures:
+                            pending.cancel()
+                        return None, f"Chunk {chunk[0]} → {chunk[1]} failed: {error_msg}"
+                    # Only the failed chunk is fetched again
+                    stats.retries += 1
+                    submit(chunk)
+                    continue
+                self.planner.observe(frequency, len(df), seconds)
+                if on_chunk:
+                    on_chunk(chunk[0], chunk[1], df)
+                results[chunk] = df
+                stats.done += 1
+                stats.rows += len(df)
+                if progress:
+                    progress(stats)
+        except BaseException:
+            # A callback gave up (e.g. the job was cancelled): do not leave chunks queued
+            for pending in futures:
+                pending.cancel()
+            raise
+
+        frames = [results[chunk] for chunk in chunks if not results[chunk].empty]
+        if not frames:
+            return pd.DataFrame(), None
+        df = pd.concat(frames, ignore_index=True)
+        key = [c for c in (['date', 'time'] if frequency in MINUTE_FREQUENCIES else ['date']) if c in df.columns]
+        if key:
+            df = df.drop_duplicates(subset=key, keep='last')
+        return normalize_bars(df.reset_index(drop=True)), None
+
+
+_planner = None
+_planner_lock = threading.Lock()
+
+
+def get_chunk_planner():
+    """Return the process-wide chunk planner, so latency learned in one query sizes the next"""
+    global _planner
+    with _planner_lock:
+        if _planner is None:
+            _planner = ChunkPlanner()
+        return _planner
@@ -0,0 +1,144 @@
+"""Coarser K-line frequencies built from finer stored bars
+
+15/30/60-minute bars are aggregated from 5-minute bars within each trading
+session, weekly and monthly bars from daily bars, so a code whose fine bars
+are already stored needs no further download for the coarse ones. BaoStock
+stamps a minute bar with the time it closes: the morning session runs from
+09:30 to 11:30 and the afternoon one from 13:00 to 15:00, so a 60-minute day
+has bars at 10:30, 11:30, 14:00 and 15:00.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Frequency each coarser frequency is built from
+RESAMPLE_SOURCES = {"15": "5", "30": "5", "60": "5", "w": "d", "m": "d"}
+
+# Session opening times and the close of the morning session, in minutes after midnight
+MORNING_OPEN = 9 * 60 + 30
+MORNING_CLOSE = 11 * 60 + 30
+AFTERNOON_OPEN = 13 * 60
+
+MINUTE = np.timedelta64(1, 'm')
+
+
+def period_start(day, frequency):
+    """First calendar day of the week (Monday) or month containing ``day``"""
+    if frequency == "w":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def period_end(day, frequency):
+    """Last calendar day of the week (Sunday) or month containing ``day``"""
+    if frequency == "w":
+        return day + timedelta(days=6 - day.weekday())
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def _period_keys(days, frequency):
+    """Integer week or month number of datetime64 days; weeks start on Monday"""
+    days = days.astype('datetime64[D]')
+    if frequency == "w":
+        # 1970-01-01 was a Thursday
+        return (days.astype(np.int64) + 3) // 7
+    return days.astype('datetime64[M]').astype(np.int64)
+
+
+def _group_starts(*keys):
+    """Row index where each run of equal keys begins; rows are sorted by the keys"""
+    change = np.zeros(len(keys[0]), dtype=bool)
+    change[0] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(change)
+
+
+def _sum(values, starts):
+    if values.dtype.kind == 'f':
+        values = np.nan_to_num(values)
+    return np.add.reduceat(values, starts)
+
+
+def _aggregate(df, starts):
+    """OHLC, volume and amount of each group of rows"""
+    ends = np.append(starts[1:], len(df)) - 1
+    out = {}
+    if 'code' in df.columns:
+        out['code'] = df['code'].to_numpy()[starts]
+    out['open'] = df['open'].to_numpy(np.float64)[starts]
+    # fmax/fmin skip NaN prices
+    out['high'] = np.fmax.reduceat(df['high'].to_numpy(np.float64), starts)
+    out['low'] = np.fmin.reduceat(df['low'].to_numpy(np.float64), starts)
+    out['close'] = df['close'].to_numpy(np.float64)[ends]
+    for column in ('volume', 'amount'):
+        if column in df.columns:
+            out[column] = _sum(df[column].to_numpy(), starts)
+    if 'adjustflag' in df.columns:
+        out['adjustflag'] = df['adjustflag'].iloc[starts].to_numpy()
+    return out, ends
+
+
+def resample_minutes(df, frequency):
+    """15/30/60-minute bars from the 5-minute bars of one or more codes, sorted by code and time"""
+    if df.empty:
+        return df.iloc[:0]
+    step = int(frequency)
+    stamps = df['time'].to_numpy('datetime64[ns]')
+    days = stamps.astype('datetime64[D]')
+    minutes = (stamps - days) // MINUTE
+    opens = np.where(minutes <= MORNING_CLOSE, MORNING_OPEN, AFTERNOON_OPEN)
+    # A bar closing at 09:35 belongs to the bucket closing at 09:45, 10:00 or 10:30
+    closes = opens - (opens - minutes) // step * step
+    bar_times = days.astype('datetime64[ns]') + closes * MINUTE
+    keys = [bar_times]
+    if 'code' in df.columns:
+        keys.insert(0, df['code'].to_numpy())
+    starts = _group_starts(*keys)
+    out, _ = _aggregate(df, starts)
+    result = pd.DataFrame(out)
+    result.insert(0, 'date', days[starts].astype('datetime64[ns]'))
+    result.insert(1, 'time', bar_times[starts])
+    return result
+
+
+def resample_periods(df, frequency, trading_days, through):
+    """Weekly or monthly bars from the daily bars of one or more codes
+
+    A bar is dated with the last trading day of its period according to
+    ``trading_days`` (datetime64[D], from query_trade_dates). Periods that
+    end after ``through``, the last day the daily bars are final for, are
+    still in progress and left out. Suspended days do not count.
+    """
+    if 'tradestatus' in df.columns:
+        df = df[df['tradestatus'].astype(str) == '1']
+    if df.empty:
+        return df.iloc[:0]
+    period_keys = _period_keys(df['date'].to_numpy('datetime64[ns]'), frequency)
+    keys = [period_keys]
+    if 'code' in df.columns:
+        keys.insert(0, df['code'].to_numpy())
+    starts = _group_starts(*keys)
+    out, ends = _aggregate(df, starts)
+
+    group_keys = period_keys[starts]
+    calendar_keys = _period_keys(trading_days, frequency)
+    last = np.searchsorted(calendar_keys, group_keys, side='right') - 1
+    in_calendar = (last >= 0) & (calendar_keys[np.maximum(last, 0)] == group_keys)
+    bar_dates = np.where(in_calendar, trading_days[np.maximum(last, 0)],
+                         df['date'].to_numpy('datetime64[D]')[ends])
+    if 'turn' in df.columns:
+        out['turn'] = _sum(df['turn'].to_numpy(np.float64), starts)
+    if 'preclose' in df.columns:
+        out['pctChg'] = (out['close'] / df['preclose'].to_numpy(np.float64)[starts] - 1) * 100
+    result = pd.DataFrame(out)
+    result.insert(0, 'date', bar_dates.astype('datetime64[ns]'))
+    return result[bar_dates <= np.datetime64(through, 'D')].reset_index(drop=True)
+
+
+def resample_bars(df, frequency, trading_days=None, through=None):
+    """Bars at ``frequency`` from bars at RESAMPLE_SOURCES[frequency]"""
+    if frequency in ("w", "m"):
+        return resample_periods(df, frequency, trading_days, through or date.max)
+    return resample_minutes(df, frequency)
@@ -0,0 +1,374 @@
+"""Incremental local K-line store that only asks BaoStock for missing date ranges"""
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import baostock as bs
+import pandas as pd
+
+from api_registry import MINUTE_FREQUENCIES, PERIOD_DEFAULT_FIELDS
+from bs_session import get_session
+from kline_resample import RESAMPLE_SOURCES, period_end, period_start, resample_bars
+from price_adjust import UNADJUSTED, adjust_bars, get_price_adjuster
+from result_decoder import FIELD_DTYPES, decode_result
+from trade_calendar import get_trade_calendar, to_date
+
+STORE_DIR = os.path.join("cache", "kline")
+COVERAGE_FILE = "coverage.json"
+
+# Every bar is stored with the full field set for its frequency
+DAILY_FIELDS = "date,code,open,high,low,close,preclose,volume,amount,adjustflag,turn,tradestatus,pctChg,peTTM,pbMRQ,psTTM,pcfNcfTTM,isST"
+# Weekly and monthly requests default to every field these K-lines have
+PERIOD_FIELDS = PERIOD_DEFAULT_FIELDS
+MINUTE_FIELDS = "date,time,code,open,high,low,close,volume,amount,adjustflag"
+
+# Daily and minute bars are stored unadjusted only and adjusted locally on the way out
+LOCAL_ADJUST_FREQUENCIES = ("d",) + MINUTE_FREQUENCIES
+
+# Weekly and monthly bars are downloaded per adjust flag. Forward-adjusted
+# history is rescaled at every ex-dividend date, so it cannot be extended
+# incrementally; only unadjusted and back-adjusted bars are stored
+STORE_ADJUSTFLAGS = ("3", "1")
+
+# BaoStock finishes loading daily bars at 17:30 and minute bars at 20:30
+DAILY_READY = (17, 30)
+MINUTE_READY = (20, 30)
+
+
+def store_fields(frequency):
+    if frequency in MINUTE_FREQUENCIES:
+        return MINUTE_FIELDS.split(",")
+    if frequency == "d":
+        return DAILY_FIELDS.split(",")
+    return PERIOD_FIELDS.split(",")
+
+
+def series_flag(frequency, adjustflag):
+    """Adjust flag of the stored series a request is served from, and downloaded with"""
+    return UNADJUSTED if frequency in LOCAL_ADJUST_FREQUENCIES else str(adjustflag)
+
+
+def _bar_key(frequency):
+    return ["date", "time"] if frequency in MINUTE_FREQUENCIES else ["date"]
+
+
+def complete_through(frequency, now=None):
+    """Last date whose bars can no longer change"""
+    now = now or datetime.now()
+    ready = MINUTE_READY if frequency in MINUTE_FREQUENCIES else DAILY_READY
+    last = now.date() if (now.hour, now.minute) >= ready else now.date() - timedelta(days=1)
+    if frequency == "w":
+        # Weekly bars are final once the week is over
+        last = min(last, now.date() - timedelta(days=now.date().weekday() + 1))
+    elif frequency == "m":
+        last = min(last, now.date().replace(day=1) - timedelta(days=1))
+    return last
+
+
+def merge_ranges(ranges):
+    """Merge overlapping or adjacent [start, end] date ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(s, e) for s, e in merged]
+
+
+def subtract_ranges(start, end, ranges):
+    """Parts of [start, end] not covered by ranges"""
+    gaps = []
+    cursor = start
+    for r_start, r_end in merge_ranges(ranges):
+        if r_end < cursor:
+            continue
+        if r_start > end:
+            break
+        if r_start > cursor:
+            gaps.append((cursor, min(end, r_start - timedelta(days=1))))
+        cursor = max(cursor, r_end + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def normalize_bars(df):
+    """Restore categorical flags after concatenation and sort by time"""
+    for col in df.columns:
+        if FIELD_DTYPES.get(col) == 'category' and df[col].dtype != 'category':
+            df[col] = df[col].astype('category')
+    return df
+
+
+class KLineStore:
+    """Per code / frequency / adjustflag bar store with recorded date coverage
+
+    Daily, weekly and monthly bars live in one Parquet file per series;
+    minute bars are partitioned by month so appends only rewrite the months
+    they touch.
+    """
+
+    def __init__(self, session=None, calendar=None, root=STORE_DIR, adjuster=None):
+        self.session = session or get_session()
+        self.calendar = calendar or get_trade_calendar()
+        self.adjuster = adjuster or get_price_adjuster()
+        self.root = root
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def supports(self, frequency, adjustflag, fields=None):
+        """Whether the store can serve this request"""
+        if frequency not in LOCAL_ADJUST_FREQUENCIES and str(adjustflag) not in STORE_ADJUSTFLAGS:
+            return False
+        if fields is None:
+            return True
+        return set(split_fields(fields)) <= set(store_fields(frequency))
+
+    def _series_dir(self, code, frequency, adjustflag):
+        return os.path.join(self.root, code, f"{frequency}_{series_flag(frequency, adjustflag)}")
+
+    def _lock(self, code, frequency, adjustflag):
+        with self._locks_guard:
+            return self._locks.setdefault((code, frequency, series_flag(frequency, adjustflag)), threading.Lock())
+
+    def _load_coverage(self, series_dir):
+        try:
+            with open(os.path.join(series_dir, COVERAGE_FILE), encoding='utf-8') as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return [(date.fromisoformat(s), date.fromisoformat(e)) for s, e in raw.get('ranges', [])]
+
+    def _save_coverage(self, series_dir, ranges):
+        path = os.path.join(series_dir, COVERAGE_FILE)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({'ranges': [[s.isoformat(), e.isoformat()] for s, e in merge_ranges(ranges)]}, f)
+        os.replace(path + ".tmp", path)
+
+    def coverage(self, code, frequency="d", adjustflag="3"):
+        """Date ranges already held locally"""
+        return merge_ranges(self._load_coverage(self._series_dir(code, frequency, adjustflag)))
+
+    def missing_ranges(self, code, start_date, end_date, frequency="d", adjustflag="3"):
+        """Gaps that still have to be fetched; returns (list of (start, end) dates, error_msg)
+
+        Gaps without any trading day are dropped and the rest are trimmed to
+        their first and last trading day.
+        """
+        start, end = to_date(start_date), to_date(end_date)
+        gaps = subtract_ranges(start, end, self.coverage(code, frequency, adjustflag))
+        missing = []
+        for gap_start, gap_end in gaps:
+            days, error_msg = self.calendar.trading_days(gap_start, gap_end)
+            if error_msg is not None:
+                return None, error_msg
+            if len(days):
+                missing.append((to_date(days[0]), to_date(days[-1])))
+        return missing, None
+
+    def get_bars(self, code, start_date, end_date, frequency="d", adjustflag="3", fields=None,
+                 fetcher=None, progress=None):
+        """Bars for [start_date, end_date], fetching only the gaps; returns (DataFrame, error_msg)
+
+        With a ChunkedFetcher, large gaps are downloaded as parallel chunks and
+        every finished chunk is stored at once, so a failure keeps the rest.
+        """
+        adjustflag = str(adjustflag)
+        start, end = to_date(start_date), to_date(end_date)
+        if adjustflag != series_flag(frequency, adjustflag):
+            _, error_msg = self.adjuster.factors(code)
+            if error_msg is not None:
+                return None, f"Adjustment factors: {error_msg}"
+        with self._lock(code, frequency, adjustflag):
+            missing, error_msg = self.missing_ranges(code, start, end, frequency, adjustflag)
+            if error_msg is not None:
+                return None, error_msg
+            for gap_start, gap_end in missing:
+                if fetcher is not None:
+                    def store_chunk(chunk_start, chunk_end, df):
+                        self._ingest_locked(code, frequency, adjustflag, df, chunk_start, chunk_end)
+                    _, error_msg = fetcher.fetch(
+                        code, gap_start, gap_end, frequency, series_flag(frequency, adjustflag),
+                        ",".join(store_fields(frequency)), progress=progress, on_chunk=store_chunk
+                    )
+                    if error_msg is not None:
+                        return None, error_msg
+                    continue
+                df, error_msg = self.fetch_range(code, gap_start, gap_end, frequency, adjustflag)
+                if error_msg is not None:
+                    return None, error_msg
+                self._ingest_locked(code, frequency, adjustflag, df, gap_start, gap_end)
+            # Nothing to fetch for calendar-only gaps, but record them as covered
+            self._mark_covered(code, frequency, adjustflag, start, min(end, complete_through(frequency)))
+        return self.read(code, start, end, frequency, adjustflag, fields), None
+
+    def resample_source(self, code, start_date, end_date, frequency="d", adjustflag="3", fields=None):
+        """Finer frequency whose stored bars fully cover the request, or None
+
+        Only bars that are already final count: a request reaching into days
+        not yet complete is left to the server.
+        """
+        source = RESAMPLE_SOURCES.get(frequency)
+        if source is None or (fields is not None and not set(split_fields(fields)) <= set(store_fields(frequency))):
+            return None
+        start, end = self._source_range(frequency, to_date(start_date), to_date(end_date))
+        if end > complete_through(source):
+            return None
+        missing, error_msg = self.missing_ranges(code, start, end, source, adjustflag)
+        if error_msg is not None or missing:
+            return None
+        return source
+
+    def _source_range(self, frequency, start, end):
+        # A weekly or monthly bar aggregates its whole period, whatever part of it was asked for
+        if frequency in ("w", "m"):
+            start = period_start(start, frequency)
+            end = min(period_end(end, frequency), complete_through(RESAMPLE_SOURCES[frequency]))
+        return start, end
+
+    def resample(self, code, start_date, end_date, frequency="d", adjustflag="3", fields=None):
+        """Bars at ``frequency`` aggregated from the stored finer bars; returns (DataFrame, error_msg)
+
+        Check resample_source first: gaps in the finer bars are not fetched here.
+        """
+        adjustflag = str(adjustflag)
+        start, end = to_date(start_date), to_date(end_date)
+        source = RESAMPLE_SOURCES[frequency]
+        source_start, source_end = self._source_range(frequency, start, end)
+        trading_days = None
+        if frequency in ("w", "m"):
+            trading_days, error_msg = self.calendar.trading_days(source_start, period_end(end, frequency))
+            if error_msg is not None:
+                return None, error_msg
+        if adjustflag != series_flag(source, adjustflag):
+            _, error_msg = self.adjuster.factors(code)
+            if error_msg is not None:
+                return None, f"Adjustment factors: {error_msg}"
+        bars = self.read(code, source_start, source_end, source, adjustflag)
+        df = resample_bars(bars, frequency, trading_days, source_end)
+        if not df.empty:
+            df = df[(df['date'] >= pd.Timestamp(start)) & (df['date'] <= pd.Timestamp(end))]
+        df = normalize_bars(df.reset_index(drop=True))
+        columns = split_fields(fields) if fields else store_fields(frequency)
+        return df.reindex(columns=columns), None
+
+    def fetch_range(self, code, start_date, end_date, frequency="d", adjustflag="3"):
+        """Download bars for one range with the full stored field set, as stored (see series_flag)"""
+        rs = self.session.query(
+            bs.query_history_k_data_plus,
+            code, ",".join(store_fields(frequency)),
+            start_date=to_date(start_date).isoformat(),
+            end_date=to_date(end_date).isoformat(),
+            frequency=frequency,
+            adjustflag=series_flag(frequency, adjustflag)
+        )
+        if rs.error_code != '0':
+            return None, rs.error_msg
+        return decode_result(rs), None
+
+    def ingest(self, code, frequency, adjustflag, df, start_date, end_date):
+        """Merge downloaded bars for [start_date, end_date] into the store
+
+        ``df`` must have been downloaded with ``series_flag(frequency, adjustflag)``.
+        """
+        adjustflag = str(adjustflag)
+        with self._lock(code, frequency, adjustflag):
+            self._ingest_locked(code, frequency, adjustflag, df, to_date(start_date), to_date(end_date))
+
+    def _ingest_locked(self, code, frequency, adjustflag, df, start, end):
+        series_dir = self._series_dir(code, frequency, adjustflag)
+        os.makedirs(series_dir, exist_ok=True)
+        if df is not None and not df.empty:
+            if frequency in MINUTE_FREQUENCIES:
+                months = df['date'].dt.strftime('%Y-%m')
+                for month, part in df.groupby(months, sort=False):
+                    self._merge_file(os.path.join(series_dir, f"{month}.parquet"), part, frequency)
+            else:
+                self._merge_file(os.path.join(series_dir, "bars.parquet"), df, frequency)
+        self._mark_covered_locked(series_dir, start, min(end, complete_through(frequency)))
+
+    def _mark_covered(self, code, frequency, adjustflag, start, end):
+        self._mark_covered_locked(self._series_dir(code, frequency, adjustflag), start, end)
+
+    def _mark_covered_locked(self, series_dir, start, end):
+        # Bars after complete_through() may still change, so they are never marked as held
+        if end < start:
+            return
+        os.makedirs(series_dir, exist_ok=True)
+        ranges = self._load_coverage(series_dir)
+        ranges.append((start, end))
+        self._save_coverage(series_dir, ranges)
+
+    def _merge_file(self, path, new_bars, frequency):
+        if os.path.exists(path):
+            merged = pd.concat([pd.read_parquet(path), new_bars], ignore_index=True)
+        else:
+            merged = new_bars.copy()
+        key = _bar_key(frequency)
+        merged = merged.drop_duplicates(subset=key, keep='last').sort_values(key)
+        merged = normalize_bars(merged.reset_index(drop=True))
+        merged.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+    def _partition_files(self, series_dir, frequency, start, end):
+        if frequency not in MINUTE_FREQUENCIES:
+            return [os.path.join(series_dir, "bars.parquet")]
+        files = []
+        month = start.replace(day=1)
+        while month <= end:
+            files.append(os.path.join(series_dir, f"{month:%Y-%m}.parquet"))
+            month = (month + timedelta(days=32)).replace(day=1)
+        return files
+
+    def read(self, code, start_date, end_date, frequency="d", adjustflag="3", fields=None):
+        """Stored bars for [start_date, end_date]
+
+        Bars stored unadjusted are adjusted with the code's factor table, which
+        the price adjuster fetches at most once a day (get_bars and the bulk
+        downloader load it beforehand).
+        """
+        start, end = to_date(start_date), to_date(end_date)
+        adjustflag = str(adjustflag)
+        series_dir = self._series_dir(code, frequency, adjustflag)
+        date_filter = [('date', '>=', pd.Timestamp(start)), ('date', '<=', pd.Timestamp(end))]
+        columns = split_fields(fields) if fields else None
+        read_columns = None
+        if columns is not None:
+            read_columns = list(dict.fromkeys(columns + ['date']))
+        parts = [
+            pd.read_parquet(path, columns=read_columns, filters=date_filter)
+            for path in self._partition_files(series_dir, frequency, start, end)
+            if os.path.exists(path)
+        ]
+        if not parts:
+            return pd.DataFrame(columns=columns or store_fields(frequency))
+        df = normalize_bars(pd.concat(parts, ignore_index=True))
+        if adjustflag != series_flag(frequency, adjustflag):
+            factors, error_msg = self.adjuster.factors(code)
+            if error_msg is not None:
+                raise RuntimeError(f"Adjustment factors for {code}: {error_msg}")
+            df = adjust_bars(df, factors, adjustflag)
+        return df[columns] if columns is not None else df
+
+
+def split_fields(fields):
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    return [f.strip() for f in fields if f.strip()]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_kline_store():
+    """Return the process-wide K-line store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = KLineStore()
+        return _store
@@ -0,0 +1,222 @@
+"""SQL over every locally stored dataset, run in-process by DuckDB
+
+Queries see a catalog of views over the files on disk: K-line store
+series, the cross-section day files, index membership intervals, one table
+per cached BaoStock API (financial statements, macro series, adjust factors
+and so on) and the memory-mapped stock universe. DuckDB scans the Parquet
+files itself, reading only the columns a query uses and skipping row groups
+its filters rule out, so nothing is loaded into pandas except the result.
+"""
+import glob
+import os
+import threading
+
+import duckdb
+import pandas as pd
+
+from api_registry import MINUTE_FREQUENCIES
+from cross_section import CROSS_SECTION_DIR
+from index_membership import INDEX_APIS, INTERVALS_FILE, MEMBERSHIP_DIR
+from kline_store import STORE_ADJUSTFLAGS, STORE_DIR
+from price_adjust import UNADJUSTED
+from query_cache import get_query_cache
+from stock_universe import UNIVERSE_FILE, read_universe_table, universe_data_file
+
+# Rows of a result brought into pandas; the rest stay in DuckDB
+MAX_RESULT_ROWS = 1_000_000
+
+EXAMPLE_QUERY = """SELECT code, count(*) AS days, avg(pctChg) AS avg_pct_chg, sum(amount) AS amount
+FROM kline_d
+WHERE date >= DATE '2024-01-01' AND tradestatus = '1'
+GROUP BY code
+ORDER BY amount DESC
+LIMIT 50"""
+
+# Table name suffix of the stored adjust flags; daily and minute bars are stored unadjusted only
+FLAG_SUFFIXES = {UNADJUSTED: "", "1": "_back"}
+
+# Queries share one catalog, so only reads are run: SELECT, WITH, FROM, VALUES,
+# DESCRIBE, SUMMARIZE and SHOW all parse as SELECT statements
+READ_STATEMENT = duckdb.StatementType.SELECT
+
+
+def _literal(text):
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+def _parquet(paths, union=False):
+    """read_parquet over a glob or a list of files
+
+    The stores write every file with the same columns. Cached API results
+    may differ from one call to the next, so ``union`` matches their columns
+    by name and reads missing ones as NULL, at the cost of reading every
+    file's schema when the view is bound.
+    """
+    if isinstance(paths, str):
+        source = _literal(paths)
+    else:
+        source = "[" + ", ".join(_literal(p) for p in paths) + "]"
+    return f"read_parquet({source}, union_by_name = true)" if union else f"read_parquet({source})"
+
+
+def _exists(pattern):
+    return next(glob.iglob(pattern), None) is not None
+
+
+def _series_kinds(root):
+    """Names of the series directories ('d_3', '5_3', 'w_1', ...) under any code in the K-line store"""
+    kinds = set()
+    try:
+        codes = [entry.path for entry in os.scandir(root) if entry.is_dir()]
+    except OSError:
+        return kinds
+    for code_dir in codes:
+        try:
+            kinds.update(entry.name for entry in os.scandir(code_dir) if entry.is_dir())
+        except OSError:
+            pass
+    return kinds
+
+
+def api_table(api_name):
+    """Table name of a cached API: query_profit_data -> profit_data"""
+    return api_name[len("query_"):] if api_name.startswith("query_") else api_name
+
+
+class LocalSQL:
+    """Catalog of the local stores as DuckDB views, kept in step with the files on disk"""
+
+    def __init__(self, kline_root=STORE_DIR, cross_section_root=CROSS_SECTION_DIR,
+                 membership_root=MEMBERSHIP_DIR, query_cache=None, universe_file=UNIVERSE_FILE):
+        self.kline_root = kline_root
+        self.cross_section_root = cross_section_root
+        self.membership_root = membership_root
+        self.query_cache = query_cache or get_query_cache()
+        self.universe_file = universe_file
+        self._db = duckdb.connect()
+        # Parquet footers are kept between queries, for every cursor, and re-read only when a file changes
+        self._db.execute("SET GLOBAL parquet_metadata_cache = true")
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def sources(self):
+        """{table: (SQL source, description)} for the datasets present on disk"""
+        sources = {}
+        kinds = _series_kinds(self.kline_root)
+        for frequency in ("d", "w", "m") + MINUTE_FREQUENCIES:
+            for flag in (UNADJUSTED,) if frequency == "d" or frequency in MINUTE_FREQUENCIES else STORE_ADJUSTFLAGS:
+                pattern = os.path.join(self.kline_root, "*", f"{frequency}_{flag}", "*.parquet")
+                if f"{frequency}_{flag}" in kinds:
+                    adjusted = "back-adjusted" if flag == "1" else "unadjusted"
+                    sources[f"kline_{frequency}{FLAG_SUFFIXES[flag]}"] = (
+                        _parquet(pattern), f"K-line store, frequency {frequency}, {adjusted}")
+        pattern = os.path.join(self.cross_section_root, "*", "*.parquet")
+        if _exists(pattern):
+            sources["market_daily"] = (_parquet(pattern), "Whole-market daily bars, one file per trading day")
+        parts = []
+        for index in INDEX_APIS:
+            path = os.path.join(self.membership_root, index, INTERVALS_FILE)
+            if os.path.exists(path):
+                parts.append(f"SELECT {_literal(index)} AS index_api, * FROM {_parquet([path])}")
+        if parts:
+            sources["index_membership"] = (" UNION ALL BY NAME ".join(parts),
+                                           "Index membership intervals [in_date, out_date)")
+        for api_name, paths in sorted(self.query_cache.entry_files().items()):
+            sources[api_table(api_name)] = (_parquet(sorted(paths), union=True), f"Cached {api_name} results")
+        return sources
+
+    def _sync_views(self):
+        """Create, replace and drop views so they match the sources on disk
+
+        Binding a view reads the schema of its files, so only views whose
+        source changed are recreated. Glob views pick up new files by
+        themselves.
+        """
+        sources = self.sources()
+        # A view dropped behind our back (or a new connection) is recreated rather than trusted
+        existing = {name for (name,) in self._db.execute(
+            "SELECT view_name FROM duckdb_views() WHERE NOT internal").fetchall()}
+        for table in [t for t in self._views if t not in existing]:
+            del self._views[table]
+        for table in [t for t in self._views if t not in sources]:
+            self._db.execute(f'DROP VIEW IF EXISTS "{table}"')
+            del self._views[table]
+        for table, (source, _) in sources.items():
+            if self._views.get(table) != source:
+                select = source if source.startswith("SELECT") else f"SELECT * FROM {source}"
+                try:
+                    self._db.execute(f'CREATE OR REPLACE VIEW "{table}" AS {select}')
+                except duckdb.Error:
+                    # An unreadable file leaves its table out rather than failing every query
+                    self._views.pop(table, None)
+                    continue
+                self._views[table] = source
+        return sources
+
+    def _connect(self):
+        """A cursor on views covering what is on disk now"""
+        with self._lock:
+            self._sync_views()
+            cursor = self._db.cursor()
+        if os.path.exists(universe_data_file(self.universe_file)):
+            # The Arrow file is memory-mapped, so the universe is scanned in place
+            cursor.register("stock_universe", read_universe_table(self.universe_file))
+        return cursor
+
+    def tables(self):
+        """DataFrame of the tables a query can use, with their descriptions"""
+        with self._lock:
+            sources = self._sync_views()
+        rows = [(table, description) for table, (_, description) in sources.items()]
+        if os.path.exists(universe_data_file(self.universe_file)):
+            rows.append(("stock_universe", "Stock list with industry columns"))
+        return pd.DataFrame(rows, columns=['table', 'description'])
+
+    def columns(self, table):
+        """(DataFrame of column names and types, error_msg)"""
+        try:
+            cursor = self._connect()
+            try:
+                df = cursor.sql(f'DESCRIBE "{table}"').df()
+            finally:
+                cursor.close()
+        except duckdb.Error as e:
+            return None, str(e)
+        return df[['column_name', 'column_type']], None
+
+    def run(self, sql, max_rows=MAX_RESULT_ROWS):
+        """Run one read-only SQL statement; returns (DataFrame of at most ``max_rows`` rows, error_msg)
+
+        Anything that could change the catalog other sessions query (CREATE,
+        DROP, SET, ATTACH, COPY, ...) is refused.
+        """
+        try:
+            statements = duckdb.extract_statements(sql)
+            if len(statements) != 1:
+                return None, f"Expected one SQL statement, got {len(statements)}"
+            if statements[0].type != READ_STATEMENT:
+                return None, (f"Only queries can be run here (SELECT, WITH, FROM, DESCRIBE, SUMMARIZE, SHOW), "
+                              f"not {statements[0].type.name}")
+            cursor = self._connect()
+            try:
+                relation = cursor.sql(sql)
+                if relation is None:
+                    return pd.DataFrame(), None
+                return relation.limit(max_rows).df(), None
+            finally:
+                cursor.close()
+        except duckdb.Error as e:
+            return None, str(e)
+
+
+_local_sql = None
+_local_sql_lock = threading.Lock()
+
+
+def get_local_sql():
+    """Return the process-wide local SQL engine"""
+    global _local_sql
+    with _local_sql_lock:
+        if _local_sql is None:
+            _local_sql = LocalSQL()
+        return _local_sql
@@ -0,0 +1,237 @@
+"""Timing of every query pipeline stage, kept in an in-memory ring buffer
+
+Stages are timed with ``timed(stage)`` blocks that nest per thread: a
+"query" block around a whole request and inner blocks for login, server
+round-trips, decoding, cache reads and writes, rendering and export. Inner
+blocks inherit the API name of the block around them, and ``annotate`` sets
+fields (cache status, rows) on the outermost block of the current thread.
+
+A stage costs a few microseconds (two perf_counter calls, a deque append
+and a counter update), so timing is always on. Records can be exported as
+JSON lines or Prometheus text.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Records kept; older ones are dropped
+DEFAULT_CAPACITY = 10000
+
+# Cache status of a request
+CACHE_MEMORY = 'memory'  # shared result store
+CACHE_SHARED = 'shared'  # waited on the same query from another session
+CACHE_DISK = 'disk'      # query cache or K-line store, nothing downloaded
+CACHE_PARTIAL = 'partial'  # K-line store topped up with missing ranges
+CACHE_MISS = 'miss'      # fetched from BaoStock
+
+
+class StageRecord:
+    """One timed stage"""
+
+    __slots__ = ('ts', 'stage', 'api', 'seconds', 'rows', 'nbytes', 'cache', 'error')
+
+    def __init__(self, stage, api=None, seconds=0.0, rows=None, nbytes=None, cache=None, error=False, ts=None):
+        self.ts = time.time() if ts is None else ts
+        self.stage = stage
+        self.api = api
+        self.seconds = seconds
+        self.rows = rows
+        self.nbytes = nbytes
+        self.cache = cache
+        self.error = error
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _Span:
+    def __init__(self, recorder, record):
+        self._recorder = recorder
+        self.record = record
+
+    def set(self, **fields):
+        for name, value in fields.items():
+            setattr(self.record, name, value)
+
+    def __enter__(self):
+        stack = self._recorder._stack()
+        if self.record.api is None and stack:
+            self.record.api = stack[-1].record.api
+        stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record.seconds = time.perf_counter() - self._start
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.record.error = True
+        self._recorder._stack().pop()
+        self._recorder._add(self.record)
+        return False
+
+
+def frame_size(df):
+    """Rows and shallow bytes of a result, cheap enough to take for every record"""
+    if df is None:
+        return None, None
+    return len(df), int(df.memory_usage(index=False, deep=False).sum())
+
+
+class MetricsRecorder:
+    """Ring buffer of stage records with latency summaries and exporters"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._records = deque(maxlen=capacity)
+        self._local = threading.local()
+        # {(api, stage): [count, seconds, errors, rows, bytes]} since start, never dropped or reset,
+        # so the exported counters only ever increase
+        self._totals = {}
+        self._totals_lock = threading.Lock()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add(self, record):
+        self._records.append(record)
+        with self._totals_lock:
+            totals = self._totals.get((record.api or "-", record.stage))
+            if totals is None:
+                totals = self._totals[(record.api or "-", record.stage)] = [0, 0.0, 0, 0, 0]
+            totals[0] += 1
+            totals[1] += record.seconds
+            totals[2] += bool(record.error)
+            totals[3] += record.rows or 0
+            totals[4] += record.nbytes or 0
+
+    def timed(self, stage, api=None, **fields):
+        """Context manager timing one stage; ``with ... as span: span.set(rows=...)``"""
+        return _Span(self, StageRecord(stage, api, **fields))
+
+    def record(self, stage, seconds, api=None, **fields):
+        """Add a stage timed elsewhere (e.g. inside a worker process)"""
+        stack = self._stack()
+        if api is None and stack:
+            api = stack[0].record.api
+        self._add(StageRecord(stage, api, seconds, **fields))
+
+    def annotate(self, **fields):
+        """Set fields on the outermost stage being timed on this thread"""
+        stack = self._stack()
+        if stack:
+            stack[0].set(**fields)
+
+    def records(self, stage=None, since=None):
+        return [r for r in list(self._records)
+                if (stage is None or r.stage == stage) and (since is None or r.ts >= since)]
+
+    def clear(self):
+        """Drop the buffered records; the exported counters keep their totals"""
+        self._records.clear()
+
+    def summary(self, stage='query'):
+        """Per-API latency, throughput and error rate for one stage, busiest API first"""
+        groups = {}
+        for r in self.records(stage):
+            groups.setdefault(r.api or "-", []).append(r)
+        rows = []
+        for api, records in groups.items():
+            seconds = np.array([r.seconds for r in records])
+            errors = sum(r.error for r in records)
+            total_rows = sum(r.rows or 0 for r in records)
+            cached = sum(r.cache not in (None, CACHE_MISS) for r in records)
+            span = max(r.ts for r in records) - min(r.ts for r in records)
+            rows.append({
+                'api': api,
+                'count': len(records),
+                'p50_ms': float(np.percentile(seconds, 50)) * 1000,
+                'p95_ms': float(np.percentile(seconds, 95)) * 1000,
+                'per_min': len(records) / span * 60 if span > 0 else None,
+                'rows_per_s': total_rows / float(seconds.sum()) if seconds.sum() > 0 else None,
+                'error_rate': errors / len(records),
+                'cached': cached / len(records),
+                'mb': sum(r.nbytes or 0 for r in records) / 1024 / 1024,
+            })
+        return sorted(rows, key=lambda row: row['count'], reverse=True)
+
+    def stage_summary(self):
+        """Latency of every stage across all APIs"""
+        groups = {}
+        for r in self.records():
+            groups.setdefault(r.stage, []).append(r.seconds)
+        return [
+            {
+                'stage': stage,
+                'count': len(values),
+                'p50_ms': float(np.percentile(values, 50)) * 1000,
+                'p95_ms': float(np.percentile(values, 95)) * 1000,
+                'total_s': float(sum(values)),
+            }
+            for stage, values in sorted(groups.items())
+        ]
+
+    def to_jsonl(self):
+        return "".join(json.dumps(r.as_dict(), ensure_ascii=False) + "\n" for r in self.records())
+
+    def write_jsonl(self, path):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(self.to_jsonl())
+
+    def to_prometheus(self):
+        """Prometheus text exposition
+
+        Quantiles cover the records in the buffer; sums, counts and the
+        ``_total`` counters cover every stage since the recorder was created.
+        """
+        groups = {}
+        for r in self.records():
+            groups.setdefault((r.api or "-", r.stage), []).append(r.seconds)
+        with self._totals_lock:
+            totals = {key: list(values) for key, values in self._totals.items()}
+        lines = [
+            "# HELP baostock_stage_seconds Time spent in a query pipeline stage",
+            "# TYPE baostock_stage_seconds summary",
+        ]
+        counters = []
+        for (api, stage), (count, seconds, errors, rows, nbytes) in sorted(totals.items()):
+            labels = f'api="{api}",stage="{stage}"'
+            buffered = groups.get((api, stage))
+            if buffered:
+                for q in (0.5, 0.95, 0.99):
+                    lines.append(f'baostock_stage_seconds{{{labels},quantile="{q}"}} {np.quantile(buffered, q):.6f}')
+            lines.append(f"baostock_stage_seconds_sum{{{labels}}} {seconds:.6f}")
+            lines.append(f"baostock_stage_seconds_count{{{labels}}} {count}")
+            counters.append((labels, errors, rows, nbytes))
+        for name, help_text, index in (("errors", "Failed stages", 1), ("rows", "Rows handled", 2),
+                                       ("bytes", "Bytes handled", 3)):
+            lines.append(f"# HELP baostock_stage_{name}_total {help_text}")
+            lines.append(f"# TYPE baostock_stage_{name}_total counter")
+            lines.extend(f"baostock_stage_{name}_total{{{c[0]}}} {c[index]}" for c in counters)
+        return "\n".join(lines) + "\n"
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Return the process-wide metrics recorder"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRecorder()
+        return _metrics
+
+
+def timed(stage, api=None, **fields):
+    return get_metrics().timed(stage, api, **fields)
+
+
+def annotate(**fields):
+    get_metrics().annotate(**fields)
@@ -0,0 +1,180 @@
+"""Forward- and back-adjusted prices computed locally from BaoStock adjustment factors
+
+BaoStock adjusts by percentage change: an adjusted price is the unadjusted
+price times the factor in force on that day. The back-adjustment factor of
+each ex-dividend date comes from query_adjust_factor (1 before the first
+one); the forward factor is the back factor divided by the latest one. So
+one download of unadjusted bars plus one factor table per code gives all
+three adjust flags, and switching between them needs no server call.
+"""
+import threading
+from concurrent.futures import as_completed
+from datetime import date
+
+import baostock as bs
+import numpy as np
+import pandas as pd
+
+from query_cache import get_query_cache, normalize_params
+
+BACK_ADJUSTED = "1"
+FORWARD_ADJUSTED = "2"
+UNADJUSTED = "3"
+
+# Factors are always requested from here to today, so one cached result per code and day covers any range
+FACTOR_START = "1990-01-01"
+
+# Scaled by the factor; volume, amount, turnover and pctChg are the same under every adjustment
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'preclose')
+
+
+class FactorTable:
+    """Back-adjustment factor in force from each ex-dividend date of one code"""
+
+    __slots__ = ('dates', 'back')
+
+    def __init__(self, dates, back):
+        self.dates = dates
+        self.back = back
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build from a query_adjust_factor result"""
+        if df is None or df.empty:
+            return cls(np.array([], dtype='datetime64[ns]'), np.array([], dtype=np.float64))
+        df = df.dropna(subset=['dividOperateDate', 'backAdjustFactor']).sort_values('dividOperateDate')
+        return cls(df['dividOperateDate'].to_numpy('datetime64[ns]'),
+                   df['backAdjustFactor'].to_numpy(np.float64))
+
+    def multipliers(self, dates, adjustflag):
+        """Price multiplier for each bar date (datetime64) under an adjust flag"""
+        if str(adjustflag) == UNADJUSTED or not len(self.dates):
+            return np.ones(len(dates))
+        i = np.searchsorted(self.dates, dates, side='right') - 1
+        factors = np.where(i >= 0, self.back[np.maximum(i, 0)], 1.0)
+        if str(adjustflag) == FORWARD_ADJUSTED:
+            factors = factors / self.back[-1]
+        return factors
+
+
+def adjust_bars(df, factors, adjustflag):
+    """Copy of unadjusted bars with their prices adjusted
+
+    ``factors`` is one FactorTable for a single-code frame, or {code:
+    FactorTable} for a frame stacking several codes.
+    """
+    adjustflag = str(adjustflag)
+    out = df.copy(deep=False)
+    if 'adjustflag' in out.columns:
+        out['adjustflag'] = pd.Categorical.from_codes(np.zeros(len(out), dtype=np.int8), [adjustflag])
+    prices = [c for c in PRICE_COLUMNS if c in out.columns]
+    if adjustflag == UNADJUSTED or not prices or out.empty:
+        return out
+    dates = out['date'].to_numpy('datetime64[ns]')
+    if isinstance(factors, FactorTable):
+        multipliers = factors.multipliers(dates, adjustflag)
+    else:
+        multipliers = np.ones(len(out))
+        for code, rows in out.groupby('code', sort=False, observed=True).indices.items():
+            multipliers[rows] = factors[code].multipliers(dates[rows], adjustflag)
+    for column in prices:
+        out[column] = out[column].to_numpy(np.float64) * multipliers
+    return out
+
+
+def _factor_call(code):
+    """Arguments of the factor query for a code, and its normalized cache parameters"""
+    kwargs = {'code': code, 'start_date': FACTOR_START, 'end_date': date.today().isoformat()}
+    return kwargs, normalize_params(bs.query_adjust_factor, (), kwargs)
+
+
+class PriceAdjuster:
+    """Factor tables per code, fetched at most once a day, and adjustment of bar frames"""
+
+    def __init__(self, query_cache=None):
+        self.query_cache = query_cache or get_query_cache()
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def _resident(self, code):
+        with self._lock:
+            entry = self._tables.get(code)
+        if entry is not None and entry[0] == date.today():
+            return entry[1]
+        return None
+
+    def _keep(self, code, df):
+        table = FactorTable.from_frame(df)
+        with self._lock:
+            self._tables[code] = (date.today(), table)
+        return table
+
+    def factors(self, code):
+        """FactorTable for one code; returns (FactorTable, error_msg)"""
+        table = self._resident(code)
+        if table is not None:
+            return table, None
+        kwargs, _ = _factor_call(code)
+        df, error_msg = self.query_cache.fetch(bs.query_adjust_factor, **kwargs)
+        if error_msg is not None:
+            return None, error_msg
+        return self._keep(code, df), None
+
+    def load(self, codes, pool=None):
+        """Factor tables for many codes, fetching missing ones over the worker pool
+
+        Returns ({code: FactorTable}, {code: error_msg}).
+        """
+        tables, failures, futures = {}, {}, {}
+        for code in dict.fromkeys(codes):
+            table = self._resident(code)
+            if table is None:
+                kwargs, params = _factor_call(code)
+                df = self.query_cache.get('query_adjust_factor', params)
+                if df is not None:
+                    table = self._keep(code, df)
+                elif pool is not None:
+                    futures[pool.submit('query_adjust_factor', **kwargs)] = (code, params)
+                    continue
+                else:
+                    table, error_msg = self.factors(code)
+                    if error_msg is not None:
+                        failures[code] = error_msg
+                        continue
+            tables[code] = table
+
+        for future in as_completed(futures):
+            code, params = futures[future]
+            try:
+                df, error_msg = future.result()
+            except Exception as e:
+                df, error_msg = None, str(e)
+            if error_msg is not None:
+                failures[code] = error_msg
+                continue
+            self.query_cache.put('query_adjust_factor', params, df)
+            tables[code] = self._keep(code, df)
+        return tables, failures
+
+    def adjust(self, df, adjustflag, pool=None):
+        """Adjusted copy of unadjusted bars for one or more codes; returns (DataFrame, error_msg)"""
+        if str(adjustflag) == UNADJUSTED or df.empty:
+            return adjust_bars(df, FactorTable.from_frame(None), adjustflag), None
+        tables, failures = self.load(df['code'].unique(), pool)
+        if failures:
+            code, error_msg = next(iter(failures.items()))
+            return None, f"Adjustment factors for {code}: {error_msg}"
+        return adjust_bars(df, tables, adjustflag), None
+
+
+_adjuster = None
+_adjuster_lock = threading.Lock()
+
+
+def get_price_adjuster():
+    """Return the process-wide price adjuster"""
+    global _adjuster
+    with _adjuster_lock:
+        if _adjuster is None:
+            _adjuster = PriceAdjuster()
+        return _adjuster
@@ -0,0 +1,380 @@
+"""On-disk Parquet cache for BaoStock queries with data-aware TTLs and LRU eviction"""
+import atexit
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+import pandas as pd
+
+from api_registry import (API_REGISTRY, CACHE_DAILY, CACHE_DIVIDEND, CACHE_KLINE, CACHE_RANGE,
+                          CACHE_SNAPSHOT, CACHE_STATEMENT)
+from bs_session import get_session
+from perf_metrics import CACHE_DISK, annotate, timed
+from result_decoder import decode_result
+
+CACHE_DIR = os.path.join("cache", "queries")
+INDEX_FILE = "index.json"
+INDEX_LOCK_FILE = "index.lock"
+
+# Disk budget for cached results; override with BAOSTOCK_CACHE_MB
+DEFAULT_BUDGET_MB = 512
+
+# Access times from cache hits are written back at most this often
+INDEX_FLUSH_SECONDS = 5
+
+# Bars for today (or later) change until the close
+INTRADAY_TTL = 5 * 60
+
+# Quarterly statements are considered final this long after the quarter ends
+STATEMENT_SETTLE_DAYS = 120
+
+
+def _next_midnight(now):
+    tomorrow = datetime.fromtimestamp(now).date() + timedelta(days=1)
+    return datetime.combine(tomorrow, datetime.min.time()).timestamp()
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on ``path``, held against other processes as well as threads"""
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def expires_at(api_name, params, now=None):
+    """Absolute expiry (epoch seconds) for a query result, or None if it never changes
+
+    Decided by the API's cache class in the registry:
+
+    * past K-line bars, closed quarters, past index snapshots: never expire
+      (forward-adjusted bars are rescaled at every ex-dividend, so they expire daily)
+    * ranges reaching today: INTRADAY_TTL
+    * trade calendar, macro series, reference data: next midnight
+    """
+    now = time.time() if now is None else now
+    today = datetime.fromtimestamp(now).date()
+    daily = _next_midnight(now)
+    spec = API_REGISTRY.get(api_name)
+    cache_class = spec.cache if spec is not None else CACHE_DAILY
+
+    if cache_class == CACHE_KLINE:
+        end = _parse_date(params.get('end_date')) or today
+        if end >= today:
+            return now + INTRADAY_TTL
+        if str(params.get('adjustflag')) == '2':
+            return daily
+        return None
+
+    if cache_class == CACHE_STATEMENT:
+        try:
+            year, quarter = int(params.get('year')), int(params.get('quarter'))
+        except (TypeError, ValueError):
+            return daily
+        quarter_end = date(year, quarter * 3, 1) + timedelta(days=31)
+        quarter_end = quarter_end.replace(day=1) - timedelta(days=1)
+        if (today - quarter_end).days > STATEMENT_SETTLE_DAYS:
+            return None
+        return daily
+
+    if cache_class == CACHE_DIVIDEND:
+        try:
+            year = int(params.get('year'))
+        except (TypeError, ValueError):
+            return daily
+        # Dividends for a report year are announced during the following year
+        return None if year < today.year - 1 else daily
+
+    if cache_class == CACHE_RANGE:
+        end = _parse_date(params.get('end_date')) or today
+        return None if end < today else daily
+
+    if cache_class == CACHE_SNAPSHOT:
+        day = _parse_date(params.get('date') or params.get('day')) or today
+        return None if day < today else daily
+
+    # Trade calendar, macro series, stock basics and industries
+    return daily
+
+
+def normalize_params(func, args, kwargs):
+    """Bind a bs.query_* call to its named parameters (defaults applied) as strings"""
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+    except (TypeError, ValueError):
+        params = dict(kwargs)
+        params.update({f"arg{i}": v for i, v in enumerate(args)})
+    params.pop('kwargs', None)
+    normalized = {k: ("" if v is None else str(v)) for k, v in params.items()}
+    if 'fields' in normalized:
+        normalized['fields'] = ",".join(f.strip() for f in normalized['fields'].split(",") if f.strip())
+    return normalized
+
+
+def cache_key(api_name, params):
+    payload = json.dumps({'api': api_name, 'params': params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class QueryCache:
+    """Parquet-backed result cache keyed by API name and normalized arguments
+
+    The browser, the CLI and worker processes may share one cache directory,
+    so every write of the index merges in what the other processes wrote
+    since this one last read it.
+    """
+
+    def __init__(self, session=None, cache_dir=CACHE_DIR, budget_bytes=None):
+        if budget_bytes is None:
+            budget_bytes = int(float(os.environ.get('BAOSTOCK_CACHE_MB', DEFAULT_BUDGET_MB)) * 1024 * 1024)
+        self.session = session or get_session()
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        # Keys this process added or removed since it last wrote the index
+        self._added = set()
+        self._removed = set()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._load_index()
+        atexit.register(self.flush)
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def _read_index(self):
+        try:
+            with open(self._index_path(), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load_index(self):
+        # Drop entries whose file has disappeared
+        return {k: v for k, v in self._read_index().items() if os.path.exists(self._entry_path(k))}
+
+    def _merge_index(self):
+        """Take the index on disk, plus this process's additions, minus its removals
+
+        Entries another process removed stay removed, and the later access
+        time of an entry both processes hold wins. Call with the index file
+        locked.
+        """
+        if not os.path.exists(self._index_path()):
+            return
+        merged = {}
+        for key, entry in self._read_index().items():
+            if key in self._removed:
+                continue
+            mine = self._index.get(key)
+            if mine is not None and mine['last_access'] > entry['last_access']:
+                entry['last_access'] = mine['last_access']
+            merged[key] = entry
+        for key in self._added:
+            if key in self._index:
+                merged[key] = self._index[key]
+        self._index = merged
+
+    def _write_index(self):
+        tmp = f"{self._index_path()}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp, self._index_path())
+        self._added.clear()
+        self._removed.clear()
+        self._last_flush = time.monotonic()
+
+    def _save_index(self):
+        """Merge with the index on disk, evict down to the budget and write it back"""
+        with _file_lock(os.path.join(self.cache_dir, INDEX_LOCK_FILE)):
+            self._merge_index()
+            self._evict()
+            self._write_index()
+
+    def flush(self):
+        """Write pending access times to the index"""
+        with self._lock:
+            self._save_index()
+
+    def close(self):
+        """Flush the index and stop flushing it at exit"""
+        atexit.unregister(self.flush)
+        self.flush()
+
+    def _remove(self, key):
+        self._index.pop(key, None)
+        self._added.discard(key)
+        self._removed.add(key)
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def get(self, api_name, params):
+        """Cached DataFrame for the query, or None when missing or expired"""
+        with timed('cache_read', api_name) as span:
+            df = self._get(api_name, params)
+            if df is not None:
+                span.set(rows=len(df), cache=CACHE_DISK)
+                annotate(cache=CACHE_DISK)
+            return df
+
+    def _get(self, api_name, params):
+        key = cache_key(api_name, params)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None and entry['expires_at'] is not None and entry['expires_at'] <= time.time():
+                self._remove(key)
+                self._save_index()
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            try:
+                df = pd.read_parquet(self._entry_path(key))
+            except Exception:
+                self._remove(key)
+                self._save_index()
+                self.misses += 1
+                return None
+            entry['last_access'] = time.time()
+            self.hits += 1
+            # Only LRU order depends on access times, so hits are flushed lazily
+            if time.monotonic() - self._last_flush > INDEX_FLUSH_SECONDS:
+                self._save_index()
+            return df
+
+    def put(self, api_name, params, df):
+        key = cache_key(api_name, params)
+        path = self._entry_path(key)
+        with self._lock, timed('cache_write', api_name, rows=len(df)) as span:
+            df.to_parquet(path, index=False)
+            span.set(nbytes=os.path.getsize(path))
+            self._index[key] = {
+                'api': api_name,
+                'params': params,
+                'expires_at': expires_at(api_name, params),
+                'size': os.path.getsize(path),
+                'created': time.time(),
+                'last_access': time.time(),
+            }
+            self._added.add(key)
+            self._removed.discard(key)
+            self._save_index()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits its budget"""
+        total = sum(e['size'] for e in self._index.values())
+        for key, entry in sorted(self._index.items(), key=lambda kv: kv[1]['last_access']):
+            if total <= self.budget_bytes:
+                break
+            total -= entry['size']
+            self._remove(key)
+            self.evictions += 1
+
+    def fetch(self, func, *args, **kwargs):
+        """Run a bs.query_* call through the cache; returns (DataFrame, error_msg)"""
+        api_name = func.__name__
+        params = normalize_params(func, args, kwargs)
+        df = self.get(api_name, params)
+        if df is not None:
+            return df, None
+        return self._query_and_store(func, api_name, params, args, kwargs)
+
+    def refresh(self, func, *args, **kwargs):
+        """Like fetch, but always asks BaoStock and overwrites the cached copy"""
+        params = normalize_params(func, args, kwargs)
+        return self._query_and_store(func, func.__name__, params, args, kwargs)
+
+    def _query_and_store(self, func, api_name, params, args, kwargs):
+        with timed('server', api_name) as span:
+            rs = self.session.query(func, *args, **kwargs)
+            span.set(error=rs.error_code != '0')
+        if rs.error_code != '0':
+            return None, rs.error_msg
+        with timed('decode', api_name) as span:
+            df = decode_result(rs)
+            span.set(rows=len(df))
+        self.put(api_name, params, df)
+        return df, None
+
+    def clear(self):
+        with self._lock, _file_lock(os.path.join(self.cache_dir, INDEX_LOCK_FILE)):
+            self._merge_index()
+            for key in list(self._index):
+                self._remove(key)
+            self._write_index()
+
+    def entry_files(self):
+        """{api name: [Parquet paths]} of the entries that have not expired"""
+        now = time.time()
+        with self._lock:
+            files = {}
+            for key, entry in self._index.items():
+                if entry['expires_at'] is None or entry['expires_at'] > now:
+                    files.setdefault(entry['api'], []).append(self._entry_path(key))
+            return files
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._index),
+                'bytes': sum(e['size'] for e in self._index.values()),
+                'budget_bytes': self.budget_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups) if lookups else None,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """Return the process-wide query cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = QueryCache()
+        return _cache
@@ -0,0 +1,162 @@
+"""Query engine shared by the Streamlit browser and the command line
+
+Turns loose inputs into BaoStock parameters using the API registry, and runs a
+query through the shared result store, the query cache, the K-line store and
+the worker pool. Nothing here imports Streamlit, so scripts and cron jobs
+start quickly.
+"""
+from datetime import date, datetime
+
+import baostock as bs
+
+from api_registry import (CACHE_KLINE, CHOICE, CODE, DEFAULT_CODE, FIELDS, YEAR, API_REGISTRY, default_fields,
+                          get_spec)
+from kline_chunks import ChunkedFetcher
+from kline_store import get_kline_store
+from perf_metrics import CACHE_DISK, CACHE_MISS, CACHE_PARTIAL, annotate, frame_size, get_metrics, timed
+from query_cache import get_query_cache, normalize_params
+from result_store import get_result_store
+from worker_pool import get_worker_pool
+
+# BaoStock's own default start for K-line queries
+KLINE_DEFAULT_START = "2015-01-01"
+
+
+def api_category(api_name):
+    spec = API_REGISTRY.get(api_name)
+    return spec.category if spec else None
+
+
+def _to_text(value):
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    return "" if value is None else str(value).strip()
+
+
+def build_params(api_name, inputs):
+    """BaoStock keyword arguments for an API from loosely typed inputs (widgets, CLI, batch files)
+
+    Dates may be date objects or strings; empty values are dropped so
+    BaoStock's own defaults apply. Raises ValueError for an unknown API or
+    parameter.
+    """
+    spec = get_spec(api_name)
+    unknown = set(inputs) - set(spec.param_names)
+    if unknown:
+        raise ValueError(f"{api_name} does not take: {', '.join(sorted(unknown))}")
+
+    params = {name: _to_text(inputs[name]) for name in spec.param_names if name in inputs}
+    params = {name: value for name, value in params.items() if value != ""}
+
+    for param in spec.params:
+        if param.kind == CODE:
+            params.setdefault(param.name, DEFAULT_CODE)
+        elif param.name in params and (param.kind == YEAR or (
+                param.kind == CHOICE and isinstance(param.default, int))):
+            try:
+                params[param.name] = int(params[param.name])
+            except ValueError:
+                raise ValueError(f"{api_name}: {param.name} must be a number, got {params[param.name]!r}") from None
+    for param in spec.params:
+        if param.kind == FIELDS:
+            params.setdefault(param.name, default_fields(params.get('frequency', 'd')))
+    if spec.exclusive:
+        # The first one given wins; none means "all"
+        given = [name for name in spec.exclusive if name in params]
+        for name in given[1:]:
+            del params[name]
+    if spec.scoped_by and spec.scoped_by not in params:
+        # Without it BaoStock returns the latest data for everything
+        params = {}
+    return params
+
+
+def describe_query(api_name, params):
+    """Short label for a query, shown above its result"""
+    return get_spec(api_name).describe(params)
+
+
+def run_query(api_name, params, pool=None, progress=None, notify=None):
+    """Run one query; returns (DataFrame, error_msg)
+
+    Results are shared through the process-wide result store, so identical
+    queries from several sessions are fetched once and held in memory once.
+    K-line requests the local store can serve are answered from it and only
+    missing ranges are downloaded; coarser frequencies whose finer bars are
+    already stored are aggregated locally. Long ranges are split into chunks. Other
+    queries go through the query cache. With a worker pool, cache misses are
+    fetched in a worker process instead of over this process's session, so
+    several queries can run at once.
+
+    ``progress`` receives chunk progress for long K-line downloads and
+    ``notify`` short status messages.
+    """
+    spec = get_spec(api_name)
+    cache_params = normalize_params(spec.func, (), params)
+    # Inner stages overwrite the cache status when the result comes from somewhere local
+    with timed('query', api_name, cache=CACHE_MISS) as span:
+        df, error_msg = get_result_store().get_or_compute(
+            api_name, cache_params, lambda: _fetch(spec, params, cache_params, pool, progress, notify),
+            on_wait=notify
+        )
+        rows, nbytes = frame_size(df)
+        span.set(rows=rows, nbytes=nbytes, error=error_msg is not None)
+    return df, error_msg
+
+
+def _fetch(spec, params, cache_params, pool, progress, notify):
+    query_cache = get_query_cache()
+    if spec.cache == CACHE_KLINE:
+        return _run_kline(params, pool, progress, notify)
+    if pool is None:
+        return query_cache.fetch(spec.func, **params)
+
+    df = query_cache.get(spec.name, cache_params)
+    if df is not None:
+        return df, None
+    df, error_msg, seconds = pool.submit_timed(spec.name, **params).result()
+    # Worker time, decoding included
+    get_metrics().record('server', seconds, rows=len(df) if df is not None else None, error=error_msg is not None)
+    if error_msg is None:
+        query_cache.put(spec.name, cache_params, df)
+    return df, error_msg
+
+
+def _run_kline(params, pool, progress, notify):
+    kline_store = get_kline_store()
+    code, fields = params['code'], params['fields']
+    start_date, end_date = params.get('start_date'), params.get('end_date')
+    frequency, adjustflag = params.get('frequency', 'd'), params.get('adjustflag', '3')
+    start_date = start_date or KLINE_DEFAULT_START
+    end_date = end_date or date.today().isoformat()
+    fetcher = ChunkedFetcher(pool or get_worker_pool())
+
+    source = kline_store.resample_source(code, start_date, end_date, frequency, adjustflag, fields)
+    if source is not None:
+        annotate(cache=CACHE_DISK)
+        with timed('resample') as span:
+            df, error_msg = kline_store.resample(code, start_date, end_date, frequency=frequency,
+                                                 adjustflag=adjustflag, fields=fields)
+            span.set(rows=len(df) if df is not None else None, error=error_msg is not None)
+        return df, error_msg
+
+    if kline_store.supports(frequency, adjustflag, fields):
+        missing, error_msg = kline_store.missing_ranges(code, start_date, end_date, frequency, adjustflag)
+        annotate(cache=CACHE_PARTIAL if missing else CACHE_DISK)
+        if missing and notify:
+            notify(f"Downloading {len(missing)} missing range(s): " +
+                   ", ".join(f"{s} → {e}" for s, e in missing))
+        with timed('kline_store') as span:
+            df, error_msg = kline_store.get_bars(code, start_date, end_date, frequency=frequency,
+                                                 adjustflag=adjustflag, fields=fields, fetcher=fetcher,
+                                                 progress=progress)
+            span.set(rows=len(df) if df is not None else None, error=error_msg is not None)
+        return df, error_msg
+
+    chunks, error_msg = fetcher.plan(start_date, end_date, frequency)
+    if error_msg is None and len(chunks) > 1:
+        return fetcher.fetch(code, start_date, end_date, frequency, adjustflag, fields, progress=progress)
+    return get_query_cache().fetch(
+        bs.query_history_k_data_plus, code, fields,
+        start_date=start_date, end_date=end_date, frequency=frequency, adjustflag=adjustflag
+    )
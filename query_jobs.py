@@ -0,0 +1,178 @@
+"""Queries run as background jobs that outlive the Streamlit script run
+
+A job runs in a thread owned by the process-wide JobManager and fetches
+through the worker pool, so the page stays responsive, several jobs can run
+at once and a job can be cancelled while it is still waiting or downloading.
+"""
+import atexit
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from query_engine import run_query
+from worker_pool import get_worker_pool
+
+# Jobs running at once; they mostly wait on the worker processes
+MAX_RUNNING_JOBS = 8
+
+# Finished jobs (and their results) kept for sessions to pick up
+MAX_FINISHED_JOBS = 50
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's callbacks once it has been cancelled"""
+
+
+class QueryJob:
+    """One submitted query and everything the page shows about it"""
+
+    def __init__(self, job_id, api_name, params, label):
+        self.id = job_id
+        self.api_name = api_name
+        self.params = params
+        self.label = label
+        self.status = QUEUED
+        self.progress = None  # fraction done, when the query reports it
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._future = None
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def cancel(self):
+        """Stop the job; a request already sent to BaoStock finishes in its worker and is discarded"""
+        if self.done:
+            return False
+        self._cancel.set()
+        self.message = "Cancelling…"
+        if self._future is not None and self._future.cancel():
+            self._finish(CANCELLED)
+        return True
+
+    def _check(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def _on_progress(self, p):
+        self._check()
+        retried = f" | {p.retries} retried" if p.retries else ""
+        self.progress = p.done / p.total if p.total else None
+        self.message = f"Chunk {p.done}/{p.total} | {p.rows:,} rows{retried}"
+
+    def _on_notify(self, message):
+        self._check()
+        self.message = message
+
+    def _finish(self, status, result=None, error=None):
+        self.result, self.error = result, error
+        self.finished = time.time()
+        self.status = status
+
+    def _run(self):
+        if self._cancel.is_set():
+            self._finish(CANCELLED)
+            return
+        self.started = time.time()
+        self.status = RUNNING
+        try:
+            df, error_msg = run_query(self.api_name, self.params, pool=get_worker_pool(),
+                                      progress=self._on_progress, notify=self._on_notify)
+        except JobCancelled:
+            self._finish(CANCELLED)
+            return
+        except Exception as e:
+            self._finish(FAILED, error=str(e))
+            return
+        if self._cancel.is_set():
+            self._finish(CANCELLED)
+        elif error_msg is not None:
+            self._finish(FAILED, error=error_msg)
+        else:
+            self._finish(DONE, result=df)
+
+
+class JobManager:
+    """Runs query jobs on a thread pool and keeps them until sessions collect them"""
+
+    def __init__(self, max_running=MAX_RUNNING_JOBS, max_finished=MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="query-job")
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, api_name, params, label=None):
+        with self._lock:
+            job = QueryJob(next(self._ids), api_name, params, label or api_name)
+            self._jobs[job.id] = job
+            self._prune()
+            job._future = self._executor.submit(job._run)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self, job_ids):
+        """Jobs still known for these ids, in submission order"""
+        return [self._jobs[job_id] for job_id in sorted(job_ids) if job_id in self._jobs]
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        return job.cancel() if job else False
+
+    def _prune(self):
+        # Drop the oldest finished jobs (and their results) beyond the limit
+        finished = [job for job in self._jobs.values() if job.done]
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job.id]
+
+    def shutdown(self):
+        for job in list(self._jobs.values()):
+            job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Return the process-wide job manager, shared by every browser session"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
+
+
+def _shutdown_manager():
+    if _manager is not None:
+        _manager.shutdown()
+
+
+atexit.register(_shutdown_manager)
@@ -0,0 +1,138 @@
+"""Typed, column-at-a-time decoding of BaoStock result sets"""
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+FIELD_DESC_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "field_descriptions.csv")
+
+# Flag-like fields with a handful of distinct values
+CATEGORY_FIELDS = {
+    'adjustflag', 'tradestatus', 'tradeStatus', 'isST', 'is_trading_day',
+    'type', 'status', 'industry', 'industryClassification', 'profitForcastType',
+}
+
+# Free text and identifiers; the dividend amounts read like "10派7.57元（含税，扣税后6.813或7.1915元）"
+STRING_FIELDS = {'code', 'code_name', 'profitForcastAbstract', 'dividCashStock', 'dividCashPsAfterTax'}
+
+# Whole numbers
+INT_FIELDS = {'volume', 'statYear', 'statMonth'}
+
+# Date-only fields that do not follow the "...Date" naming pattern
+DATE_FIELDS = {'date', 'calendar_date'}
+
+
+def _classify(field_name):
+    if field_name in CATEGORY_FIELDS:
+        return 'category'
+    if field_name in STRING_FIELDS:
+        return 'string'
+    if field_name == 'time':
+        return 'timestamp'
+    if field_name in DATE_FIELDS or field_name.endswith('Date'):
+        return 'date'
+    if field_name in INT_FIELDS:
+        return 'int'
+    return 'float'
+
+
+def load_field_dtypes(path=FIELD_DESC_FILE):
+    """Build {field_name: kind} for every field listed in field_descriptions.csv"""
+    dtypes = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                dtypes[row['field_name']] = _classify(row['field_name'])
+    return dtypes
+
+
+# Fields missing from the CSV are kept as strings
+FIELD_DTYPES = load_field_dtypes()
+
+
+def _to_float(values):
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:
+        pass
+    raw = pd.Series(values, dtype=object)
+    parsed = pd.to_numeric(raw, errors='coerce')
+    # Empty strings (e.g. suspended days) become NaN, but text means the field is not
+    # numeric after all: keep the strings rather than wipe the column
+    if (parsed.isna() & raw.astype(str).str.strip().ne("")).any():
+        return np.asarray(values, dtype=object)
+    return parsed.to_numpy(np.float64)
+
+
+def _to_int(values):
+    try:
+        return np.array(values, dtype=np.int64)
+    except ValueError:
+        # Suspended days report an empty volume; keep NaN instead of inventing zeros
+        return _to_float(values)
+
+
+def _to_date(values):
+    try:
+        # Empty strings parse as NaT
+        return np.array(values, dtype='datetime64[D]').astype('datetime64[ns]')
+    except ValueError:
+        return pd.to_datetime(pd.Series(values), errors='coerce').to_numpy()
+
+
+def _to_timestamp(values):
+    # BaoStock minute bars use YYYYMMDDHHMMSSsss; split the digits arithmetically
+    try:
+        stamp = np.array(values, dtype=np.int64)
+    except ValueError:
+        return pd.to_datetime(pd.Series(values), format='%Y%m%d%H%M%S%f', errors='coerce').to_numpy()
+    ymd, hmsf = np.divmod(stamp, 10 ** 9)
+    year, md = np.divmod(ymd, 10000)
+    month, day = np.divmod(md, 100)
+    hms, millis = np.divmod(hmsf, 1000)
+    hour, ms = np.divmod(hms, 10000)
+    minute, second = np.divmod(ms, 100)
+    months = (year - 1970) * 12 + (month - 1)
+    days = months.astype('datetime64[M]').astype('datetime64[D]') + (day - 1)
+    offset = ((hour * 60 + minute) * 60 + second) * 1000 + millis
+    stamps = days.astype('datetime64[ms]') + offset.astype('timedelta64[ms]')
+    return stamps.astype('datetime64[ns]')
+
+
+def decode_column(field_name, values, dtypes=None):
+    """Convert one column of raw strings to its typed array"""
+    kind = (dtypes or FIELD_DTYPES).get(field_name, 'string')
+    if kind == 'float':
+        return _to_float(values)
+    if kind == 'int':
+        return _to_int(values)
+    if kind == 'date':
+        return _to_date(values)
+    if kind == 'timestamp':
+        return _to_timestamp(values)
+    if kind == 'category':
+        return pd.Categorical(values)
+    return np.asarray(values, dtype=object)
+
+
+def decode_rows(fields, rows, dtypes=None):
+    """Build a typed DataFrame from a list of BaoStock string rows, one column at a time"""
+    if not rows:
+        return pd.DataFrame()
+    columns = {}
+    for i, field_name in enumerate(fields):
+        columns[field_name] = decode_column(field_name, [row[i] for row in rows], dtypes)
+    return pd.DataFrame(columns, columns=list(fields))
+
+
+def decode_result(rs, dtypes=None):
+    """Drain a BaoStock result (or ResultSnapshot) into a typed DataFrame"""
+    rows = getattr(rs, 'rows', None)
+    if rows is None:
+        rows = []
+        while (rs.error_code == '0') & rs.next():
+            rows.append(rs.get_row_data())
+    elif rs.error_code != '0':
+        rows = []
+    return decode_rows(rs.fields, rows, dtypes)
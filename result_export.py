@@ -0,0 +1,113 @@
+"""Lazy, chunked export of a query result to CSV, Parquet or Arrow IPC"""
+import io
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from perf_metrics import timed
+
+# Rows converted and written per chunk
+EXPORT_CHUNK_ROWS = 100_000
+
+# Format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+}
+
+
+def _chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_csv(df, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    """UTF-8-BOM CSV (opens cleanly in Excel), written chunk by chunk"""
+    with open(path, 'wb') as f:
+        f.write(",".join(map(str, df.columns)).encode('utf-8-sig') + b"\n")
+        for chunk in _chunks(df, chunk_rows):
+            f.write(chunk.to_csv(index=False, header=False).encode('utf-8'))
+
+
+def _schema(df):
+    # One schema for the whole frame, so every chunk converts to the same types
+    return pa.Schema.from_pandas(df, preserve_index=False)
+
+
+def write_parquet(df, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Parquet file with one row group per chunk"""
+    schema = _schema(df)
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in _chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def write_arrow(df, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Arrow IPC file (Feather v2) with one record batch per chunk"""
+    schema = _schema(df)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        for chunk in _chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+WRITERS = {'CSV': write_csv, 'Parquet': write_parquet, 'Arrow': write_arrow}
+
+
+class ExportReader(io.BufferedReader):
+    """Binary file object over an export that closes itself once read to the end
+
+    Streamlit reads the download itself but never closes what it was given.
+    """
+
+    def read(self, size=-1):
+        data = super().read(size)
+        if size is None or size < 0 or not data:
+            self.close()
+        return data
+
+
+class ResultExport:
+    """Export files for one result, each written on first request and reused after
+
+    Files live in a private temporary directory that is removed once the
+    export object is garbage collected (i.e. the result was replaced).
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._dir = tempfile.mkdtemp(prefix="baostock_export_")
+        self._paths = {}
+        self._lock = threading.Lock()
+        weakref.finalize(self, shutil.rmtree, self._dir, True)
+
+    def frames(self):
+        """DataFrames this export holds, for memory accounting"""
+        return (self.df,)
+
+    def path(self, fmt):
+        """Path of the export in the given format, writing it if needed"""
+        with self._lock:
+            path = self._paths.get(fmt)
+            if path is None:
+                extension, _ = EXPORT_FORMATS[fmt]
+                path = os.path.join(self._dir, f"result.{extension}")
+                with timed(f"export_{extension}", rows=len(self.df)) as span:
+                    WRITERS[fmt](self.df, path + ".tmp")
+                    os.replace(path + ".tmp", path)
+                    span.set(nbytes=os.path.getsize(path))
+                self._paths[fmt] = path
+            return path
+
+    def open(self, fmt):
+        """Open binary file object over the export, closed when read to the end"""
+        return ExportReader(io.FileIO(self.path(fmt), 'rb'))
+
+    def opener(self, fmt):
+        """Zero-argument callable for st.download_button's deferred data"""
+        return lambda: self.open(fmt)
@@ -0,0 +1,124 @@
+"""Server-side paging, sorting, filtering and projection over a query result"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+PAGE_SIZES = (50, 100, 500, 1000)
+DEFAULT_PAGE_SIZE = 100
+
+FILTER_OPERATORS = ("contains", "=", "!=", ">", ">=", "<", "<=")
+
+# Sorted/filtered row orders kept per result
+ORDER_CACHE_SIZE = 16
+
+
+def _parse_value(series, value):
+    """Turn a filter value typed into the UI into something comparable with the column"""
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return float(value)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return pd.Timestamp(value)
+    return str(value)
+
+
+def filter_mask(series, operator, value):
+    """Boolean mask for one filter; raises ValueError for a value the column cannot take"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Compare the few categories once, then broadcast through the codes
+        categories = pd.Series(series.cat.categories.astype(str))
+        hits = np.append(filter_mask(categories, operator, value), False)
+        return hits[series.cat.codes.to_numpy()]
+    if operator == "contains":
+        return series.astype(str).str.contains(str(value), case=False, regex=False, na=False).to_numpy()
+    if operator not in FILTER_OPERATORS:
+        raise ValueError(f"Unknown filter operator: {operator}")
+    value = _parse_value(series, value)
+    compare = {
+        "=": series.eq, "!=": series.ne, ">": series.gt,
+        ">=": series.ge, "<": series.lt, "<=": series.le,
+    }[operator]
+    return compare(value).fillna(False).to_numpy(dtype=bool)
+
+
+class ResultView:
+    """Read-only view of one result frame that only materializes the visible page
+
+    Sort orders and filter results are row-position arrays computed once and
+    cached, so moving between pages only slices ``page_size`` rows.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._frame = df.reset_index(drop=True)
+        self._sort_orders = {}
+        self._orders = OrderedDict()
+        self._lock = threading.Lock()
+        self._statistics = None
+
+    def __len__(self):
+        return len(self._frame)
+
+    def frames(self):
+        """DataFrames this view holds, for memory accounting"""
+        return (self.df, self._frame)
+
+    @property
+    def columns(self):
+        return list(self._frame.columns)
+
+    def _sort_order(self, column, ascending):
+        key = (column, ascending)
+        order = self._sort_orders.get(key)
+        if order is None:
+            order = self._frame[column].sort_values(
+                ascending=ascending, kind='stable', na_position='last'
+            ).index.to_numpy()
+            self._sort_orders[key] = order
+        return order
+
+    def rows(self, sort_by=None, ascending=True, filters=()):
+        """Row positions after filtering and sorting"""
+        filters = tuple(filters)
+        key = (sort_by, ascending, filters)
+        with self._lock:
+            positions = self._orders.get(key)
+            if positions is not None:
+                self._orders.move_to_end(key)
+                return positions
+            mask = None
+            for column, operator, value in filters:
+                part = filter_mask(self._frame[column], operator, value)
+                mask = part if mask is None else mask & part
+            if sort_by:
+                positions = self._sort_order(sort_by, ascending)
+                if mask is not None:
+                    positions = positions[mask[positions]]
+            elif mask is not None:
+                positions = np.flatnonzero(mask)
+            else:
+                positions = np.arange(len(self._frame))
+            self._orders[key] = positions
+            while len(self._orders) > ORDER_CACHE_SIZE:
+                self._orders.popitem(last=False)
+            return positions
+
+    def page(self, page=1, page_size=DEFAULT_PAGE_SIZE, sort_by=None, ascending=True,
+             filters=(), columns=None):
+        """One page of rows; returns (DataFrame, matching row count, page count)"""
+        positions = self.rows(sort_by, ascending, filters)
+        total = len(positions)
+        pages = max(1, -(-total // page_size))
+        page = min(max(1, page), pages)
+        window = positions[(page - 1) * page_size:page * page_size]
+        page_df = self._frame.take(window)
+        # Project after slicing so only the visible rows are copied
+        return (page_df[list(columns)] if columns else page_df), total, pages
+
+    def statistics(self):
+        """describe() of the numeric columns, computed once per result"""
+        if self._statistics is None:
+            numeric = self._frame.select_dtypes(include=['number'])
+            self._statistics = numeric.describe() if len(numeric.columns) else pd.DataFrame()
+        return self._statistics
@@ -0,0 +1,246 @@
+"""Process-wide store of query results shared by every browser session
+
+Identical queries from different sessions share one result DataFrame by
+reference instead of each session fetching and holding its own copy. A
+query already being fetched is not sent again: later callers wait for the
+first one (single-flight). Entries expire like the query cache and the
+least recently used ones are evicted to stay within a memory budget.
+
+Stored frames are shared, so callers must treat them as read-only.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from perf_metrics import CACHE_MEMORY, CACHE_SHARED, annotate
+from query_cache import cache_key, expires_at
+
+# Memory budget for resident results; override with BAOSTOCK_RESULT_STORE_MB
+DEFAULT_BUDGET_MB = 256
+
+# How often a caller waiting on another session's fetch checks whether it should give up
+WAIT_POLL_SECONDS = 0.5
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class StoredResult:
+    """One resident result and what the diagnostics view shows about it"""
+
+    __slots__ = ('key', 'api_name', 'params', 'df', 'nbytes', 'expires', 'created', 'hits', 'extras', 'frames')
+
+    def __init__(self, key, api_name, params, df, expires):
+        self.key = key
+        self.api_name = api_name
+        self.params = params
+        self.df = df
+        self.nbytes = frame_bytes(df)
+        self.expires = expires
+        self.created = time.time()
+        self.hits = 0
+        # Objects derived from the frame (grid view, export files), shared along with it
+        self.extras = {}
+        # ids of the frames counted in nbytes: the result and those its extras hold
+        self.frames = {id(df)}
+
+
+class _Flight:
+    """A fetch in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.completed = False
+
+
+class ResultStore:
+    """Memory-bounded LRU of query results with single-flight fetching"""
+
+    def __init__(self, budget_bytes=None):
+        if budget_bytes is None:
+            budget_bytes = int(float(os.environ.get('BAOSTOCK_RESULT_STORE_MB', DEFAULT_BUDGET_MB)) * 1024 * 1024)
+        self.budget_bytes = budget_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._by_frame = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires is not None and entry.expires <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, api_name, params):
+        """Resident result for a query, or None"""
+        with self._lock:
+            entry = self._lookup(cache_key(api_name, params))
+            if entry is None:
+                return None
+            entry.hits += 1
+            self.hits += 1
+            return entry.df
+
+    def get_or_compute(self, api_name, params, compute, on_wait=None):
+        """Result for a query, calling ``compute()`` only if nobody has it or is fetching it
+
+        ``compute`` returns (DataFrame, error_msg) and ``params`` are the
+        normalized parameters identifying the query. ``on_wait(message)`` is
+        called while waiting on another caller's fetch and may raise to stop
+        waiting. If that fetch raises, waiting callers fetch for themselves.
+        """
+        key = cache_key(api_name, params)
+        while True:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    entry.hits += 1
+                    self.hits += 1
+                    annotate(cache=CACHE_MEMORY)
+                    return entry.df, None
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self.misses += 1
+                else:
+                    self.shared += 1
+            if leader:
+                break
+            if on_wait is None:
+                flight.event.wait()
+            while not flight.event.wait(WAIT_POLL_SECONDS):
+                on_wait("Waiting for the same query started by another session…")
+            if flight.completed:
+                annotate(cache=CACHE_SHARED)
+                return flight.result
+
+        try:
+            df, error_msg = compute()
+        except BaseException:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+            raise
+        with self._lock:
+            del self._flights[key]
+            if error_msg is None and df is not None:
+                self._store(key, api_name, params, df)
+        flight.result, flight.completed = (df, error_msg), True
+        flight.event.set()
+        return df, error_msg
+
+    def _store(self, key, api_name, params, df):
+        if key in self._entries:
+            self._remove(key)
+        entry = StoredResult(key, api_name, params, df, expires_at(api_name, params))
+        if entry.nbytes > self.budget_bytes:
+            return
+        self._entries[key] = entry
+        self._by_frame[id(df)] = entry
+        self.bytes += entry.nbytes
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the store fits its budget"""
+        while self.bytes > self.budget_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._by_frame.pop(id(entry.df), None)
+        self.bytes -= entry.nbytes
+
+    def attachment(self, df, name, factory):
+        """``factory(df)``, built once and shared while ``df`` is a resident result
+
+        Frames the attachment holds (its ``frames()``) count towards the
+        entry's size and the budget from then on.
+        """
+        with self._lock:
+            entry = self._by_frame.get(id(df))
+            if entry is None or entry.df is not df:
+                entry = None
+            elif name in entry.extras:
+                return entry.extras[name]
+        value = factory(df)
+        if entry is None:
+            return value
+        frames = [f for f in getattr(value, 'frames', tuple)() if id(f) not in entry.frames]
+        # Sized outside the lock; deep memory usage of a large frame takes a while
+        nbytes = sum(frame_bytes(f) for f in {id(f): f for f in frames}.values())
+        with self._lock:
+            if name in entry.extras:
+                return entry.extras[name]
+            entry.extras[name] = value
+            if self._entries.get(entry.key) is not entry:
+                return value
+            entry.frames.update(id(f) for f in frames)
+            entry.nbytes += nbytes
+            self.bytes += nbytes
+            self._evict()
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_frame.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.shared
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'budget_bytes': self.budget_bytes,
+                'in_flight': len(self._flights),
+                'hits': self.hits,
+                'misses': self.misses,
+                'shared': self.shared,
+                'evictions': self.evictions,
+                # Waiting on another session's fetch counts as a hit: no extra server call
+                'hit_rate': (self.hits + self.shared) / lookups if lookups else None,
+            }
+
+    def entries(self):
+        """[{api, params, rows, bytes, hits, age_s}] from most to least recently used"""
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    'api': entry.api_name,
+                    'params': ", ".join(f"{k}={v}" for k, v in entry.params.items() if v and k != 'fields'),
+                    'rows': len(entry.df),
+                    'bytes': entry.nbytes,
+                    'hits': entry.hits,
+                    'age_s': round(now - entry.created),
+                }
+                for entry in reversed(self._entries.values())
+            ]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_result_store():
+    """Return the process-wide result store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore()
+        return _store
@@ -0,0 +1,296 @@
+"""Immutable, indexed stock universe loaded once per process"""
+import bisect
+import glob
+import os
+import threading
+import time
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+# The universe lives in an uncompressed Arrow IPC (Feather v2) file so it can be
+# memory-mapped; the CSV is only an import/export format
+UNIVERSE_FILE = os.path.join("cache", "stock_universe.arrow")
+STOCK_LIST_FILE = "stock_list.csv"
+
+# A mapped file cannot be replaced on Windows, so every save writes a new
+# version (stock_universe.<ns>-<pid>.arrow) and UNIVERSE_FILE + CURRENT_SUFFIX names
+# the current one
+CURRENT_SUFFIX = ".current"
+
+INDUSTRY_COLUMNS = ['industry', 'industryClassification']
+
+# Share of query trigrams a name must contain to count as a fuzzy match
+FUZZY_MIN_SHARE = 0.6
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class StockUniverse:
+    """Read-only view of the stock list with code lookup, prefix and trigram search
+
+    All indexes are built once when the universe is created; searches never
+    touch the DataFrame.
+    """
+
+    __slots__ = ('_frame', 'codes', 'labels', '_row_of', '_names_lower',
+                 '_prefix_keys', '_prefix_rows', '_trigram_rows')
+
+    def __init__(self, df):
+        frame = df.reset_index(drop=True)
+        self._frame = frame
+        self.codes = tuple(frame['code'].fillna("").astype(str))
+        names = tuple(frame['code_name'].fillna("").astype(str))
+        self.labels = tuple(f"{c} - {n}" for c, n in zip(self.codes, names))
+        self._row_of = MappingProxyType({c: i for i, c in enumerate(self.codes)})
+        self._names_lower = np.array([n.lower() for n in names], dtype=str)
+
+        # Prefix index over full codes, bare digits and names
+        keys = []
+        for i, (code, name) in enumerate(zip(self.codes, names)):
+            keys.append((code.lower(), i))
+            keys.append((code.split('.')[-1], i))
+            keys.append((name.lower(), i))
+        keys.sort()
+        self._prefix_keys = tuple(k for k, _ in keys)
+        self._prefix_rows = tuple(i for _, i in keys)
+
+        # Trigram index for fuzzy matches
+        postings = {}
+        for i, (code, name) in enumerate(zip(self.codes, names)):
+            for gram in _trigrams(f"{code.split('.')[-1]} {name.lower()}"):
+                postings.setdefault(gram, []).append(i)
+        self._trigram_rows = MappingProxyType(
+            {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        )
+
+    @classmethod
+    def from_csv(cls, path=STOCK_LIST_FILE):
+        return cls(read_stock_csv(path))
+
+    @classmethod
+    def from_arrow(cls, path=UNIVERSE_FILE):
+        return cls(read_universe_table(path).to_pandas(types_mapper=pd.ArrowDtype))
+
+    @property
+    def frame(self):
+        """The underlying stock list; treat it as read-only"""
+        return self._frame
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self._row_of
+
+    def label(self, code):
+        """'code - name' display label, or the code itself if unknown"""
+        row = self._row_of.get(code)
+        return code if row is None else self.labels[row]
+
+    def get(self, code):
+        """Row for a code as a dict, or None"""
+        row = self._row_of.get(code)
+        return None if row is None else self._frame.iloc[row].to_dict()
+
+    def _prefix(self, query):
+        lo = bisect.bisect_left(self._prefix_keys, query)
+        hi = bisect.bisect_left(self._prefix_keys, query + "\uffff")
+        return self._prefix_rows[lo:hi]
+
+    def _fuzzy(self, query):
+        grams = _trigrams(query)
+        lists = [self._trigram_rows[g] for g in grams if g in self._trigram_rows]
+        if not lists:
+            return []
+        counts = np.bincount(np.concatenate(lists), minlength=len(self.codes))
+        needed = max(1, int(np.ceil(len(grams) * FUZZY_MIN_SHARE)))
+        hits = np.nonzero(counts >= needed)[0]
+        # Most shared trigrams first
+        return hits[np.argsort(-counts[hits], kind='stable')].tolist()
+
+    def search(self, query, limit=50):
+        """Codes matching a code/name query, best matches first"""
+        query = (query or "").strip().lower()
+        if not query:
+            return []
+        ordered = []
+        seen = set()
+
+        def add(rows):
+            for row in rows:
+                if row not in seen:
+                    seen.add(row)
+                    ordered.append(row)
+                    if len(ordered) >= limit:
+                        return True
+            return False
+
+        exact = self._row_of.get(query)
+        if exact is not None and add([exact]):
+            return [self.codes[i] for i in ordered]
+        if add(sorted(self._prefix(query))):
+            return [self.codes[i] for i in ordered]
+        if len(query) < 3:
+            # Too short for trigrams (e.g. two-character Chinese names): substring scan
+            add(np.nonzero(np.char.find(self._names_lower, query) >= 0)[0].tolist())
+        else:
+            add(self._fuzzy(query))
+        return [self.codes[i] for i in ordered]
+
+
+def read_stock_csv(path=STOCK_LIST_FILE):
+    return pd.read_csv(path, encoding='utf-8-sig', dtype={'code': str})
+
+
+def _version_pattern(path):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.*{ext}"
+
+
+def universe_data_file(path=UNIVERSE_FILE):
+    """The Arrow file holding the current universe
+
+    ``path`` itself when no version has been saved yet (a universe file from
+    before versioning); it may not exist.
+    """
+    try:
+        with open(path + CURRENT_SUFFIX, encoding='utf-8') as f:
+            name = f.read().strip()
+    except OSError:
+        return path
+    return os.path.join(os.path.dirname(path), name) if name else path
+
+
+def read_universe_table(path=UNIVERSE_FILE):
+    """Memory-mapped Arrow table; column buffers point straight into the page cache"""
+    try:
+        return feather.read_table(universe_data_file(path), memory_map=True)
+    except FileNotFoundError:
+        # A save removed the version between reading the pointer and opening it
+        return feather.read_table(universe_data_file(path), memory_map=True)
+
+
+def _remove_old_versions(path, current):
+    # Only versions older than the current one, not one another process is about to point to
+    old_versions = [p for p in glob.glob(_version_pattern(path))
+                    if os.path.basename(p) < os.path.basename(current)]
+    for old in old_versions + [path]:
+        if os.path.exists(old):
+            try:
+                os.remove(old)
+            except OSError:
+                # Still mapped somewhere (Windows); removed by a later save
+                pass
+
+
+def write_universe_table(table, path=UNIVERSE_FILE):
+    """Save the universe as a new version and atomically make it the current one
+
+    Tables already read keep mapping the version they were read from, so
+    nothing mapped is ever overwritten.
+    """
+    if isinstance(table, pd.DataFrame):
+        table = pa.Table.from_pandas(table, preserve_index=False)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    stem, ext = os.path.splitext(path)
+    version = f"{stem}.{time.time_ns()}-{os.getpid()}{ext}"
+    # Compressed files cannot be mapped, so the universe is written uncompressed
+    feather.write_feather(table, version + ".tmp", compression='uncompressed')
+    os.replace(version + ".tmp", version)
+    pointer = f"{path}{CURRENT_SUFFIX}.{os.getpid()}.tmp"
+    with open(pointer, 'w', encoding='utf-8') as f:
+        f.write(os.path.basename(version))
+    os.replace(pointer, path + CURRENT_SUFFIX)
+    _remove_old_versions(path, version)
+    return table
+
+
+def import_csv(csv_path=STOCK_LIST_FILE, path=UNIVERSE_FILE):
+    """Convert a stock list CSV into the universe file"""
+    return write_universe_table(read_stock_csv(csv_path), path)
+
+
+def export_csv(csv_path=STOCK_LIST_FILE, path=UNIVERSE_FILE):
+    """Write the universe back out as a UTF-8-BOM CSV (e.g. for Excel)"""
+    df = read_universe_table(path).to_pandas()
+    df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+    return len(df)
+
+
+def replace_industry_columns(industry_df, path=UNIVERSE_FILE):
+    """Swap in industry columns from a query_stock_industry result
+
+    Only the industry columns are rebuilt (a hash lookup of each code into the
+    industry result); every other column buffer is written out unchanged.
+    """
+    table = read_universe_table(path)
+    industry = pa.Table.from_pandas(
+        industry_df[['code'] + INDUSTRY_COLUMNS].drop_duplicates('code'), preserve_index=False
+    )
+    positions = pc.index_in(table['code'], value_set=industry['code'])
+    for col in INDUSTRY_COLUMNS:
+        values = pc.take(industry[col].cast(pa.string()), positions)
+        index = table.schema.get_field_index(col)
+        if index >= 0:
+            table = table.set_column(index, col, values)
+        else:
+            table = table.append_column(col, values)
+    return write_universe_table(table, path)
+
+
+_universe = None
+# (data file, mtime) the cached universe was loaded from
+_universe_version = None
+_universe_lock = threading.Lock()
+
+
+def get_stock_universe(path=UNIVERSE_FILE, csv_path=STOCK_LIST_FILE):
+    """Process-wide universe, reloaded only when a new version is saved; None if missing
+
+    On first use the universe file is imported from the stock list CSV if it
+    does not exist yet.
+    """
+    global _universe, _universe_version
+    with _universe_lock:
+        if not os.path.exists(universe_data_file(path)) and csv_path and os.path.exists(csv_path):
+            import_csv(csv_path, path)
+        current = universe_data_file(path)
+        try:
+            version = (current, os.path.getmtime(current))
+        except OSError:
+            return _universe
+        if _universe is None or version != _universe_version:
+            _universe = StockUniverse.from_arrow(path)
+            _universe_version = version
+        return _universe
+
+
+def _reload(path):
+    global _universe, _universe_version
+    current = universe_data_file(path)
+    _universe = StockUniverse.from_arrow(path)
+    _universe_version = (current, os.path.getmtime(current))
+    return _universe
+
+
+def set_stock_universe(df, path=UNIVERSE_FILE):
+    """Save a new stock list to the universe file and make it the process-wide universe"""
+    with _universe_lock:
+        write_universe_table(df, path)
+        return _reload(path)
+
+
+def update_industry(industry_df, path=UNIVERSE_FILE):
+    """Replace the industry columns in the universe file and reload it"""
+    with _universe_lock:
+        replace_industry_columns(industry_df, path)
+        return _reload(path)
@@ -0,0 +1,74 @@
+"""A-share trading calendar backed by query_trade_dates"""
+import threading
+from datetime import date, datetime
+
+import baostock as bs
+import numpy as np
+
+from query_cache import get_query_cache
+
+# First trading day on the Shanghai exchange
+CALENDAR_START = "1990-12-19"
+
+
+class TradeCalendar:
+    """Sorted array of trading days, fetched once per day through the query cache"""
+
+    def __init__(self, query_cache=None):
+        self.query_cache = query_cache or get_query_cache()
+        self._days = None
+        self._loaded_on = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        today = date.today()
+        with self._lock:
+            if self._days is not None and self._loaded_on == today:
+                return self._days, None
+            # Fetch through the end of the year so near-future ranges resolve too
+            df, error_msg = self.query_cache.fetch(
+                bs.query_trade_dates,
+                start_date=CALENDAR_START,
+                end_date=f"{today.year}-12-31"
+            )
+            if error_msg is not None:
+                return None, error_msg
+            trading = df[df['is_trading_day'].astype(str) == '1']
+            self._days = np.sort(trading['calendar_date'].to_numpy().astype('datetime64[D]'))
+            self._loaded_on = today
+            return self._days, None
+
+    def trading_days(self, start, end):
+        """Trading days in [start, end] as datetime64[D]; returns (array, error_msg)"""
+        days, error_msg = self._load()
+        if error_msg is not None:
+            return None, error_msg
+        lo = np.searchsorted(days, np.datetime64(str(start)[:10], 'D'), side='left')
+        hi = np.searchsorted(days, np.datetime64(str(end)[:10], 'D'), side='right')
+        return days[lo:hi], None
+
+    def is_trading_day(self, day):
+        days, _ = self.trading_days(day, day)
+        return days is not None and len(days) > 0
+
+
+def to_date(value):
+    """date from a date, datetime, numpy datetime64 or 'YYYY-MM-DD' string"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def get_trade_calendar():
+    """Return the process-wide trading calendar"""
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            _calendar = TradeCalendar()
+        return _calendar
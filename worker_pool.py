@@ -0,0 +1,121 @@
+"""Pool of worker processes, each holding its own BaoStock session
+
+The baostock client keeps one global socket per process, so independent
+concurrent sessions need separate processes. Every worker logs in once and
+makes single attempts; pacing, concurrency limits and retries are left to
+the main process's call gateway, which sees the calls of every worker.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import util as mp_util
+
+import baostock as bs
+
+from bs_session import BaoStockSession
+from call_gateway import CIRCUIT_OPEN_ERROR_CODE, EXCEPTION_ERROR_CODE, CircuitOpenError, get_gateway
+from result_decoder import decode_result
+
+# Worker processes in the shared pool; override with BAOSTOCK_WORKERS
+DEFAULT_WORKERS = 4
+
+# Per-process state, set up by _init_worker
+_worker_session = None
+
+
+def _init_worker():
+    global _worker_session
+    _worker_session = BaoStockSession()
+    mp_util.Finalize(None, _worker_session.logout, exitpriority=10)
+
+
+def run_attempt(api_name, args, kwargs):
+    """Run one bs.query_* call inside a worker
+
+    Returns (DataFrame, error_code, error_msg, seconds spent in the worker).
+    """
+    start = time.perf_counter()
+    try:
+        rs = _worker_session.query(getattr(bs, api_name), *args, **kwargs)
+    except Exception as e:
+        return None, EXCEPTION_ERROR_CODE, str(e), time.perf_counter() - start
+    if rs.error_code == '0':
+        return decode_result(rs), '0', None, time.perf_counter() - start
+    return None, rs.error_code, f"{rs.error_code}: {rs.error_msg}", time.perf_counter() - start
+
+
+class BaoStockWorkerPool:
+    """Bounded process pool of independent BaoStock sessions
+
+    Calls wait in the pool's dispatch threads for the gateway to let them
+    through, so retries and backoff never hold a worker process.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, gateway=None):
+        self.workers = workers
+        self.gateway = gateway or get_gateway()
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+        # Twice the workers, so calls backing off do not leave workers idle
+        self._dispatch = ThreadPoolExecutor(max_workers=workers * 2, thread_name_prefix="baostock-dispatch")
+
+    def _call(self, api_name, args, kwargs):
+        worker_seconds = 0.0
+
+        def attempt():
+            nonlocal worker_seconds
+            df, error_code, error_msg, seconds = self._executor.submit(run_attempt, api_name, args, kwargs).result()
+            worker_seconds += seconds
+            return error_code, (df, error_msg)
+
+        try:
+            _, (df, error_msg) = self.gateway.call(attempt, api_name)
+        except CircuitOpenError as e:
+            df, error_msg = None, f"{CIRCUIT_OPEN_ERROR_CODE}: {e}"
+        return df, error_msg, worker_seconds
+
+    def submit(self, api_name, *args, **kwargs):
+        """Queue a bs.query_* call; the future resolves to (DataFrame, error_msg)"""
+        return self._dispatch.submit(lambda: self._call(api_name, args, kwargs)[:2])
+
+    def submit_timed(self, api_name, *args, **kwargs):
+        """Like submit, but the future resolves to (DataFrame, error_msg, seconds spent in workers)"""
+        return self._dispatch.submit(self._call, api_name, args, kwargs)
+
+    def shutdown(self, wait=True):
+        self._dispatch.shutdown(wait=False, cancel_futures=True)
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool(workers=None):
+    """Return the process-wide worker pool
+
+    The pool is sized once, by ``workers`` on first use or else by
+    BAOSTOCK_WORKERS, and never rebuilt: other sessions may have calls in it.
+    A batch that should use fewer sessions caps its own outstanding calls.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BaoStockWorkerPool(workers or int(os.environ.get('BAOSTOCK_WORKERS', DEFAULT_WORKERS)))
+        return _pool
+
+
+def _shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False)
+        _pool = None
+
+
+atexit.register(_shutdown_pool)